@@ -0,0 +1,130 @@
+import argparse
+import json
+import time
+
+import faiss
+import numpy as np
+
+from index_factory import create_index, train_index, search_parameters, index_description
+
+
+def load_reference(index_path):
+    """
+    Read the flat reference index and return it together with its vectors and ids
+    """
+    index = faiss.read_index(index_path)
+    if isinstance(index, faiss.IndexIDMap):
+        inner = faiss.downcast_index(index.index)
+        ids = faiss.vector_to_array(index.id_map)
+    else:
+        inner = index
+        ids = np.arange(index.ntotal, dtype='int64')
+
+    if not isinstance(inner, faiss.IndexFlat):
+        raise ValueError(f"{index_path} is not a flat index; build one with --index-type flat first")
+
+    return index, inner.reconstruct_n(0, inner.ntotal), ids
+
+
+def load_queries(args, vectors):
+    if args.queries:
+        from embedding import embed_texts
+
+        with open(args.queries, "r", encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()]
+        queries = embed_texts(texts).astype('float32')
+        faiss.normalize_L2(queries)
+        return queries
+
+    rng = np.random.default_rng(args.seed)
+    count = min(args.num_queries, len(vectors))
+    return vectors[rng.choice(len(vectors), count, replace=False)]
+
+
+def recall_at_k(approx_ids, exact_ids, k):
+    hits = 0
+    for approx, exact in zip(approx_ids, exact_ids):
+        hits += len(set(approx[:k]) & set(exact[:k]) - {-1})
+    return hits / (len(exact_ids) * k)
+
+
+def measure(index, queries, exact_ids, k, params):
+    # Batch search for recall
+    _, approx_ids = index.search(queries, k, params=params)
+    recall = recall_at_k(approx_ids, exact_ids, k)
+
+    # One query at a time for latency, like the Searcher does
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query[None, :], k, params=params)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    return {
+        "recall": recall,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure recall@k and latency of approximate indexes against the flat index")
+    parser.add_argument("--index", default="unified_semantic_search.index", help="flat reference index")
+    parser.add_argument("--queries", help="file with one query per line (default: sample corpus vectors)")
+    parser.add_argument("--num-queries", type=int, default=1000)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--types", nargs="+", default=["ivf_flat", "ivf_pq", "hnsw"])
+    parser.add_argument("--nlist", type=int)
+    parser.add_argument("--pq-m", type=int, default=48)
+    parser.add_argument("--pq-bits", type=int, default=8)
+    parser.add_argument("--hnsw-m", type=int, default=32)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 32, 64, 128])
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--json", help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    reference, vectors, ids = load_reference(args.index)
+    queries = load_queries(args, vectors)
+    print(f"Reference index: {len(vectors)} vectors, {queries.shape[0]} queries, k={args.top_k}")
+
+    _, exact_ids = reference.search(queries, args.top_k)
+    results = [dict(type="flat", setting="-", build_s=0.0, **measure(reference, queries, exact_ids, args.top_k, None))]
+
+    for index_type in args.types:
+        params = {"nlist": args.nlist}
+        if index_type == "ivf_pq":
+            params.update(pq_m=args.pq_m, pq_bits=args.pq_bits)
+        elif index_type == "hnsw":
+            params = {"hnsw_m": args.hnsw_m}
+
+        start = time.perf_counter()
+        index = create_index(index_type, vectors.shape[1], len(vectors), **params)
+        train_index(index, vectors, seed=args.seed)
+        index.add_with_ids(vectors, ids)
+        build_seconds = time.perf_counter() - start
+        print(f"Built {index_description(index_type, len(vectors), **params)} in {build_seconds:.2f}s")
+
+        if index_type == "hnsw":
+            settings = [("efSearch", value, search_parameters(index, ef_search=value)) for value in args.ef_search]
+        else:
+            settings = [("nprobe", value, search_parameters(index, nprobe=value)) for value in args.nprobe]
+
+        for name, value, search_params in settings:
+            result = measure(index, queries, exact_ids, args.top_k, search_params)
+            results.append(dict(type=index_type, setting=f"{name}={value}", build_s=build_seconds, **result))
+
+    print()
+    print(f"{'type':<10}{'setting':<16}{'build s':>9}{f'recall@{args.top_k}':>12}{'p50 ms':>10}{'p99 ms':>10}")
+    for result in results:
+        print(f"{result['type']:<10}{result['setting']:<16}{result['build_s']:>9.2f}"
+              f"{result['recall']:>12.4f}{result['p50_ms']:>10.3f}{result['p99_ms']:>10.3f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import argparse
+import time
+
+import numpy as np
+
+from embedding import get_csv_files, load_all_csvs, embed_texts
+
+
+def run(texts, **kwargs):
+    start = time.perf_counter()
+    embeddings = embed_texts(texts, **kwargs)
+    elapsed = time.perf_counter() - start
+    return embeddings, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare fixed-size and token-budget embedding batches on the CSV corpus")
+    parser.add_argument("--directory", default=".", help="directory with the numeric CSV files")
+    parser.add_argument("--limit", type=int, default=None, help="only embed the first N texts")
+    parser.add_argument("--batch-size", type=int, default=16, help="batch size for the fixed baseline")
+    parser.add_argument("--max-tokens", type=int, nargs="+", default=[2048, 4096, 8192],
+                        help="token budgets to try")
+    args = parser.parse_args()
+
+    df = load_all_csvs(get_csv_files(args.directory))
+    texts = df["text"].astype(str).tolist()
+    if args.limit:
+        texts = texts[:args.limit]
+    print(f"Benchmarking on {len(texts)} texts")
+
+    # Warm up the model so the first run is not penalized
+    embed_texts(texts[:32])
+
+    baseline, baseline_time = run(texts, batch_size=args.batch_size)
+    results = [(f"fixed batch_size={args.batch_size}", baseline_time, 1.0)]
+
+    for max_tokens in args.max_tokens:
+        embeddings, elapsed = run(texts, max_tokens=max_tokens)
+        a = baseline / np.linalg.norm(baseline, axis=1, keepdims=True)
+        b = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+        min_cosine = float((a * b).sum(axis=1).min())
+        results.append((f"max_tokens={max_tokens}", elapsed, min_cosine))
+
+    print()
+    print(f"{'mode':<28}{'seconds':>10}{'sentences/sec':>16}{'speedup':>10}{'min cosine':>12}")
+    for mode, elapsed, min_cosine in results:
+        print(f"{mode:<28}{elapsed:>10.2f}{len(texts) / elapsed:>16.1f}"
+              f"{baseline_time / elapsed:>10.2f}{min_cosine:>12.6f}")
+
+
+if __name__ == "__main__":
+    main()
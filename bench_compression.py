@@ -0,0 +1,117 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import faiss
+import numpy as np
+
+from bench_ann import load_reference, load_queries, recall_at_k
+from index_factory import create_index, train_index, index_description
+from vector_store import VectorStore, write_vector_store, rescore
+
+
+def synthetic_vectors(num_vectors, dimension, seed, num_topics=256):
+    """Unit vectors scattered around num_topics random centres, closer to real embeddings than pure noise"""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((num_topics, dimension)).astype('float32')
+    vectors = centres[rng.integers(num_topics, size=num_vectors)]
+    vectors += rng.standard_normal(vectors.shape).astype('float32') * 0.6
+    faiss.normalize_L2(vectors)
+    return vectors, np.arange(num_vectors, dtype='int64')
+
+
+def index_bytes(index):
+    """Size of the serialized index, which is what a replica holds in RAM"""
+    return len(faiss.serialize_index(index))
+
+
+def measure(search, queries, exact_ids, k):
+    """recall@k of a batch search and the latency of one query at a time, like the Searcher"""
+    _, approx_ids = search(queries)
+    recall = recall_at_k(approx_ids, exact_ids, k)
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        search(query[None, :])
+        latencies.append((time.perf_counter() - start) * 1000)
+    return recall, float(np.percentile(latencies, 50)), float(np.percentile(latencies, 95))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Memory, latency and recall@k of fp16 / int8 vector codes with and without exact rescoring")
+    parser.add_argument("--index", default="unified_semantic_search.index", help="flat reference index")
+    parser.add_argument("--synthetic", type=int, help="benchmark this many random vectors instead")
+    parser.add_argument("--dimension", type=int, default=384, help="synthetic vector size")
+    parser.add_argument("--queries", help="file with one query per line (default: sample corpus vectors)")
+    parser.add_argument("--num-queries", type=int, default=500)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--types", nargs="+", default=["sq_fp16", "sq8"])
+    parser.add_argument("--rescore-factors", type=int, nargs="+", default=[1, 2, 4, 8],
+                        help="candidates per hit rescored from the vector store (1: no rescoring)")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--json", help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        vectors, ids = synthetic_vectors(args.synthetic, args.dimension, args.seed)
+        reference = create_index("flat", args.dimension, len(vectors))
+        reference.add_with_ids(vectors, ids)
+    else:
+        reference, vectors, ids = load_reference(args.index)
+    queries = load_queries(args, vectors)
+    # Queries taken from the corpus get a little noise, so they are not exact matches
+    if not args.queries:
+        rng = np.random.default_rng(args.seed)
+        queries = queries + rng.normal(scale=0.05, size=queries.shape).astype('float32')
+        faiss.normalize_L2(queries)
+    k = args.top_k
+    print(f"Reference index: {len(vectors)} vectors of {vectors.shape[1]} dimensions, {len(queries)} queries, k={k}")
+
+    _, exact_ids = reference.search(queries, k)
+    recall, p50, p95 = measure(lambda q: reference.search(q, k), queries, exact_ids, k)
+    results = [dict(type="flat", rescore=1, index_mb=index_bytes(reference) / 2 ** 20, disk_mb=0.0,
+                    recall=recall, p50_ms=p50, p95_ms=p95)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        store_path = os.path.join(directory, "vectors")
+        write_vector_store(store_path, ids, vectors, vectors.shape[1])
+        store = VectorStore(store_path)
+        disk_mb = os.path.getsize(os.path.join(store_path, "vectors.f32")) / 2 ** 20
+
+        for index_type in args.types:
+            start = time.perf_counter()
+            index = create_index(index_type, vectors.shape[1], len(vectors))
+            train_index(index, vectors, seed=args.seed)
+            index.add_with_ids(vectors, ids)
+            print(f"Built {index_description(index_type, len(vectors))} in {time.perf_counter() - start:.2f}s")
+            index_mb = index_bytes(index) / 2 ** 20
+
+            for factor in args.rescore_factors:
+                if factor > 1:
+                    def search(q, factor=factor):
+                        _, candidates = index.search(q, k * factor)
+                        return rescore(store, q, candidates, k)
+                else:
+                    def search(q):
+                        return index.search(q, k)
+                recall, p50, p95 = measure(search, queries, exact_ids, k)
+                results.append(dict(type=index_type, rescore=factor, index_mb=index_mb,
+                                    disk_mb=disk_mb if factor > 1 else 0.0, recall=recall, p50_ms=p50, p95_ms=p95))
+
+    print()
+    print(f"{'type':<10}{'rescore':>9}{'RAM MB':>10}{'disk MB':>10}{f'recall@{k}':>12}{'p50 ms':>10}{'p95 ms':>10}")
+    for result in results:
+        print(f"{result['type']:<10}{result['rescore']:>9}{result['index_mb']:>10.1f}{result['disk_mb']:>10.1f}"
+              f"{result['recall']:>12.4f}{result['p50_ms']:>10.3f}{result['p95_ms']:>10.3f}")
+    print("(RAM is the serialized index; rescoring reads the exact vectors from the memory-mapped store on disk)")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
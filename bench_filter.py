@@ -0,0 +1,117 @@
+import argparse
+import os
+import tempfile
+import time
+
+import faiss
+import numpy as np
+
+from index_factory import INDEX_TYPES, create_index, train_index, search_parameters
+from metadata_store import MetadataStore, write_metadata_store
+from search_filter import SearchFilter, compile_filter, filtered_search
+
+
+def synthetic_corpus(directory, num_vectors, act_size, dimension, index_type, seed):
+    """Random unit vectors in acts of act_size consecutive ids, with a metadata store and act ranges"""
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((num_vectors, dimension)).astype('float32')
+    faiss.normalize_L2(vectors)
+    index = create_index(index_type, dimension, num_vectors)
+    train_index(index, vectors)
+    index.add_with_ids(vectors, np.arange(num_vectors, dtype='int64'))
+
+    rows = {i: {"law_act_id": 1000 + i // act_size, "paragraph_id": i, "source_file": f"{1000 + i // act_size}.csv"}
+            for i in range(num_vectors)}
+    act_ranges = {str(1000 + start // act_size): (start, min(start + act_size, num_vectors))
+                  for start in range(0, num_vectors, act_size)}
+    path = os.path.join(directory, "metadata")
+    write_metadata_store(path, rows, act_ranges=act_ranges)
+    return index, MetadataStore(path)
+
+
+def time_queries(search, queries):
+    latencies = []
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(search(query[None, :]))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return results, float(np.percentile(latencies, 50)), float(np.percentile(latencies, 95))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency of filtered search against post-filtering")
+    parser.add_argument("--index", default="unified_semantic_search.index")
+    parser.add_argument("--metadata", default="unified_metadata")
+    parser.add_argument("--synthetic", type=int, help="benchmark a random corpus of this many vectors instead")
+    parser.add_argument("--act-size", type=int, default=50, help="paragraphs per act in the synthetic corpus")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default="flat", help="synthetic index type")
+    parser.add_argument("--nprobe", type=int)
+    parser.add_argument("--ef-search", type=int)
+    parser.add_argument("--num-queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--acts", type=int, nargs="+", default=[1, 10, 100, 1000], help="acts per filter")
+    parser.add_argument("--post-filter-k", type=int, default=1000,
+                        help="candidates fetched when filtering after the search")
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        if args.synthetic:
+            index, metadata = synthetic_corpus(directory, args.synthetic, args.act_size, 384, args.index_type,
+                                               args.seed)
+        else:
+            index, metadata = faiss.read_index(args.index), MetadataStore(args.metadata)
+        run(args, index, metadata)
+
+
+def run(args, index, metadata):
+    rng = np.random.default_rng(args.seed)
+    ids = faiss.vector_to_array(index.id_map)
+    queries = index.reconstruct_batch(rng.choice(ids, min(args.num_queries, len(ids)), replace=False))
+    queries += rng.normal(scale=0.05, size=queries.shape).astype('float32')
+    faiss.normalize_L2(queries)
+    params = search_parameters(index, nprobe=args.nprobe, ef_search=args.ef_search)
+    acts = sorted(metadata.act_ranges or np.unique(metadata.columns['law_act_id']).astype(str))
+    print(f"{index.ntotal} vectors in {len(acts)} acts, {len(queries)} queries, k={args.top_k}")
+
+    _, p50, p95 = time_queries(lambda q: index.search(q, args.top_k, params=params), queries)
+    rows = [("unfiltered", index.ntotal, p50, p95, 1.0, float("nan"))]
+
+    for num_acts in args.acts:
+        if num_acts > len(acts):
+            continue
+        search_filter = SearchFilter(law_act_ids=rng.choice(acts, num_acts, replace=False))
+        start = time.perf_counter()
+        compiled = compile_filter(search_filter, metadata)
+        compiled.vectors(index)
+        compile_ms = (time.perf_counter() - start) * 1000
+        selected = set(compiled.ids.tolist())
+        expected_k = min(args.top_k, len(selected))
+
+        def post_filter(query):
+            _, candidate_ids = index.search(query, args.post_filter_k, params=params)
+            return [i for i in candidate_ids[0] if i in selected][:args.top_k]
+
+        post_results, post_p50, post_p95 = time_queries(post_filter, queries)
+        filtered_results, filtered_p50, filtered_p95 = time_queries(
+            lambda q: filtered_search(index, q, args.top_k, compiled, nprobe=args.nprobe,
+                                      ef_search=args.ef_search)[1][0], queries)
+
+        # Share of queries that got a full page of hits, all of them inside the filter
+        post_full = np.mean([len(hits) >= expected_k for hits in post_results])
+        filtered_full = np.mean([sum(i in selected for i in hits) >= expected_k for hits in filtered_results])
+        label = f"{num_acts} acts"
+        rows.append((f"{label} post", len(selected), post_p50, post_p95, post_full, float("nan")))
+        rows.append((f"{label} filtered", len(selected), filtered_p50, filtered_p95, filtered_full, compile_ms))
+
+    print()
+    print(f"{'mode':<22}{'vectors':>10}{'p50 ms':>9}{'p95 ms':>9}{'full k':>9}{'compile ms':>12}")
+    for mode, vectors, p50, p95, full, compile_ms in rows:
+        print(f"{mode:<22}{vectors:>10}{p50:>9.3f}{p95:>9.3f}{full:>9.2f}{compile_ms:>12.2f}")
+    print(f"(post filtering fetches {args.post_filter_k} candidates and keeps those in the filter; "
+          f"'full k' is the share of queries with min(k, filter size) hits)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import argparse
+import json
+import subprocess
+import sys
+
+# Modules that must not be imported by `import embedding` alone
+HEAVY_MODULES = ["torch", "transformers", "onnxruntime"]
+
+# Each scenario runs in a fresh interpreter and prints one JSON line
+_PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import embedding
+result = {"import_seconds": time.perf_counter() - start}
+%s
+result["rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+result["heavy_modules"] = [name for name in %r if name in sys.modules]
+print(json.dumps(result))
+"""
+
+SCENARIOS = {
+    "import": "",
+    "load-csvs": """
+start = time.perf_counter()
+df = embedding.load_all_csvs(embedding.get_csv_files(%(directory)r))
+result["rows"] = len(df)
+result["step_seconds"] = time.perf_counter() - start
+""",
+    "first-embed": """
+embedding.set_backend(%(backend)r)
+start = time.perf_counter()
+embedding.embed_texts(["cold start"], progress=False)
+result["step_seconds"] = time.perf_counter() - start
+""",
+}
+
+
+def run_scenario(name, directory, backend):
+    code = _PROBE % (SCENARIOS[name] % {"directory": directory, "backend": backend}, HEAVY_MODULES)
+    completed = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"Scenario {name} failed:\n{completed.stderr}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time, memory and cold start of the embedding module")
+    parser.add_argument("--directory", default=".", help="directory with the numeric CSV files")
+    parser.add_argument("--backend", default="torch", help="encoder backend for the first-embed scenario")
+    parser.add_argument("--repeats", type=int, default=3, help="runs per scenario (the fastest is reported)")
+    parser.add_argument("--skip-embed", action="store_true", help="only measure import and CSV loading")
+    parser.add_argument("--max-import-seconds", type=float, default=2.0,
+                        help="fail if `import embedding` takes longer than this")
+    args = parser.parse_args()
+
+    names = ["import", "load-csvs"] + ([] if args.skip_embed else ["first-embed"])
+    failures = []
+    print(f"{'scenario':<14}{'import s':>10}{'step s':>10}{'RSS MB':>10}  heavy modules")
+    for name in names:
+        runs = [run_scenario(name, args.directory, args.backend) for _ in range(args.repeats)]
+        best = min(runs, key=lambda run: run["import_seconds"] + run.get("step_seconds", 0))
+        step = f"{best['step_seconds']:.3f}" if "step_seconds" in best else "-"
+        print(f"{name:<14}{best['import_seconds']:>10.3f}{step:>10}{best['rss_mb']:>10.0f}  "
+              f"{', '.join(best['heavy_modules']) or '-'}")
+
+        if name in ("import", "load-csvs") and best["heavy_modules"]:
+            failures.append(f"{name} imported {', '.join(best['heavy_modules'])}")
+        if name == "import" and best["import_seconds"] > args.max_import_seconds:
+            failures.append(f"import took {best['import_seconds']:.2f}s (limit {args.max_import_seconds}s)")
+
+    for failure in failures:
+        print(f"REGRESSION: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
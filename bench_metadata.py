@@ -0,0 +1,98 @@
+import argparse
+import json
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import time
+
+from metadata_store import load_metadata, write_metadata_store
+
+# Runs in a fresh interpreter: open the metadata, look up top_k random rows, report time and peak RSS.
+# VmHWM is used where available because ru_maxrss survives exec and would include the parent's footprint.
+CHILD = """
+import json, random, resource, sys, time
+
+def peak_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+start = time.perf_counter()
+from metadata_store import load_metadata
+metadata = load_metadata(sys.argv[1])
+opened = time.perf_counter()
+rng = random.Random(0)
+rows = [metadata[rng.randrange(len(metadata))] for _ in range(int(sys.argv[2]))]
+done = time.perf_counter()
+print(json.dumps({
+    "open_s": opened - start,
+    "first_results_s": done - start,
+    "max_rss_mb": peak_rss_mb(),
+}))
+"""
+
+
+def cold_start(path, top_k, repeats):
+    runs = []
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, "-c", CHILD, path, str(top_k)], check=True,
+                                capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        runs.append(json.loads(output.stdout))
+    return {key: min(run[key] for run in runs) for key in runs[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare cold start of pickled and columnar metadata")
+    parser.add_argument("--metadata", default="unified_metadata.pkl",
+                        help="existing metadata to replicate (pickle or columnar store)")
+    parser.add_argument("--rows", type=int, default=1000000, help="number of rows to benchmark with")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    source = load_metadata(args.metadata)
+    if isinstance(source, dict):
+        source = list(source.values())
+    elif not isinstance(source, list):
+        source = [source[vector_id] for vector_id in range(source.capacity) if vector_id in source]
+
+    # Scale the real rows up to the requested size
+    rows = [dict(source[i % len(source)]) for i in range(args.rows)]
+    print(f"Benchmarking with {len(rows)} rows (replicated from {len(source)})")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pickle_path = os.path.join(tmp_dir, "metadata.pkl")
+        store_path = os.path.join(tmp_dir, "metadata")
+
+        start = time.perf_counter()
+        with open(pickle_path, "wb") as f:
+            pickle.dump(rows, f)
+        pickle_write = time.perf_counter() - start
+
+        start = time.perf_counter()
+        write_metadata_store(store_path, dict(enumerate(rows)))
+        store_write = time.perf_counter() - start
+        store_size = sum(os.path.getsize(os.path.join(store_path, name)) for name in os.listdir(store_path))
+
+        results = [
+            ("pickle list-of-dicts", pickle_write, os.path.getsize(pickle_path),
+             cold_start(pickle_path, args.top_k, args.repeats)),
+            ("columnar mmap", store_write, store_size, cold_start(store_path, args.top_k, args.repeats)),
+        ]
+
+    print()
+    print(f"{'format':<22}{'write s':>9}{'size MB':>10}{'open s':>10}{'first top-k s':>15}{'max RSS MB':>12}")
+    for name, write_seconds, size, run in results:
+        print(f"{name:<22}{write_seconds:>9.2f}{size / 1024 ** 2:>10.1f}{run['open_s']:>10.3f}"
+              f"{run['first_results_s']:>15.3f}{run['max_rss_mb']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import argparse
+import os
+import time
+
+import faiss
+import numpy as np
+
+from embedding import get_csv_files, load_all_csvs, embed_texts, set_backend, BACKENDS
+
+
+def normalized(vectors):
+    vectors = np.asarray(vectors, dtype='float32').copy()
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parity and speed of the encoder backends on the CSV corpus")
+    parser.add_argument("--directory", default=".", help="directory with the numeric CSV files")
+    parser.add_argument("--limit", type=int, default=2000, help="texts to embed for throughput and parity")
+    parser.add_argument("--queries", type=int, default=200, help="single-text calls for latency and recall")
+    parser.add_argument("--index", default="unified_semantic_search.index", help="index for recall@10")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=BACKENDS)
+    parser.add_argument("--max-tokens", type=int, default=4096)
+    args = parser.parse_args()
+
+    df = load_all_csvs(get_csv_files(args.directory))
+    texts = df["text"].astype(str).tolist()[:args.limit]
+    rng = np.random.default_rng(0)
+    queries = [texts[i] for i in rng.choice(len(texts), size=min(args.queries, len(texts)), replace=False)]
+    index = faiss.read_index(args.index) if os.path.exists(args.index) else None
+    print(f"Benchmarking on {len(texts)} texts and {len(queries)} queries"
+          + ("" if index is not None else f" (no {args.index}, skipping recall)"))
+
+    reference = None
+    reference_ids = None
+    rows = []
+    for backend in ["torch"] + [b for b in args.backends if b != "torch"]:
+        set_backend(backend)
+        embed_texts(texts[:32], progress=False)
+
+        start = time.perf_counter()
+        corpus = normalized(embed_texts(texts, max_tokens=args.max_tokens, progress=False))
+        throughput = len(texts) / (time.perf_counter() - start)
+
+        latencies = []
+        query_vectors = []
+        for query in queries:
+            start = time.perf_counter()
+            query_vectors.append(embed_texts([query], progress=False)[0])
+            latencies.append((time.perf_counter() - start) * 1000)
+        query_vectors = normalized(query_vectors)
+
+        if reference is None:
+            reference = corpus
+        cosine = (corpus * reference).sum(axis=1)
+
+        recall = float('nan')
+        if index is not None:
+            _, ids = index.search(query_vectors, 10)
+            if reference_ids is None:
+                reference_ids = ids
+            recall = np.mean([len(set(a) & set(b)) / 10 for a, b in zip(ids, reference_ids)])
+
+        p50, p95 = np.percentile(latencies, [50, 95])
+        rows.append((backend, throughput, p50, p95, float(cosine.mean()), float(cosine.min()), recall))
+
+    print()
+    print(f"{'backend':<12}{'texts/sec':>11}{'p50 ms':>9}{'p95 ms':>9}{'mean cos':>10}{'min cos':>10}"
+          f"{'recall@10':>11}")
+    for backend, throughput, p50, p95, mean_cosine, min_cosine, recall in rows:
+        print(f"{backend:<12}{throughput:>11.1f}{p50:>9.2f}{p95:>9.2f}{mean_cosine:>10.5f}{min_cosine:>10.5f}"
+              f"{recall:>11.3f}")
+    print(f"(cosine and recall are against the torch fp32 encoder; recall uses {args.index})")
+
+
+if __name__ == "__main__":
+    main()
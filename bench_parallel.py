@@ -0,0 +1,52 @@
+import argparse
+import os
+import time
+
+import numpy as np
+
+from embedding import get_csv_files, load_all_csvs, embed_texts, embedding_dimension
+from parallel_embed import embed_texts_parallel, default_threads
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scaling of multi-process embedding on the CSV corpus")
+    parser.add_argument("--directory", default=".", help="directory with the numeric CSV files")
+    parser.add_argument("--limit", type=int, default=None, help="only embed the first N texts")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8], help="process counts to try")
+    parser.add_argument("--threads-per-worker", type=int, help="torch threads per process (default: cores / workers)")
+    parser.add_argument("--max-tokens", type=int, default=4096, help="token budget per batch (0 for fixed batches)")
+    args = parser.parse_args()
+
+    df = load_all_csvs(get_csv_files(args.directory))
+    texts = df["text"].astype(str).tolist()
+    if args.limit:
+        texts = texts[:args.limit]
+    max_tokens = args.max_tokens or None
+    print(f"Benchmarking on {len(texts)} texts, {os.cpu_count()} CPUs")
+
+    # Single process with torch's default threading is the baseline
+    embed_texts(texts[:32], progress=False)
+    start = time.perf_counter()
+    baseline = embed_texts(texts, max_tokens=max_tokens, progress=False)
+    baseline_time = time.perf_counter() - start
+    results = [("in-process", "default", baseline_time, 0.0)]
+
+    for workers in args.workers:
+        threads = args.threads_per_worker or default_threads(workers)
+        # Includes process start-up and model loading, as a real run would
+        start = time.perf_counter()
+        embeddings = embed_texts_parallel(texts, embedding_dimension(), workers=workers,
+                                          threads_per_worker=threads, max_tokens=max_tokens)
+        elapsed = time.perf_counter() - start
+        max_diff = float(np.abs(embeddings - baseline).max())
+        results.append((f"{workers} processes", threads, elapsed, max_diff))
+
+    print()
+    print(f"{'mode':<16}{'threads':>9}{'seconds':>10}{'sentences/sec':>16}{'speedup':>10}{'max diff':>12}")
+    for mode, threads, elapsed, max_diff in results:
+        print(f"{mode:<16}{threads:>9}{elapsed:>10.2f}{len(texts) / elapsed:>16.1f}"
+              f"{baseline_time / elapsed:>10.2f}{max_diff:>12.2e}")
+
+
+if __name__ == "__main__":
+    main()
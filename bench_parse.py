@@ -0,0 +1,87 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+from scrapy.http import HtmlResponse
+
+from fast_extract import extract_act
+from main import LexNewSpider2
+
+
+def reference_act(spider, html, law_act_id):
+    """Rows produced by the original CSS-selector extraction and consolidation of LexNewSpider2.parse"""
+    response = HtmlResponse(url=f"https://lex.uz/uz/docs/-{law_act_id}", body=html.encode('utf-8'),
+                            encoding='utf-8')
+    entries = spider.extract_entries_reference(response, law_act_id)
+    return spider.consolidate_entries_reference(entries, law_act_id)
+
+
+def timed(function, pages, repeats):
+    """Best-of-repeats seconds for running function over every page, and the last outputs"""
+    best = float('inf')
+    outputs = {}
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for law_act_id, html in pages.items():
+            outputs[law_act_id] = function(html, law_act_id)
+        best = min(best, time.perf_counter() - start)
+    return best, outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check fast_extract against the reference parser and a golden "
+                                                 "file, and compare their throughput on saved pages")
+    parser.add_argument("directory", nargs="?", default=os.path.join("tests", "fixtures", "pages"),
+                        help="directory with [law_act_id].html pages (main.py --save-html; default: the "
+                             "test fixtures)")
+    parser.add_argument("--golden", help="golden rows as JSONL (default: DIRECTORY/golden.jsonl)")
+    parser.add_argument("--update-golden", action="store_true",
+                        help="(re)write the golden file from the reference parser")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(args.directory, "*.html"))):
+        with open(path, "rb") as f:
+            pages[os.path.basename(path)[:-len(".html")]] = f.read().decode("utf-8", errors="replace")
+    if not pages:
+        sys.exit(f"No .html pages in {args.directory}")
+    megabytes = sum(len(html.encode("utf-8")) for html in pages.values()) / 2 ** 20
+    print(f"{len(pages)} pages, {megabytes:.1f} MB")
+
+    spider = LexNewSpider2.__new__(LexNewSpider2)
+    reference_s, reference = timed(lambda html, law_act_id: reference_act(spider, html, law_act_id),
+                                   pages, args.repeats)
+    fast_s, fast = timed(extract_act, pages, args.repeats)
+
+    print(f"{'parser':>10}{'seconds':>10}{'acts/s':>10}{'MB/s':>10}")
+    for name, seconds in [("reference", reference_s), ("fast", fast_s)]:
+        print(f"{name:>10}{seconds:>10.3f}{len(pages) / seconds:>10.1f}{megabytes / seconds:>10.2f}")
+    print(f"Speedup: {reference_s / fast_s:.1f}x")
+
+    golden_path = args.golden or os.path.join(args.directory, "golden.jsonl")
+    if args.update_golden:
+        with open(golden_path, "w", encoding="utf-8") as f:
+            for law_act_id, rows in reference.items():
+                f.write(json.dumps({"law_act_id": law_act_id, "rows": rows}, ensure_ascii=False) + "\n")
+        print(f"Wrote golden rows for {len(reference)} pages to {golden_path}")
+
+    mismatches = [law_act_id for law_act_id in pages if fast[law_act_id] != reference[law_act_id]]
+    if os.path.exists(golden_path):
+        with open(golden_path, encoding="utf-8") as f:
+            golden = {record["law_act_id"]: record["rows"] for record in map(json.loads, f)}
+        mismatches += [law_act_id for law_act_id in pages
+                       if law_act_id in golden and fast[law_act_id] != golden[law_act_id]]
+        print(f"Compared against {len(golden)} golden pages in {golden_path}")
+
+    if mismatches:
+        print(f"MISMATCH on {len(set(mismatches))} pages: {sorted(set(mismatches))[:10]}")
+        sys.exit(1)
+    print("fast_extract output matches the reference parser")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+import argparse
+import re
+import time
+
+import numpy as np
+
+# Article heading: "5-modda. Title", "12-1-modda. Title", "3 - modda. Title" (Latin or Cyrillic script),
+# at the start of the text or after whitespace. Citations such as "2022-yil, № 3, 216-modda)" are not headings
+ARTICLE_START = re.compile(r'(?:(?<=\s)|^)\d+(?:-\d+)*\s?[-‑–]\s?(?:modda|модда)\.\s+(?=[^\W\d_]|[«"“])',
+                           re.IGNORECASE)
+# Text right before a citation's article number: "№ 3, ", "2022-yil, "
+CITATION_BEFORE = re.compile(r'(?:№\s*[\w-]+|\b(?:yil|йил))\s*,\s*$', re.IGNORECASE)
+
+# Tokens a window repeats from the end of the previous one when a paragraph is split inside an article
+DEFAULT_OVERLAP = 32
+# Fewest tokens in a window; shorter articles are merged into a neighbour instead of becoming their own chunk
+DEFAULT_MIN_TOKENS = 32
+
+
+def article_starts(text):
+    """Character offsets where an article ("N-modda. Title") begins, always including 0"""
+    starts = [match.start() for match in ARTICLE_START.finditer(text)
+              if not CITATION_BEFORE.search(text, max(0, match.start() - 40), match.start())]
+    return starts if starts and starts[0] == 0 else [0] + starts
+
+
+def token_windows(offsets, article_offsets, budget, overlap=0, min_tokens=0):
+    """
+    Split a tokenized text into [start, end) token windows of at most budget
+    tokens. Whole articles are packed together while they fit; an article
+    longer than the budget is cut into windows that repeat the last `overlap`
+    tokens of the window before. No window is shorter than min_tokens: a
+    shorter article is merged into the next one (the last into the one
+    before), and the last window of a cut article is widened backwards.
+    """
+    num_tokens = len(offsets)
+    if num_tokens <= budget:
+        return [(0, num_tokens)]
+    min_tokens = min(min_tokens, budget)
+
+    # Token index at which each article begins
+    token_starts = np.searchsorted([start for start, _ in offsets], article_offsets, side='left')
+    boundaries = sorted(set(int(position) for position in token_starts if position < num_tokens) | {0})
+    ends = boundaries[1:] + [num_tokens]
+    articles = []
+    for article_start, article_end in zip(boundaries, ends):
+        if articles and articles[-1][1] - articles[-1][0] < min_tokens:
+            article_start = articles.pop()[0]
+        articles.append((article_start, article_end))
+    if len(articles) > 1 and articles[-1][1] - articles[-1][0] < min_tokens:
+        articles[-2:] = [(articles[-2][0], articles[-1][1])]
+
+    windows = []
+    current = None
+    for article_start, article_end in articles:
+        if current is not None and article_end - current[0] <= budget:
+            current = (current[0], article_end)
+            continue
+        if current is not None:
+            windows.append(current)
+            current = None
+        if article_end - article_start <= budget:
+            current = (article_start, article_end)
+            continue
+        step = max(1, budget - overlap)
+        start = article_start
+        while article_end - start > budget:
+            windows.append((start, start + budget))
+            start += step
+        current = (min(start, article_end - min_tokens), article_end)
+    if current is not None:
+        windows.append(current)
+    return windows
+
+
+def chunk_text(text, tokenizer, max_length, overlap=DEFAULT_OVERLAP, min_tokens=DEFAULT_MIN_TOKENS):
+    """
+    Split text into pieces whose token count (with the special tokens) fits
+    max_length, cutting at article boundaries where possible, none shorter
+    than min_tokens. The text is tokenized once; the pieces are slices of the
+    original string.
+    """
+    budget = max_length - tokenizer.num_special_tokens_to_add()
+    encoded = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True, verbose=False)
+    offsets = encoded['offset_mapping']
+    if len(offsets) <= budget:
+        return [text]
+
+    pieces = []
+    for start, end in token_windows(offsets, article_starts(text), budget, min(overlap, budget // 2),
+                                    min(min_tokens, budget // 2)):
+        # Keep the text between tokens (spaces, punctuation the tokenizer dropped) with the piece before it
+        char_start = offsets[start][0] if start else 0
+        char_end = offsets[end][0] if end < len(offsets) else len(text)
+        piece = text[char_start:char_end].strip()
+        if piece:
+            pieces.append(piece)
+    return pieces
+
+
+def chunk_rows(rows, tokenizer, max_length, overlap=DEFAULT_OVERLAP, min_tokens=DEFAULT_MIN_TOKENS):
+    """
+    Chunk paragraph rows (dicts with a 'text'). Every chunk is a copy of its
+    paragraph's row (so it keeps law_act_id, paragraph_id, ...) with the
+    chunk text and its position in 'chunk_index'.
+    Returns the chunked rows and the number of paragraphs that were split.
+    """
+    chunked = []
+    split = 0
+    for row in rows:
+        pieces = chunk_text(str(row['text']), tokenizer, max_length, overlap, min_tokens)
+        split += len(pieces) > 1
+        for chunk_index, piece in enumerate(pieces):
+            chunked.append({**row, 'text': piece, 'chunk_index': chunk_index})
+    return chunked, split
+
+
+def chunk_dataframe(df, tokenizer, max_length, overlap=DEFAULT_OVERLAP, min_tokens=DEFAULT_MIN_TOKENS):
+    """chunk_rows() for a corpus dataframe, keeping its column order; returns the chunks and the split count"""
+    import pandas as pd
+
+    rows, split = chunk_rows(df.to_dict(orient='records'), tokenizer, max_length, overlap, min_tokens)
+    columns = list(df.columns) + (['chunk_index'] if 'chunk_index' not in df.columns else [])
+    return pd.DataFrame(rows, columns=columns), split
+
+
+def truncation_stats(texts, tokenizer, max_length):
+    """Tokens the encoder would see and drop for texts, tokenized the way embed_texts does"""
+    start = time.perf_counter()
+    lengths = np.array([len(ids) for ids in tokenizer(list(texts))['input_ids']])
+    seconds = time.perf_counter() - start
+    return {
+        "texts": len(lengths),
+        "tokens": int(lengths.sum()),
+        "truncated_texts": int((lengths > max_length).sum()),
+        "truncated_tokens": int(np.maximum(lengths - max_length, 0).sum()),
+        "max_tokens": int(lengths.max()) if len(lengths) else 0,
+        "tokenize_seconds": seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report how many tokens truncation drops with and without chunking")
+    parser.add_argument("--directory", default=".", help="directory with the numeric CSV files")
+    parser.add_argument("--corpus-dir", default="corpus", help="directory with the crawler's corpus shards")
+    parser.add_argument("--max-length", type=int, help="token limit (default: the encoder's)")
+    parser.add_argument("--overlap", type=int, default=DEFAULT_OVERLAP, help="tokens repeated between windows")
+    args = parser.parse_args()
+
+    from embedding import get_csv_files, get_corpus_shards, load_sources, get_tokenizer, max_sequence_length
+
+    df = load_sources(get_csv_files(args.directory) + (get_corpus_shards(args.corpus_dir) if args.corpus_dir else []))
+    tokenizer = get_tokenizer()
+    max_length = args.max_length or max_sequence_length()
+
+    before = truncation_stats(df['text'].astype(str), tokenizer, max_length)
+    start = time.perf_counter()
+    chunked, split = chunk_dataframe(df, tokenizer, max_length, args.overlap)
+    chunk_seconds = time.perf_counter() - start
+    after = truncation_stats(chunked['text'], tokenizer, max_length)
+
+    print()
+    print(f"{'':<12}{'texts':>9}{'tokens':>11}{'truncated':>11}{'lost tokens':>13}{'lost %':>8}"
+          f"{'longest':>9}{'tokenize s':>12}")
+    for label, stats in (("paragraphs", before), ("chunks", after)):
+        print(f"{label:<12}{stats['texts']:>9}{stats['tokens']:>11}{stats['truncated_texts']:>11}"
+              f"{stats['truncated_tokens']:>13}{100 * stats['truncated_tokens'] / max(stats['tokens'], 1):>8.2f}"
+              f"{stats['max_tokens']:>9}{stats['tokenize_seconds']:>12.2f}")
+    print(f"(limit {max_length} tokens, overlap {args.overlap}; {split} paragraphs split, "
+          f"chunking took {chunk_seconds:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
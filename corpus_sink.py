@@ -0,0 +1,181 @@
+import glob
+import json
+import logging
+import os
+import time
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+SHARD_SUFFIX = ".jsonl"
+TMP_SUFFIX = ".jsonl.tmp"
+
+
+def normalize_row(row):
+    """Paragraph row as written to a shard: numeric ids as ints (like pandas reads them from the CSVs)"""
+    row = {key: value for key, value in row.items() if key != 'is_clause_default'}
+    for key in ('law_act_id', 'paragraph_id'):
+        value = row.get(key)
+        if isinstance(value, str) and value.isdigit():
+            row[key] = int(value)
+    return row
+
+
+def get_corpus_shards(directory="corpus"):
+    """Committed shards in commit order (shard names start with a timestamp)"""
+    return sorted(glob.glob(os.path.join(directory, "*" + SHARD_SUFFIX)))
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def recover_shards(directory):
+    """
+    Commit the shards left behind by writers that died before closing them.
+    Every flush ends on a complete line, so only a torn last line (from a
+    crash in the middle of a write) is cut off. Shards of writers that are
+    still running (other worker processes) are left alone.
+    """
+    recovered = []
+    for tmp_path in glob.glob(os.path.join(directory, "*" + TMP_SUFFIX)):
+        try:
+            pid = int(os.path.basename(tmp_path).split("-")[2])
+        except (IndexError, ValueError):
+            pid = None
+        if pid is not None and pid != os.getpid() and _pid_alive(pid):
+            continue
+
+        with open(tmp_path, "rb+") as f:
+            data = f.read()
+            f.truncate(data.rfind(b"\n") + 1)
+        if data.rfind(b"\n") < 0:
+            os.remove(tmp_path)
+            continue
+        final_path = tmp_path[:-len(TMP_SUFFIX)] + SHARD_SUFFIX
+        os.replace(tmp_path, final_path)
+        recovered.append(final_path)
+    return recovered
+
+
+class ShardWriter:
+    """
+    Appends JSON lines to size-rotated shards in a directory.
+
+    A shard is written as NAME.jsonl.tmp and renamed to NAME.jsonl once it
+    reaches max_bytes or the writer is closed, so readers only ever see
+    complete shards. Rotation happens between writes, never inside one, so a
+    batch (e.g. all paragraphs of an act) always ends up in a single shard.
+    """
+
+    def __init__(self, directory="corpus", max_bytes=256 * 2 ** 20):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.prefix = f"part-{time.strftime('%Y%m%d%H%M%S')}-{os.getpid()}"
+        self.sequence = 0
+        self.file = None
+        self.tmp_path = None
+        self.committed = []
+
+    def next_shard_name(self):
+        """File name the next write() will end up in once its shard is committed"""
+        if self.file is not None:
+            return os.path.basename(self.tmp_path)[:-len(TMP_SUFFIX)] + SHARD_SUFFIX
+        return f"{self.prefix}-{self.sequence:05d}{SHARD_SUFFIX}"
+
+    def write(self, data):
+        """Append bytes (whole lines) and make them durable in the open shard"""
+        if self.file is None:
+            self.tmp_path = os.path.join(self.directory, f"{self.prefix}-{self.sequence:05d}{TMP_SUFFIX}")
+            self.sequence += 1
+            self.file = open(self.tmp_path, "ab")
+        self.file.write(data)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        if self.file.tell() >= self.max_bytes:
+            self.commit()
+
+    def commit(self):
+        """Close the open shard and atomically publish it"""
+        if self.file is None:
+            return None
+        self.file.close()
+        final_path = self.tmp_path[:-len(TMP_SUFFIX)] + SHARD_SUFFIX
+        os.replace(self.tmp_path, final_path)
+        self.file = None
+        self.committed.append(final_path)
+        return final_path
+
+    def close(self):
+        self.commit()
+
+
+class CorpusSinkPipeline:
+    """
+    Item pipeline that writes the paragraphs of crawled acts to sharded JSONL
+    files in CORPUS_DIR instead of one CSV per act.
+
+    Items are {'law_act_id': ..., 'paragraphs': [row, ...]}; the name of the
+    shard the act goes to is added as item['source_file']. Rows are
+    buffered and written in batches of at least CORPUS_FLUSH_ROWS rows;
+    shards rotate at CORPUS_SHARD_BYTES. After each batch is on disk the
+    spider's corpus_flushed(law_act_ids) is called, so the crawl frontier
+    only marks acts done once their paragraphs are durable.
+    """
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+        self.directory = crawler.settings.get('CORPUS_DIR', 'corpus')
+        self.max_bytes = crawler.settings.getint('CORPUS_SHARD_BYTES', 256 * 2 ** 20)
+        self.flush_rows = crawler.settings.getint('CORPUS_FLUSH_ROWS', 2000)
+        self.writer = None
+        self.buffer = []
+        self.buffered_rows = 0
+        self.buffered_acts = []
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def open_spider(self, spider=None):
+        os.makedirs(self.directory, exist_ok=True)
+        for path in recover_shards(self.directory):
+            logger.info(f"Recovered unfinished corpus shard {path}")
+        self.writer = ShardWriter(self.directory, self.max_bytes)
+
+    def process_item(self, item, spider=None):
+        rows = item['paragraphs']
+        # Buffered rows are written before the next rotation, so this is the shard they end up in
+        item['source_file'] = self.writer.next_shard_name()
+        self.buffer.append(''.join(json.dumps(normalize_row(row), ensure_ascii=False) + '\n' for row in rows))
+        self.buffered_rows += len(rows)
+        self.buffered_acts.append(item['law_act_id'])
+        if self.buffered_rows >= self.flush_rows:
+            self.flush()
+        return item
+
+    def flush(self):
+        if not self.buffer:
+            return
+        with metrics.stage("corpus_write"):
+            self.writer.write(''.join(self.buffer).encode('utf-8'))
+        acts = self.buffered_acts
+        self.buffer, self.buffered_rows, self.buffered_acts = [], 0, []
+
+        callback = getattr(self.crawler.spider, 'corpus_flushed', None)
+        if callback is not None:
+            callback(acts)
+
+    def close_spider(self, spider=None):
+        self.flush()
+        self.writer.close()
+        if self.writer.committed:
+            logger.info(f"Wrote {len(self.writer.committed)} corpus shards to {self.directory}")
@@ -0,0 +1,221 @@
+import argparse
+import re
+import zlib
+from collections import Counter, defaultdict
+
+import numpy as np
+
+# UI text of lex.uz that the spider picks up with the act text
+DEFAULT_BOILERPLATE = [
+    "Hujjatga taklif yuborish",
+    "Audioni tinglash",
+    "Hujjat elementidan havola olish",
+]
+
+# Paragraphs whose estimated Jaccard similarity (over word 3-shingles) reaches this are duplicates
+DEFAULT_THRESHOLD = 0.8
+
+_MERSENNE_PRIME = (1 << 31) - 1
+_WORD = re.compile(r'\w+')
+
+
+def load_boilerplate(path=None):
+    """The default phrases plus those in path (one per line, # comments allowed)"""
+    phrases = list(DEFAULT_BOILERPLATE)
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            phrases.extend(line.strip() for line in f if line.strip() and not line.startswith("#"))
+    return list(dict.fromkeys(phrases))
+
+
+class BoilerplateStripper:
+    """Removes configured phrases (whitespace-insensitive) and collapses the whitespace left behind"""
+
+    def __init__(self, phrases):
+        self.phrases = list(phrases)
+        # Longest first, so a phrase that contains another is removed whole
+        patterns = [r'\s+'.join(map(re.escape, phrase.split())) for phrase in sorted(self.phrases, key=len,
+                                                                                      reverse=True)]
+        self.pattern = re.compile('|'.join(patterns)) if patterns else None
+
+    def strip(self, text):
+        if self.pattern is None:
+            return text
+        return ' '.join(self.pattern.sub(' ', text).split())
+
+
+def learn_boilerplate(texts_by_act, ngram=4, min_act_fraction=0.2, min_words=6):
+    """
+    Suggest boilerplate phrases: word n-grams that occur in at least
+    min_act_fraction of the acts, chained into the longest phrases they form
+    (overlapping n-grams that follow each other in the text), keeping those of
+    at least min_words words. Formulaic legal wording is frequent too, so the
+    result is meant to be reviewed and saved as a boilerplate file, not
+    applied blindly.
+    """
+    act_counts = Counter()
+    texts = []
+    num_acts = 0
+    for act_texts in texts_by_act:
+        num_acts += 1
+        seen = set()
+        for text in act_texts:
+            words = text.split()
+            texts.append(words)
+            seen.update(tuple(words[i:i + ngram]) for i in range(len(words) - ngram + 1))
+        act_counts.update(seen)
+    frequent = {gram for gram, count in act_counts.items() if count >= min_act_fraction * num_acts}
+
+    phrases = Counter()
+    for words in texts:
+        i = 0
+        while i <= len(words) - ngram:
+            if tuple(words[i:i + ngram]) not in frequent:
+                i += 1
+                continue
+            end = i + ngram
+            while end < len(words) and tuple(words[end - ngram + 1:end + 1]) in frequent:
+                end += 1
+            if end - i >= min_words:
+                phrases[' '.join(words[i:end])] += 1
+            i = end
+    return [phrase for phrase, _ in phrases.most_common()]
+
+
+def shingles(text, size=3):
+    """crc32 hashes of the lowercased word size-shingles of text (the words themselves for short texts)"""
+    words = _WORD.findall(text.lower())
+    if len(words) < size:
+        grams = [' '.join(words)] if words else []
+    else:
+        grams = [' '.join(words[i:i + size]) for i in range(len(words) - size + 1)]
+    return np.unique(np.fromiter((zlib.crc32(gram.encode("utf-8")) for gram in grams), dtype=np.uint64,
+                                 count=len(grams)))
+
+
+class MinHasher:
+    """MinHash signatures from num_perm random hash functions (a * x + b) mod p"""
+
+    def __init__(self, num_perm=128, seed=1):
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+
+    def signature(self, hashes):
+        if not len(hashes):
+            return np.full(len(self.a), _MERSENNE_PRIME, dtype=np.uint64)
+        hashes = hashes % _MERSENNE_PRIME
+        return ((self.a[:, None] * hashes[None, :] + self.b[:, None]) % _MERSENNE_PRIME).min(axis=1)
+
+
+def near_duplicates(texts, threshold=DEFAULT_THRESHOLD, num_perm=128, bands=16):
+    """
+    Cluster near-duplicate texts with MinHash and LSH banding: texts that
+    share a band bucket are compared on their full signatures, and pairs whose
+    estimated Jaccard similarity reaches threshold are joined. Returns, for
+    every text, the position of its cluster's representative (itself if it
+    is one): the longest text of the cluster, the earliest on ties.
+    """
+    hasher = MinHasher(num_perm)
+    signatures = np.array([hasher.signature(shingles(text)) for text in texts]).reshape(len(texts), num_perm)
+    rows = num_perm // bands
+
+    parent = list(range(len(texts)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for band in range(bands):
+        buckets = defaultdict(list)
+        for position, key in enumerate(map(bytes, signatures[:, band * rows:(band + 1) * rows])):
+            buckets[key].append(position)
+        for members in buckets.values():
+            first = members[0]
+            for other in members[1:]:
+                root_first, root_other = find(first), find(other)
+                if root_first == root_other:
+                    continue
+                if np.mean(signatures[first] == signatures[other]) >= threshold:
+                    parent[root_other] = root_first
+
+    clusters = defaultdict(list)
+    for position in range(len(texts)):
+        clusters[find(position)].append(position)
+    representatives = np.arange(len(texts))
+    for members in clusters.values():
+        best = max(members, key=lambda position: (len(texts[position]), -position))
+        representatives[members] = best
+    return representatives
+
+
+def dependent_acts(manifest, changed_acts):
+    """
+    Acts whose duplicate rows point at vectors of changed_acts (acts about to
+    be removed or re-embedded), directly or through other such acts; they
+    have to be re-embedded with them
+    """
+    changed = set(changed_acts)
+    dependents = set()
+    while True:
+        found = {act_key for act_key, act in manifest["acts"].items()
+                 if act_key not in changed and act_key not in dependents
+                 and changed.union(dependents).intersection(act.get("duplicate_of", ()))}
+        if not found:
+            return dependents
+        dependents |= found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Boilerplate and near-duplicate report for the corpus")
+    parser.add_argument("command", choices=["report", "learn"],
+                        help="report: dedup ratio with the current settings; learn: suggest boilerplate phrases")
+    parser.add_argument("--directory", default=".", help="directory with the numeric CSV files")
+    parser.add_argument("--corpus-dir", default="corpus", help="directory with the crawler's corpus shards")
+    parser.add_argument("--boilerplate", help="file with extra boilerplate phrases, one per line")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--min-act-fraction", type=float, default=0.2, help="learn: share of acts a phrase is in")
+    parser.add_argument("--examples", type=int, default=5, help="report: duplicate clusters to print")
+    args = parser.parse_args()
+
+    from embedding import get_csv_files, get_corpus_shards, load_sources
+
+    df = load_sources(get_csv_files(args.directory) + (get_corpus_shards(args.corpus_dir) if args.corpus_dir else []))
+    if args.command == "learn":
+        texts_by_act = [group['text'].astype(str).tolist() for _, group in df.groupby('law_act_id', sort=False)]
+        for phrase in learn_boilerplate(texts_by_act, min_act_fraction=args.min_act_fraction):
+            print(phrase)
+        return
+
+    stripper = BoilerplateStripper(load_boilerplate(args.boilerplate))
+    original = df['text'].astype(str).tolist()
+    texts = [stripper.strip(text) for text in original]
+    stripped_chars = sum(map(len, original)) - sum(map(len, texts))
+    kept = [position for position, text in enumerate(texts) if text]
+    representatives = near_duplicates([texts[position] for position in kept], args.threshold)
+    unique = len(set(representatives.tolist()))
+
+    print(f"Paragraphs:            {len(original)}")
+    print(f"Boilerplate stripped:  {sum(a != b for a, b in zip(original, texts))} paragraphs, "
+          f"{stripped_chars} characters ({100 * stripped_chars / max(1, sum(map(len, original))):.1f}%)")
+    print(f"Empty after stripping: {len(original) - len(kept)}")
+    print(f"Near-duplicates:       {len(kept) - unique} of {len(kept)} fold into {unique} representatives")
+    print(f"Dedup ratio:           {len(original) / max(1, unique):.3f} (paragraphs per embedded text)")
+
+    clusters = defaultdict(list)
+    for position, representative in enumerate(representatives):
+        if position != representative:
+            clusters[representative].append(position)
+    for representative, members in sorted(clusters.items(), key=lambda item: -len(item[1]))[:args.examples]:
+        row = df.iloc[kept[representative]]
+        print(f"\n[{len(members) + 1} paragraphs] act {row['law_act_id']} paragraph {row['paragraph_id']}: "
+              f"{texts[kept[representative]][:120]}")
+        for position in members[:3]:
+            other = df.iloc[kept[position]]
+            print(f"  ~ act {other['law_act_id']} paragraph {other['paragraph_id']}: {texts[kept[position]][:100]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,179 +1,1227 @@
-import pandas as pd
-from transformers import AutoTokenizer, AutoModel
-import torch
-import numpy as np
-import faiss
-import pickle
-import os
-import glob
-import re
-from tqdm import tqdm
-
-# Load model and tokenizer
-model_name = "sentence-transformers/paraphrase-MiniLM-L6-v2"
-tokenizer = AutoTokenizer.from_pretrained(model_name)
-model = AutoModel.from_pretrained(model_name)
-
-
-def get_csv_files(directory="."):
-    """
-    Get all CSV files that start with a number and end with .csv
-    """
-    pattern = os.path.join(directory, "*.csv")
-    all_csv_files = glob.glob(pattern)
-
-    # Filter files that start with a number
-    valid_files = []
-    for file_path in all_csv_files:
-        filename = os.path.basename(file_path)
-        if re.match(r'^\d+.*\.csv$', filename):
-            valid_files.append(file_path)
-
-    return valid_files
-
-
-def load_all_csvs(csv_files):
-    """
-    Load and combine all CSV files into a single dataframe
-    """
-    all_dataframes = []
-
-    for file_path in tqdm(csv_files, desc="Loading CSV files"):
-        try:
-            df = pd.read_csv(file_path)
-            # Add source file information
-            df['source_file'] = os.path.basename(file_path)
-            all_dataframes.append(df)
-            print(f"Loaded {len(df)} records from {os.path.basename(file_path)}")
-        except Exception as e:
-            print(f"Error loading {file_path}: {e}")
-
-    if not all_dataframes:
-        raise ValueError("No valid CSV files found or loaded")
-
-    # Combine all dataframes
-    combined_df = pd.concat(all_dataframes, ignore_index=True)
-    print(f"Total combined records: {len(combined_df)}")
-
-    return combined_df
-
-
-def embed_texts(text_list):
-    embeddings = []
-    batch_size = 16  # small batch size, adjust if needed
-
-    for start_idx in tqdm(range(0, len(text_list), batch_size), desc="Generating embeddings"):
-        batch_texts = text_list[start_idx:start_idx + batch_size]
-        encoded_input = tokenizer(batch_texts, padding=True, truncation=True, return_tensors='pt')
-
-        with torch.no_grad():
-            model_output = model(**encoded_input)
-
-        # Mean pooling
-        token_embeddings = model_output.last_hidden_state  # (batch_size, seq_len, hidden_size)
-        attention_mask = encoded_input['attention_mask'].unsqueeze(-1)  # (batch_size, seq_len, 1)
-        masked_embeddings = token_embeddings * attention_mask
-        summed = masked_embeddings.sum(dim=1)
-        counts = attention_mask.sum(dim=1)
-        mean_pooled = summed / counts
-
-        embeddings.extend(mean_pooled.cpu().numpy())
-
-    return np.array(embeddings)
-
-
-def main():
-    # Get all valid CSV files
-    csv_files = get_csv_files()
-
-    if not csv_files:
-        print("No CSV files found that start with a number!")
-        return
-
-    print(f"Found {len(csv_files)} valid CSV files:")
-    for file in csv_files:
-        print(f"  - {os.path.basename(file)}")
-
-    # Load and combine all CSV files
-    df = load_all_csvs(csv_files)
-
-    # Check if required columns exist
-    if 'text' not in df.columns:
-        print("Error: 'text' column not found in CSV files")
-        return
-
-    # Extract texts
-    texts = df["text"].tolist()
-    print(f"Processing {len(texts)} text entries...")
-
-    # Get embeddings for all texts
-    embeddings = embed_texts(texts)
-    print(f"Generated {len(embeddings)} embeddings with shape {embeddings.shape}")
-
-    # Prepare metadata - include all columns except 'text'
-    metadata_columns = [col for col in df.columns if col != 'text']
-    metadata = df[metadata_columns].to_dict(orient='records')
-
-    # Convert embeddings to float32 and normalize for cosine similarity
-    embeddings = embeddings.astype('float32')
-    faiss.normalize_L2(embeddings)
-
-    # Create FAISS index
-    index = faiss.IndexFlatIP(embeddings.shape[1])  # Inner Product similarity
-    index.add(embeddings)
-    print(f"FAISS index created with {index.ntotal} vectors")
-
-    # Save index and metadata
-    faiss.write_index(index, "unified_semantic_search.index")
-
-    with open("unified_metadata.pkl", "wb") as f:
-        pickle.dump(metadata, f)
-
-    print("Saved unified FAISS index and metadata.")
-    print("Files created:")
-    print("  - unified_semantic_search.index")
-    print("  - unified_metadata.pkl")
-
-
-def search(query, top_k=5, index_path="unified_semantic_search.index", metadata_path="unified_metadata.pkl"):
-    """
-    Search function for the unified vector database
-    """
-    # Load index and metadata
-    index = faiss.read_index(index_path)
-    with open(metadata_path, "rb") as f:
-        metadata = pickle.load(f)
-
-    # Embed query text
-    query_embedding = embed_texts([query])
-    query_embedding = query_embedding.astype('float32')
-    faiss.normalize_L2(query_embedding)
-
-    # Search
-    D, I = index.search(query_embedding, top_k)
-
-    # Format results
-    results = []
-    for score, idx in zip(D[0], I[0]):
-        item = metadata[idx].copy()
-        item['score'] = float(score)
-        results.append(item)
-
-    return results
-
-
-if __name__ == "__main__":
-    main()
-
-    # Example usage after building the database:
-    # query = "example legal text to search"
-    # results = search(query)
-    # print("Search results:")
-    # for i, result in enumerate(results, 1):
-    #     print(f"{i}. Score: {result['score']:.4f}")
-    #     print(f"   Source: {result.get('source_file', 'Unknown')}")
-    #     if 'paragraph_id' in result:
-    #         print(f"   Paragraph ID: {result['paragraph_id']}")
-    #     if 'law_act_id' in result:
-    #         print(f"   Law Act ID: {result['law_act_id']}")
+import pandas as pd
+import numpy as np
+import faiss
+import os
+import json
+import hashlib
+import glob
+import re
+import threading
+import time
+import uuid
+import argparse
+from collections import namedtuple
+from tqdm import tqdm
+
+import metrics
+from embedding_cache import EmbeddingCache
+from metadata_store import MetadataStore, load_metadata, resolve_metadata_path, write_metadata_store
+from text_store import open_text_store, write_text_store
+from index_factory import (INDEX_TYPES, COMPRESSED_TYPES, create_index, train_index, supports_removal,
+                           search_parameters, is_compressed)
+from vector_store import DEFAULT_RESCORE_FACTOR, open_vector_store, write_vector_store, rescore
+from corpus_sink import get_corpus_shards, SHARD_SUFFIX
+from parallel_embed import embed_texts_parallel
+from onnx_backend import BACKENDS, DEFAULT_MODEL_DIR, OnnxEncoder, prepare as prepare_onnx
+from search_filter import SearchFilter, FilterCache, filtered_search
+from chunker import DEFAULT_MIN_TOKENS, DEFAULT_OVERLAP, chunk_dataframe
+from query_cache import DEFAULT_CACHE_SIZE, DEFAULT_CACHE_TTL, QueryCache
+from dedup import DEFAULT_THRESHOLD, BoilerplateStripper, load_boilerplate, near_duplicates, dependent_acts
+
+# The model and tokenizer are loaded on first use (get_model / get_tokenizer), so that
+# importing this module for CSV loading or index work does not pay for torch/transformers
+model_name = "sentence-transformers/paraphrase-MiniLM-L6-v2"
+_model = None
+_tokenizer = None
+_config = None
+_load_lock = threading.Lock()
+
+# Padded tokens per batch when embedding the corpus with length-sorted batching
+DEFAULT_MAX_TOKENS = 4096
+
+# Encoder used by embed_encoded (see set_backend); onnx_encoder is None for eager PyTorch
+backend = "torch"
+onnx_encoder = None
+
+
+def get_tokenizer():
+    global _tokenizer
+    if _tokenizer is None:
+        with _load_lock:
+            if _tokenizer is None:
+                from transformers import AutoTokenizer
+                _tokenizer = AutoTokenizer.from_pretrained(model_name)
+    return _tokenizer
+
+
+def get_model():
+    global _model
+    if _model is None:
+        with _load_lock:
+            if _model is None:
+                from transformers import AutoModel
+                _model = AutoModel.from_pretrained(model_name)
+                _model.eval()
+    return _model
+
+
+def embedding_dimension():
+    """Size of the embeddings, read from the model config without loading the weights"""
+    global _config
+    if _model is not None:
+        return _model.config.hidden_size
+    if _config is None:
+        from transformers import AutoConfig
+        _config = AutoConfig.from_pretrained(model_name)
+    return _config.hidden_size
+
+
+def max_sequence_length():
+    """Longest input, in tokens with the special tokens, that the encoder sees without truncation"""
+    global _config
+    if _config is None:
+        from transformers import AutoConfig
+        _config = AutoConfig.from_pretrained(model_name)
+    return min(get_tokenizer().model_max_length, _config.max_position_embeddings)
+
+
+def chunking_config(chunk=True, overlap=DEFAULT_OVERLAP):
+    """How main() and the streaming indexer chunk paragraphs (recorded in the manifest), or None"""
+    return {"max_length": max_sequence_length(), "overlap": overlap, "min_tokens": DEFAULT_MIN_TOKENS} if chunk else None
+
+
+def chunk_acts(acts, chunking):
+    """
+    Split the paragraphs of (act_key, content_hash, act_df) acts into chunks
+    that fit the encoder (see chunker.py); every chunk keeps its paragraph_id
+    and gets a chunk_index. The content hashes stay those of the paragraphs.
+    """
+    if chunking is None or not acts:
+        return acts
+    tokenizer = get_tokenizer()
+    chunked = []
+    paragraphs = chunks = split = 0
+    for act_key, content_hash, act_df in acts:
+        with metrics.stage("chunk"):
+            chunk_df, act_split = chunk_dataframe(act_df, tokenizer, chunking["max_length"], chunking["overlap"],
+                                                  chunking.get("min_tokens", 0))
+        chunked.append((act_key, content_hash, chunk_df))
+        paragraphs += len(act_df)
+        chunks += len(chunk_df)
+        split += act_split
+    print(f"Chunked {paragraphs} paragraphs into {chunks} chunks of at most {chunking['max_length']} tokens "
+          f"({split} paragraphs split)")
+    return chunked
+
+
+def dedup_config(dedup=True, threshold=DEFAULT_THRESHOLD, boilerplate_path=None):
+    """How main() strips boilerplate and folds near-duplicates (recorded in the manifest), or None"""
+    return {"threshold": threshold, "boilerplate": load_boilerplate(boilerplate_path)} if dedup else None
+
+
+def strip_boilerplate(df, dedup_settings):
+    """Remove the configured boilerplate phrases from the paragraph texts and drop paragraphs left empty"""
+    if dedup_settings is None or 'text' not in df.columns:
+        return df
+    stripper = BoilerplateStripper(dedup_settings["boilerplate"])
+    df = df.assign(text=[stripper.strip(str(text)) for text in df['text']])
+    return df[df['text'] != ''].reset_index(drop=True)
+
+
+def warmup():
+    """
+    Load the tokenizer and the encoder of the current backend and run one
+    tiny batch, for servers that want to pay the start-up cost before the
+    first request instead of on it
+    """
+    start = time.perf_counter()
+    embed_texts(["warm-up"], progress=False)
+    print(f"Encoder ({backend}) ready in {time.perf_counter() - start:.2f}s")
+
+
+def __getattr__(name):
+    # `embedding.model` / `embedding.tokenizer` keep working, loading on first access
+    if name == "model":
+        return get_model()
+    if name == "tokenizer":
+        return get_tokenizer()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def set_backend(name="torch", model_dir=DEFAULT_MODEL_DIR, threads=None):
+    """
+    Select the encoder behind embed_texts and search: eager PyTorch fp32
+    ("torch"), the exported ONNX graph run by ONNX Runtime ("onnx") or its
+    dynamically int8-quantized version ("onnx-int8"). The graphs are
+    exported to model_dir on first use.
+    """
+    global backend, onnx_encoder
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend {name!r}, expected one of {BACKENDS}")
+    onnx_encoder = None if name == "torch" else OnnxEncoder(prepare_onnx(name, get_model, model_dir), threads)
+    backend = name
+
+
+def encoder_key():
+    """Identifies the encoder that embed_texts currently uses, for caches of its output"""
+    return model_name, backend
+
+
+def open_embedding_cache(cache_dir):
+    """
+    The on-disk embedding cache for the current backend. int8 vectors differ
+    from the fp32 ones, so they are kept in a cache of their own.
+    """
+    if backend == "onnx-int8":
+        return EmbeddingCache(f"{cache_dir}-int8", f"{model_name}#int8", embedding_dimension())
+    return EmbeddingCache(cache_dir, model_name, embedding_dimension())
+
+
+def get_csv_files(directory="."):
+    """
+    Get all CSV files that start with a number and end with .csv
+    """
+    pattern = os.path.join(directory, "*.csv")
+    all_csv_files = glob.glob(pattern)
+
+    # Filter files that start with a number
+    valid_files = []
+    for file_path in all_csv_files:
+        filename = os.path.basename(file_path)
+        if re.match(r'^\d+.*\.csv$', filename):
+            valid_files.append(file_path)
+
+    return valid_files
+
+
+def load_all_csvs(csv_files):
+    """
+    Load and combine all CSV files into a single dataframe
+    """
+    all_dataframes = []
+
+    for file_path in tqdm(csv_files, desc="Loading CSV files"):
+        try:
+            df = pd.read_csv(file_path)
+            # Add source file information
+            df['source_file'] = os.path.basename(file_path)
+            all_dataframes.append(df)
+            print(f"Loaded {len(df)} records from {os.path.basename(file_path)}")
+        except Exception as e:
+            print(f"Error loading {file_path}: {e}")
+
+    if not all_dataframes:
+        raise ValueError("No valid CSV files found or loaded")
+
+    # Combine all dataframes
+    combined_df = pd.concat(all_dataframes, ignore_index=True)
+    print(f"Total combined records: {len(combined_df)}")
+
+    return combined_df
+
+
+def iter_corpus(shard_paths):
+    """
+    Stream paragraph rows (with their source_file) from corpus shards, one
+    sequential read per shard
+    """
+    for path in shard_paths:
+        source_file = os.path.basename(path)
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                row = json.loads(line)
+                row['source_file'] = source_file
+                yield row
+
+
+def load_corpus(shard_paths):
+    """
+    Load corpus shards into a single dataframe like load_all_csvs. An act
+    that was crawled again (e.g. by a refresh) appears in several shards;
+    only the rows from its latest shard are kept.
+    """
+    df = pd.DataFrame.from_records(iter_corpus(tqdm(sorted(shard_paths), desc="Loading corpus shards")))
+    if df.empty:
+        raise ValueError("No rows found in the corpus shards")
+    print(f"Loaded {len(df)} records from {len(shard_paths)} corpus shards")
+    return latest_act_versions(df)
+
+
+def load_sources(paths):
+    """
+    Load and combine CSV files and corpus shards into one dataframe; shards
+    come last so their acts win
+    """
+    csv_paths = [path for path in paths if not path.endswith(SHARD_SUFFIX)]
+    shard_paths = [path for path in paths if path.endswith(SHARD_SUFFIX)]
+    frames = []
+    if csv_paths:
+        frames.append(load_all_csvs(csv_paths))
+    if shard_paths:
+        frames.append(load_corpus(shard_paths))
+    if not frames:
+        raise ValueError("No CSV files or corpus shards to load")
+    return latest_act_versions(pd.concat(frames, ignore_index=True)) if len(frames) > 1 else frames[0]
+
+
+def latest_act_versions(df):
+    """Keep, for every law act, only the rows from the last source file it appears in"""
+    latest_source = df.groupby('law_act_id', sort=False)['source_file'].transform('last')
+    return df[df['source_file'] == latest_source].reset_index(drop=True)
+
+
+def embed_encoded(encoded_input):
+    """
+    Run the model on an already tokenized, padded batch and mean-pool the token embeddings
+    """
+    if onnx_encoder is not None:
+        return onnx_encoder(encoded_input)
+
+    import torch
+    with torch.no_grad():
+        model_output = get_model()(**encoded_input)
+
+    # Mean pooling
+    token_embeddings = model_output.last_hidden_state  # (batch_size, seq_len, hidden_size)
+    attention_mask = encoded_input['attention_mask'].unsqueeze(-1)  # (batch_size, seq_len, 1)
+    masked_embeddings = token_embeddings * attention_mask
+    summed = masked_embeddings.sum(dim=1)
+    counts = attention_mask.sum(dim=1)
+    mean_pooled = summed / counts
+
+    return mean_pooled.cpu().numpy()
+
+
+def token_budget_batches(lengths, max_tokens):
+    """
+    Group positions into batches of similar token length.
+
+    Positions are sorted by length and packed greedily so that
+    batch_size * longest_member stays within max_tokens (a single text longer
+    than the budget gets a batch of its own).
+    """
+    order = np.argsort(lengths, kind='stable')
+    batches = []
+    current = []
+    for position in order:
+        padded_len = lengths[position]  # ascending order, so this is the batch maximum
+        if current and (len(current) + 1) * padded_len > max_tokens:
+            batches.append(current)
+            current = []
+        current.append(int(position))
+    if current:
+        batches.append(current)
+    return batches
+
+
+def embed_texts(text_list, batch_size=16, max_tokens=None, cache=None, progress=True, workers=1):
+    """
+    Embed texts with mean pooling over the model's last hidden state.
+
+    By default the input is cut into fixed batches of batch_size in input order.
+    With max_tokens set, texts are tokenized once, sorted by token length and
+    packed into batches of at most max_tokens padded tokens, which avoids
+    computing over padding when text lengths vary a lot. The output is in the
+    original order either way.
+
+    progress=False hides the tqdm bar (for query-time calls).
+
+    workers > 1 spreads the texts over that many model processes (see
+    parallel_embed.embed_texts_parallel); the output is the same.
+
+    If an EmbeddingCache is given, cached texts are read from it, only the
+    distinct missing texts go through the model, and the new vectors are
+    written back to the cache.
+    """
+    if cache is not None:
+        keys = [cache.key(text) for text in text_list]
+        with metrics.stage("embedding_cache"):
+            embeddings, found = cache.get(keys)
+        metrics.counter("embedding_cache_lookups_total", "Embedding cache lookups by result").inc(
+            int(found.sum()), result="hit")
+        metrics.counter("embedding_cache_lookups_total").inc(int((~found).sum()), result="miss")
+        missing = {}
+        for position in np.flatnonzero(~found):
+            missing.setdefault(keys[position], []).append(position)
+        print(f"Embedding cache: {int(found.sum())} of {len(text_list)} texts cached, "
+              f"{len(missing)} distinct texts to embed")
+
+        if missing:
+            missing_texts = [text_list[positions[0]] for positions in missing.values()]
+            new_embeddings = embed_texts(missing_texts, batch_size=batch_size, max_tokens=max_tokens,
+                                         progress=progress, workers=workers)
+            for positions, vector in zip(missing.values(), new_embeddings):
+                embeddings[positions] = vector
+            with metrics.stage("embedding_cache"):
+                cache.put(list(missing), new_embeddings)
+                cache.save()
+
+        return embeddings
+
+    if workers > 1:
+        return embed_texts_parallel(text_list, embedding_dimension(), workers=workers, max_tokens=max_tokens,
+                                    batch_size=batch_size, backend=backend)
+
+    tokenizer = get_tokenizer()
+    # The ONNX backends take numpy input, so they never need torch
+    tensor_type = 'pt' if onnx_encoder is None else 'np'
+    metrics.counter("texts_embedded_total", "Texts run through the encoder").inc(len(text_list))
+
+    if max_tokens is None:
+        embeddings = []
+
+        for start_idx in tqdm(range(0, len(text_list), batch_size), desc="Generating embeddings",
+                              disable=not progress):
+            batch_texts = text_list[start_idx:start_idx + batch_size]
+            with metrics.stage("tokenize"):
+                encoded_input = tokenizer(batch_texts, padding=True, truncation=True, return_tensors=tensor_type)
+            with metrics.stage("forward"):
+                embeddings.extend(embed_encoded(encoded_input))
+
+        return np.array(embeddings)
+
+    with metrics.stage("tokenize"):
+        encoded = tokenizer(list(text_list), truncation=True)
+    lengths = np.array([len(ids) for ids in encoded['input_ids']])
+    embeddings = np.zeros((len(text_list), embedding_dimension()), dtype='float32')
+
+    for batch in tqdm(token_budget_batches(lengths, max_tokens), desc="Generating embeddings", disable=not progress):
+        with metrics.stage("tokenize"):
+            features = {key: [values[position] for position in batch] for key, values in encoded.items()}
+            encoded_input = tokenizer.pad(features, padding=True, return_tensors=tensor_type)
+        with metrics.stage("forward"):
+            embeddings[batch] = embed_encoded(encoded_input)
+
+    return embeddings
+
+
+def load_manifest(manifest_path):
+    """
+    Load the incremental build manifest, or return an empty one if it does not exist yet.
+
+    The manifest maps each law_act_id to the content hash of its paragraphs and the
+    [start, end) range of vector ids it occupies, and each source file to the
+    size/mtime it had when it was last indexed.
+    """
+    if not os.path.exists(manifest_path):
+        return {"next_id": 0, "files": {}, "acts": {}}
+
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, manifest_path):
+    """
+    Write the manifest to a temporary file and atomically move it into place
+    """
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp_path, manifest_path)
+
+
+def manifest_act_ranges(manifest):
+    """law_act_id -> [start, end) vector id range of every act in the manifest"""
+    return {act_id: (act["start"], act["end"]) for act_id, act in manifest["acts"].items()}
+
+
+def load_build_sources(paths, law_act_range=None, dedup_settings=None):
+    """load_sources() restricted to law_act_range, with the boilerplate of the dedup config stripped"""
+    with metrics.stage("load_sources"):
+        df = load_sources(paths)
+        if law_act_range is not None:
+            df = df[in_act_range(df['law_act_id'], law_act_range)]
+        return strip_boilerplate(df, dedup_settings)
+
+
+def act_content_hash(act_df):
+    """
+    Hash the paragraph ids and texts of one law act, in file order
+    """
+    digest = hashlib.sha256()
+    for paragraph_id, text in zip(act_df['paragraph_id'], act_df['text']):
+        digest.update(f"{paragraph_id}\t{text}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def in_act_range(law_act_ids, act_range):
+    """
+    Boolean mask of the law_act_ids (a pandas Series) with low <= id < high.
+    A None bound is open; ids that are not numbers count as -1, so they land
+    in the range with an open lower end.
+    """
+    low, high = act_range
+    numeric_ids = pd.to_numeric(law_act_ids, errors='coerce').fillna(-1)
+    mask = pd.Series(True, index=law_act_ids.index)
+    if low is not None:
+        mask &= numeric_ids >= low
+    if high is not None:
+        mask &= numeric_ids < high
+    return mask
+
+
+def file_signature(file_path):
+    stat = os.stat(file_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def main(incremental=False, directory=".", index_path="unified_semantic_search.index",
+         metadata_path="unified_metadata", manifest_path="index_manifest.json", max_tokens=DEFAULT_MAX_TOKENS,
+         cache_dir="embedding_cache", index_type="flat", index_params=None, text_path="unified_texts",
+         changed_acts=None, corpus_dir="corpus", workers=1, law_act_range=None, chunk=True,
+         chunk_overlap=DEFAULT_OVERLAP, dedup=True, dedup_threshold=DEFAULT_THRESHOLD, boilerplate_path=None,
+         vectors_path="unified_vectors"):
+    """
+    Build the unified index from the numeric CSV files and the corpus shards
+    in corpus_dir (see corpus_sink.py). Shards are treated like CSV files
+    that never change; when an act is in several, its latest shard wins.
+
+    With incremental=True the existing index, metadata and manifest are reused:
+    CSV files whose size/mtime did not change are not even read, acts whose
+    content hash changed or disappeared have their vectors removed, and only
+    new or changed acts are embedded and appended. Without it, everything is
+    rebuilt from scratch (the manifest is still written so the next run can be
+    incremental). max_tokens is the padded-token budget per embedding batch
+    (None for fixed batches of 16). Embeddings are looked up in and added to
+    the on-disk cache in cache_dir (None disables it), so rebuilding an
+    unchanged corpus, e.g. to try another index type, needs no model inference.
+    workers > 1 embeds in that many processes (parallel_embed.py).
+
+    index_type selects the FAISS index (see index_factory.INDEX_TYPES) and
+    index_params its build parameters (nlist, pq_m, pq_bits, hnsw_m). Changing
+    either forces a full rebuild; trained index types are trained on a sample
+    of the embeddings of that build.
+
+    Paragraph texts are written to the append-only text store in text_path in
+    the same pass, keyed by vector id, so search results can carry their text.
+    For index types that store compressed codes (index_factory.COMPRESSED_TYPES:
+    fp16 / int8 scalar quantization, PQ) the exact float32 vectors are also
+    appended to the memory-mapped vector store in vectors_path, which the
+    Searcher uses to rescore the index's candidates.
+
+    changed_acts (an iterable of law_act_ids, e.g. the spider's changed-acts
+    list) limits an incremental build to those acts' CSV files and to corpus
+    shards that were not indexed before; all other files are assumed
+    unchanged and are not even stat'ed.
+
+    law_act_range = (low, high) only indexes acts with low <= law_act_id < high
+    (None for an open end; see in_act_range), which is how sharded_index.py
+    builds one shard of a partitioned index.
+
+    With chunk=True, paragraphs longer than the encoder's maximum sequence
+    length are split at article ("N-modda. Title") headings into windows that
+    fit it (chunk_overlap tokens repeated where an article itself is split,
+    none shorter than chunker.DEFAULT_MIN_TOKENS), so nothing is lost to
+    truncation; each chunk is its own vector with the
+    paragraph's paragraph_id and a chunk_index. Changing the chunking forces
+    a full rebuild.
+
+    With dedup=True, the lex.uz boilerplate phrases (plus those listed in
+    boilerplate_path) are stripped from the texts before they are hashed,
+    and the chunks embedded by a run are clustered with MinHash/LSH (see
+    dedup.py): only one representative per cluster of near-duplicates
+    (estimated Jaccard similarity >= dedup_threshold) is embedded and added
+    to the index, the others keep their vector id and metadata with a
+    representative_id pointing at it. Acts with duplicates of a changed act
+    are re-embedded with it. Changing the dedup settings forces a full rebuild.
+    """
+    index_params = index_params or {}
+    # Get all valid CSV files and corpus shards
+    csv_files = get_csv_files(directory)
+    shard_files = get_corpus_shards(corpus_dir) if corpus_dir else []
+
+    if not csv_files and not shard_files:
+        print("No CSV files found that start with a number, and no corpus shards!")
+        return
+
+    print(f"Found {len(csv_files)} valid CSV files and {len(shard_files)} corpus shards")
+    source_files = csv_files + shard_files
+
+    dimension = embedding_dimension()
+    chunking = chunking_config(chunk, chunk_overlap)
+    store_vectors = index_type in COMPRESSED_TYPES
+    dedup_settings = dedup_config(dedup, dedup_threshold, boilerplate_path)
+    index = None
+    base_metadata = None  # existing columnar store, updated in place of a full rewrite
+    metadata = {}  # vector id -> row for the vectors added by this run
+    texts_by_id = {}  # vector id -> text for the vectors added by this run
+    new_vector_ids = np.zeros(0, dtype='int64')  # ids and float32 vectors added to the index by this run
+    new_vectors = np.zeros((0, dimension), dtype='float32')
+    manifest = {"next_id": 0, "files": {}, "acts": {}}
+
+    if incremental and os.path.exists(manifest_path) and os.path.exists(index_path) \
+            and os.path.exists(metadata_path):
+        index = faiss.read_index(index_path)
+        manifest = load_manifest(manifest_path)
+        if not isinstance(index, faiss.IndexIDMap2):
+            print("Existing index does not support incremental updates, rebuilding from scratch")
+            index = None
+        elif manifest.get("index_type", "flat") != index_type or manifest.get("index_params", {}) != index_params:
+            print(f"Index type changed to {index_type} {index_params}, rebuilding from scratch")
+            index = None
+        elif manifest.get("chunking") != chunking:
+            print(f"Chunking changed to {chunking}, rebuilding from scratch")
+            index = None
+        elif manifest.get("dedup") != dedup_settings:
+            print("Dedup settings changed, rebuilding from scratch")
+            index = None
+        elif not os.path.isdir(metadata_path) or not os.path.isdir(text_path):
+            print("Existing metadata is a legacy pickle or has no text store, rebuilding from scratch")
+            index = None
+        elif store_vectors and not os.path.isdir(vectors_path):
+            print("Existing index has no exact vector store, rebuilding from scratch")
+            index = None
+        elif any(version not in (None, manifest.get("version"))
+                 for version in [read_index_version(index_path), MetadataStore(metadata_path).version,
+                                 open_text_store(text_path).version]
+                 + ([open_vector_store(vectors_path).version] if store_vectors else [])):
+            print("Existing index files are from an interrupted build, rebuilding from scratch")
+            index = None
+        else:
+            base_metadata = MetadataStore(metadata_path)
+            print(f"Loaded existing index with {index.ntotal} vectors and {len(manifest['acts'])} acts")
+
+        if index is None:
+            manifest = {"next_id": 0, "files": {}, "acts": {}}
+
+    if index is not None and index.ntotal:
+        # Never reuse an id that is already in the index, even if the manifest is behind
+        existing_ids = faiss.vector_to_array(index.id_map)
+        manifest["next_id"] = max(manifest["next_id"], int(existing_ids.max()) + 1)
+
+    # Only read files that are new or changed since the last build
+    current_files = {os.path.basename(path): path for path in source_files}
+    if changed_acts is not None and base_metadata is not None:
+        candidate_files = {name: current_files[name] for name in (f"{act_id}.csv" for act_id in changed_acts)
+                           if name in current_files}
+        # Changed acts crawled into the corpus are in shards that were not indexed yet
+        candidate_files.update((os.path.basename(path), path) for path in shard_files
+                               if os.path.basename(path) not in manifest["files"])
+    else:
+        candidate_files = current_files
+    changed_files = [path for name, path in candidate_files.items()
+                     if manifest["files"].get(name) != file_signature(path)]
+    print(f"{len(changed_files)} of {len(source_files)} CSV files and shards are new or changed")
+
+    stale_acts = [act_id for act_id, act in manifest["acts"].items()
+                  if act["source_file"] not in current_files]
+    acts_to_embed = []
+
+    if changed_files:
+        df = load_build_sources(changed_files, law_act_range, dedup_settings)
+
+        # Check if required columns exist
+        if 'text' not in df.columns:
+            print("Error: 'text' column not found in CSV files")
+            return
+
+        changed_names = {os.path.basename(path) for path in changed_files}
+        seen_acts = set()
+        for law_act_id, act_df in df.groupby('law_act_id', sort=False):
+            act_key = str(law_act_id)
+            seen_acts.add(act_key)
+            content_hash = act_content_hash(act_df)
+            previous = manifest["acts"].get(act_key)
+            if previous is not None and previous["hash"] == content_hash:
+                continue
+            if previous is not None:
+                stale_acts.append(act_key)
+            acts_to_embed.append((act_key, content_hash, act_df))
+
+        # Acts that used to live in a changed file but are no longer in it
+        stale_acts.extend(act_id for act_id, act in manifest["acts"].items()
+                          if act["source_file"] in changed_names and act_id not in seen_acts)
+
+    # Acts with duplicates of paragraphs that are about to be removed are re-embedded along with them
+    dependents = dependent_acts(manifest, stale_acts + [act_key for act_key, _, _ in acts_to_embed])
+    if dependents:
+        dependent_files = sorted({current_files[manifest["acts"][act_key]["source_file"]] for act_key in dependents})
+        df = load_build_sources(dependent_files, law_act_range, dedup_settings)
+        for law_act_id, act_df in df.groupby('law_act_id', sort=False):
+            act_key = str(law_act_id)
+            if act_key in dependents:
+                stale_acts.append(act_key)
+                acts_to_embed.append((act_key, act_content_hash(act_df), act_df))
+        print(f"Re-embedding {len(dependents)} acts with duplicates of new or changed paragraphs")
+
+    # Remove vectors of changed and deleted acts in one pass
+    if stale_acts and not supports_removal(index):
+        print(f"{index_type} index cannot remove vectors, rebuilding from scratch")
+        return main(incremental=False, directory=directory, index_path=index_path, metadata_path=metadata_path,
+                    manifest_path=manifest_path, max_tokens=max_tokens, cache_dir=cache_dir,
+                    index_type=index_type, index_params=index_params, text_path=text_path,
+                    corpus_dir=corpus_dir, workers=workers, law_act_range=law_act_range, chunk=chunk,
+                    chunk_overlap=chunk_overlap, dedup=dedup, dedup_threshold=dedup_threshold,
+                    boilerplate_path=boilerplate_path, vectors_path=vectors_path)
+
+    stale_ids = []
+    if stale_acts:
+        for act_key in stale_acts:
+            act = manifest["acts"].pop(act_key)
+            stale_ids.extend(range(act["start"], act["end"]))
+        with metrics.stage("index_remove"):
+            removed = index.remove_ids(np.array(stale_ids, dtype='int64'))
+        print(f"Removed {removed} stale vectors from {len(stale_acts)} acts")
+
+    acts_to_embed = chunk_acts(acts_to_embed, chunking)
+    if acts_to_embed:
+        # Extract texts
+        texts = [text for _, _, act_df in acts_to_embed for text in act_df['text'].tolist()]
+        print(f"Processing {len(texts)} text entries from {len(acts_to_embed)} new or changed acts...")
+
+        # Only one representative of every cluster of near-duplicates is embedded
+        if dedup_settings is not None:
+            with metrics.stage("dedup"):
+                representatives = near_duplicates(texts, dedup_settings["threshold"])
+        else:
+            representatives = np.arange(len(texts))
+        unique = np.flatnonzero(representatives == np.arange(len(texts)))
+        print(f"Dedup: {len(texts) - len(unique)} near-duplicates fold into {len(unique)} texts to embed "
+              f"(dedup ratio {len(texts) / max(1, len(unique)):.3f})")
+
+        # Get embeddings for all texts
+        cache = open_embedding_cache(cache_dir) if cache_dir else None
+        embeddings = embed_texts([texts[i] for i in unique], max_tokens=max_tokens, cache=cache, workers=workers)
+        print(f"Generated {len(embeddings)} embeddings with shape {embeddings.shape}")
+
+        # Convert embeddings to float32 and normalize for cosine similarity
+        embeddings = embeddings.astype('float32')
+        faiss.normalize_L2(embeddings)
+
+        # Give every act a contiguous range of fresh vector ids
+        vector_ids = np.arange(manifest["next_id"], manifest["next_id"] + len(texts), dtype='int64')
+        act_of_position = [act_key for act_key, _, act_df in acts_to_embed for _ in range(len(act_df))]
+        next_id = manifest["next_id"]
+        for act_key, content_hash, act_df in acts_to_embed:
+            # Prepare metadata - include all columns except 'text'
+            metadata_columns = [col for col in act_df.columns if col != 'text']
+            duplicate_of = set()
+            for row, text in zip(act_df[metadata_columns].to_dict(orient='records'), act_df['text']):
+                position = next_id - manifest["next_id"]
+                representative = int(representatives[position])
+                if representative != position:
+                    row['representative_id'] = int(vector_ids[representative])
+                    duplicate_of.add(act_of_position[representative])
+                metadata[next_id] = row
+                texts_by_id[next_id] = text
+                next_id += 1
+            manifest["acts"][act_key] = {
+                "hash": content_hash,
+                "start": next_id - len(act_df),
+                "end": next_id,
+                "source_file": act_df['source_file'].iloc[0],
+            }
+            duplicate_of.discard(act_key)
+            if duplicate_of:
+                manifest["acts"][act_key]["duplicate_of"] = sorted(duplicate_of)
+        manifest["next_id"] = next_id
+
+        if index is None:
+            index = create_index(index_type, dimension, len(embeddings), **index_params)
+            with metrics.stage("index_train"):
+                train_index(index, embeddings)
+        with metrics.stage("index_add"):
+            index.add_with_ids(embeddings, vector_ids[unique])
+        new_vector_ids, new_vectors = vector_ids[unique], embeddings
+
+    if index is None:
+        # Nothing to add at all; keep an empty index of the requested type
+        index = create_index(index_type, dimension, 0, **index_params)
+
+    manifest["index_type"] = index_type
+    manifest["index_params"] = index_params
+    manifest["chunking"] = chunking
+    manifest["dedup"] = dedup_settings
+
+    for name, path in candidate_files.items():
+        manifest["files"][name] = file_signature(path)
+    for name in list(manifest["files"]):
+        if name not in current_files:
+            del manifest["files"][name]
+
+    if incremental and not stale_acts and not acts_to_embed:
+        save_manifest(manifest, manifest_path)
+        print(f"Index is up to date ({index.ntotal} vectors)")
+        return
+
+    print(f"FAISS index has {index.ntotal} vectors")
+
+    # A fresh version stamp tells Searchers that results cached for the previous index are stale
+    manifest["version"] = new_index_version()
+
+    # Save index and metadata (each file atomically), all stamped with the version. The index's version
+    # file goes last: a Searcher only installs a snapshot whose stores all carry the version it names
+    with metrics.stage("save"):
+        write_metadata_store(metadata_path, metadata, base=base_metadata, removed_ids=stale_ids,
+                             act_ranges=manifest_act_ranges(manifest), version=manifest["version"])
+        write_text_store(text_path, texts_by_id, append=base_metadata is not None, version=manifest["version"])
+        if store_vectors:
+            write_vector_store(vectors_path, new_vector_ids, new_vectors, dimension,
+                               append=base_metadata is not None, version=manifest["version"])
+        save_index(index, index_path, version=manifest["version"])
+        save_manifest(manifest, manifest_path)
+
+    print("Saved unified FAISS index and metadata.")
+    print("Files created:")
+    print(f"  - {index_path}")
+    print(f"  - {metadata_path}")
+    print(f"  - {text_path}")
+    if store_vectors:
+        print(f"  - {vectors_path}")
+    print(f"  - {manifest_path}")
+
+
+def new_index_version():
+    """Unique stamp for one written state of an index (stored in its manifest, stores and version file)"""
+    return uuid.uuid4().hex
+
+
+def index_version_path(index_path):
+    return index_path + ".version"
+
+
+def read_index_version(index_path):
+    """The version stamp next to an index, or None for indexes written before version stamps"""
+    try:
+        with open(index_version_path(index_path), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def save_index(index, index_path, version=None):
+    """
+    Write a FAISS index to a temporary file and atomically move it into place,
+    then its version file (written after the index, so a version file never
+    names an index that is not in place yet)
+    """
+    tmp_path = index_path + ".tmp"
+    faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, index_path)
+    if version is not None:
+        version_path = index_version_path(index_path)
+        with open(version_path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(version)
+        os.replace(version_path + ".tmp", version_path)
+
+
+# Loads of a half-written build before reload() gives up until the next check
+RELOAD_ATTEMPTS = 5
+RELOAD_RETRY_DELAY = 0.2
+
+IndexSnapshot = namedtuple("IndexSnapshot", ["index", "metadata", "texts", "vectors", "signature", "filters",
+                                             "version"])
+
+
+class Searcher:
+    """
+    Long-lived search object that keeps the FAISS index and metadata open.
+    metadata_path is a columnar store directory; if none exists there, the
+    legacy pickle metadata_path + ".pkl" is used (see resolve_metadata_path).
+
+    The index and metadata files are checked for changes at most once every
+    `check_interval` seconds. When a rebuild replaces them, the new files are
+    loaded in a background thread and swapped in as a single snapshot, so
+    queries that are already running finish on the snapshot they started with
+    and new queries never wait for the reload. A snapshot is only installed if
+    the index, metadata, text and vector stores all carry the version named by
+    the index's version file and no file changed while it was loaded; a
+    reload that catches a build half-written keeps the previous snapshot and
+    is retried.
+
+    nprobe (IVF indexes) and ef_search (HNSW indexes) set the default
+    speed/recall trade-off; both can be overridden per query. If the index
+    was built with a text store, results can include the paragraph text or
+    a snippet of it.
+
+    Searches can be restricted to some law_act_ids, source_files and/or a
+    [low, high) law_act_range of numeric law_act_ids. The filter is compiled
+    once per snapshot into a set of vector ids and applied inside the search
+    (see search_filter), so every returned hit matches it and narrow filters
+    are cheaper than unfiltered queries.
+
+    For compressed indexes (fp16 / int8 codes, PQ) with an exact vector store,
+    rescore_factor * top_k candidates are fetched from the index and re-ranked
+    by their exact float32 scores (rescore_factor=1 turns that off).
+
+    Repeated queries are answered from a QueryCache (see query_cache.py) of
+    up to cache_size query embeddings and result lists, each kept for at most
+    cache_ttl seconds; cached results belong to one index version and are
+    dropped whenever a snapshot is installed, so a rebuild never serves stale
+    hits. cache_size=0 disables the cache.
+
+    Near-duplicate paragraphs folded by the build (see dedup.py) are not in
+    the index; they are listed under 'duplicates' of the hit they were folded
+    into, and a filter that selects them matches that hit.
+    """
+
+    def __init__(self, index_path="unified_semantic_search.index", metadata_path="unified_metadata",
+                 check_interval=1.0, nprobe=None, ef_search=None, text_path="unified_texts",
+                 vectors_path="unified_vectors", rescore_factor=DEFAULT_RESCORE_FACTOR,
+                 cache_size=DEFAULT_CACHE_SIZE, cache_ttl=DEFAULT_CACHE_TTL):
+        self.index_path = index_path
+        self.metadata_path = metadata_path
+        self.text_path = text_path
+        self.vectors_path = vectors_path
+        self.rescore_factor = rescore_factor
+        self.check_interval = check_interval
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.cache = QueryCache(cache_size, cache_ttl) if cache_size else None
+        self._snapshot = None
+        self._reload_lock = threading.Lock()
+        self._last_check = time.monotonic()
+        self.reload()
+
+    def _file_signature(self):
+        signature = []
+        for path in (self.index_path, resolve_metadata_path(self.metadata_path)):
+            stat = os.stat(path)
+            signature.append((stat.st_ino, stat.st_size, stat.st_mtime_ns))
+        # Indexes written before version stamps have no version file
+        version_path = index_version_path(self.index_path)
+        if os.path.exists(version_path):
+            stat = os.stat(version_path)
+            signature.append((stat.st_ino, stat.st_size, stat.st_mtime_ns))
+        return tuple(signature)
+
+    def _load_snapshot(self):
+        signature = self._file_signature()
+        # The version file is written last by a build, so every store already carries the version it names
+        build_version = read_index_version(self.index_path)
+        index = faiss.read_index(self.index_path)
+        metadata = load_metadata(self.metadata_path)
+        texts = open_text_store(self.text_path)
+        # Exact vectors are only needed to rescore an index that approximates them
+        vectors = open_vector_store(self.vectors_path) if is_compressed(index) else None
+
+        if self._file_signature() != signature:
+            raise ValueError("Index files changed while loading (rebuild in progress?)")
+        if build_version is not None:
+            stale = [name for name, store in [("metadata", metadata), ("text store", texts),
+                                              ("vector store", vectors)]
+                     if store is not None and getattr(store, "version", None) != build_version]
+            if stale:
+                raise ValueError(f"{', '.join(stale)} not at index version {build_version} (rebuild in progress?)")
+
+        # Near-duplicates have metadata but share their representative's vector
+        num_vectors = metadata.num_vectors if isinstance(metadata, MetadataStore) else len(metadata)
+        if index.ntotal != num_vectors:
+            raise ValueError(
+                f"Index has {index.ntotal} vectors but metadata has {num_vectors} records with a vector "
+                f"(rebuild in progress?)")
+
+        # The checked build version covers the index and every store; for indexes written before version
+        # stamps the file signature (index and metadata) changes with every build too
+        version = build_version or signature
+        return IndexSnapshot(index, metadata, texts, vectors, signature, FilterCache(metadata), version)
+
+    def reload(self, force=True):
+        """
+        Load the index and metadata from disk and swap them in.
+        Returns True if a new snapshot was installed.
+        """
+        with self._reload_lock:
+            if not force and self._snapshot is not None and self._file_signature() == self._snapshot.signature:
+                return False
+            for attempt in range(RELOAD_ATTEMPTS):
+                try:
+                    snapshot = self._load_snapshot()
+                    break
+                except (ValueError, FileNotFoundError):
+                    # Caught a build between two of its writes; it finishes within moments
+                    if attempt == RELOAD_ATTEMPTS - 1:
+                        raise
+                    time.sleep(RELOAD_RETRY_DELAY)
+            self._snapshot = snapshot
+            if self.cache is not None:
+                # Results computed on the previous snapshot are never valid for this one
+                self.cache.results.clear()
+            return True
+
+    def _reload_in_background(self):
+        try:
+            if self.reload(force=False):
+                print(f"Reloaded index with {self._snapshot.index.ntotal} vectors from {self.index_path}")
+        except Exception as e:
+            # Keep serving the previous snapshot; the next check will try again
+            print(f"Error reloading index {self.index_path}: {e}")
+
+    def check_for_update(self):
+        """
+        Start a background reload if the index or metadata files changed on disk
+        """
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+
+        try:
+            changed = self._file_signature() != self._snapshot.signature
+        except FileNotFoundError:
+            # Files are being replaced right now
+            return
+
+        if changed and not self._reload_lock.locked():
+            threading.Thread(target=self._reload_in_background, daemon=True).start()
+
+    def search(self, query, top_k=5, nprobe=None, ef_search=None, with_text=False, snippet_chars=None,
+               law_act_ids=None, source_files=None, law_act_range=None):
+        """
+        Return the top_k most similar paragraphs as metadata dicts with a 'score'.
+        with_text adds the full 'text', snippet_chars adds a shortened 'snippet'.
+        law_act_ids, source_files and law_act_range ([low, high) law_act_ids)
+        restrict the search to matching paragraphs.
+        """
+        return self.search_many([query], top_k, nprobe=nprobe, ef_search=ef_search, with_text=with_text,
+                                snippet_chars=snippet_chars, law_act_ids=law_act_ids, source_files=source_files,
+                                law_act_range=law_act_range)[0]
+
+    def search_many(self, queries, top_k=5, batch_size=64, nprobe=None, ef_search=None, with_text=False,
+                    snippet_chars=None, law_act_ids=None, source_files=None, law_act_range=None):
+        """
+        Search for many queries at once: the queries are embedded in batches of
+        batch_size and the index is searched with a single matrix call.
+        The filter arguments apply to every query.
+        Returns one result list per query, in input order.
+        """
+        self.check_for_update()
+        snapshot = self._snapshot
+        nprobe = self.nprobe if nprobe is None else nprobe
+        ef_search = self.ef_search if ef_search is None else ef_search
+
+        if not queries:
+            return []
+        metrics.counter("search_queries_total", "Queries searched").inc(len(queries))
+
+        search_filter = SearchFilter(law_act_ids, source_files, law_act_range)
+        compiled = snapshot.filters.get(search_filter) if search_filter else None
+        if compiled is not None and not len(compiled):
+            # Nothing matches; skip embedding the queries
+            return [[] for _ in queries]
+
+        query_embeddings = self.embed_queries(queries, batch_size=batch_size)
+        return self._search_snapshot(snapshot, search_filter, compiled, query_embeddings, top_k, nprobe, ef_search,
+                                     with_text, snippet_chars)
+
+    def search_vectors(self, query_embeddings, top_k=5, nprobe=None, ef_search=None, with_text=False,
+                       snippet_chars=None, law_act_ids=None, source_files=None, law_act_range=None):
+        """
+        search_many() for queries that are already embedded (see embed_queries),
+        e.g. by a front end that searches several indexes with the same queries
+        """
+        self.check_for_update()
+        snapshot = self._snapshot
+        nprobe = self.nprobe if nprobe is None else nprobe
+        ef_search = self.ef_search if ef_search is None else ef_search
+        search_filter = SearchFilter(law_act_ids, source_files, law_act_range)
+        compiled = snapshot.filters.get(search_filter) if search_filter else None
+        return self._search_snapshot(snapshot, search_filter, compiled, query_embeddings, top_k, nprobe, ef_search,
+                                     with_text, snippet_chars)
+
+    def embed_queries(self, queries, batch_size=64):
+        """embed_queries() through the query embedding cache"""
+        with metrics.stage("query_embed"):
+            if self.cache is None:
+                return embed_queries(queries, batch_size=batch_size)
+            return self.cache.embed(queries, lambda texts: embed_queries(texts, batch_size=batch_size),
+                                    encoder=encoder_key())
+
+    def cache_stats(self):
+        """Hit/miss counters of the query cache (None without one) and the index version it serves"""
+        if self.cache is None:
+            return None
+        version = self._snapshot.version
+        return {"index_version": version if isinstance(version, str) else None, **self.cache.stats()}
+
+    def _search_snapshot(self, snapshot, search_filter, compiled, query_embeddings, top_k, nprobe, ef_search,
+                         with_text, snippet_chars):
+        if self.cache is None:
+            return self._search_index(snapshot, compiled, query_embeddings, top_k, nprobe, ef_search, with_text,
+                                      snippet_chars)
+        options = (top_k, search_filter, nprobe, ef_search, with_text, snippet_chars, self.rescore_factor)
+        return self.cache.search(snapshot.version, query_embeddings, options,
+                                 lambda positions: self._search_index(snapshot, compiled, query_embeddings[positions],
+                                                                      top_k, nprobe, ef_search, with_text,
+                                                                      snippet_chars))
+
+    def _search_index(self, snapshot, compiled, query_embeddings, top_k, nprobe, ef_search, with_text,
+                      snippet_chars):
+        rescoring = snapshot.vectors is not None and self.rescore_factor > 1
+        k = top_k * self.rescore_factor if rescoring else top_k
+        with metrics.stage("faiss_search"):
+            if compiled is None:
+                params = search_parameters(snapshot.index, nprobe=nprobe, ef_search=ef_search)
+                D, I = snapshot.index.search(query_embeddings, k, params=params)
+            else:
+                D, I = filtered_search(snapshot.index, query_embeddings, k, compiled, nprobe=nprobe,
+                                       ef_search=ef_search)
+        if rescoring:
+            with metrics.stage("rescore"):
+                D, I = rescore(snapshot.vectors, query_embeddings, I, top_k)
+
+        with metrics.stage("metadata_lookup"):
+            return [self._format_results(snapshot, scores, ids, with_text, snippet_chars)
+                    for scores, ids in zip(D, I)]
+
+    @staticmethod
+    def _format_results(snapshot, scores, ids, with_text, snippet_chars):
+        results = []
+        for score, idx in zip(scores, ids):
+            if idx < 0:
+                # Fewer than top_k vectors in the index
+                continue
+            item = snapshot.metadata[idx].copy()
+            item['score'] = float(score)
+            item.pop('representative_id', None)
+            if isinstance(snapshot.metadata, MetadataStore):
+                # Near-duplicate paragraphs folded into this one when the index was built
+                duplicates = [snapshot.metadata[duplicate_id] for duplicate_id in snapshot.metadata.duplicates(idx)]
+                if duplicates:
+                    item['duplicates'] = [{'law_act_id': row.get('law_act_id'),
+                                           'paragraph_id': row.get('paragraph_id')} for row in duplicates]
+            if snapshot.texts is not None:
+                if with_text:
+                    item['text'] = snapshot.texts.text(idx)
+                if snippet_chars:
+                    item['snippet'] = snapshot.texts.snippet(idx, snippet_chars)
+            results.append(item)
+
+        return results
+
+
+def embed_queries(queries, batch_size=64):
+    """Embed query texts as normalized float32 vectors, ready for index search"""
+    query_embeddings = embed_texts(list(queries), batch_size=batch_size, progress=False)
+    query_embeddings = np.ascontiguousarray(query_embeddings, dtype='float32')
+    faiss.normalize_L2(query_embeddings)
+    return query_embeddings
+
+
+_searchers = {}
+_searchers_lock = threading.Lock()
+
+
+def get_searcher(index_path="unified_semantic_search.index", metadata_path="unified_metadata"):
+    """
+    Return the shared Searcher for the given index and metadata files, creating it on first use
+    """
+    key = (os.path.abspath(index_path), os.path.abspath(metadata_path))
+    with _searchers_lock:
+        searcher = _searchers.get(key)
+        if searcher is None:
+            searcher = Searcher(index_path, metadata_path)
+            _searchers[key] = searcher
+    return searcher
+
+
+def search(query, top_k=5, index_path="unified_semantic_search.index", metadata_path="unified_metadata",
+           nprobe=None, ef_search=None, with_text=False, snippet_chars=None, law_act_ids=None, source_files=None,
+           law_act_range=None):
+    """
+    Search function for the unified vector database.
+    The index and metadata are loaded once per process and reused across calls.
+    nprobe / ef_search tune IVF / HNSW indexes for this query; with_text and
+    snippet_chars add the paragraph text or a snippet of it to each result.
+    law_act_ids, source_files and law_act_range ([low, high) law_act_ids)
+    only return paragraphs that match all of the given criteria.
+    """
+    return get_searcher(index_path, metadata_path).search(query, top_k, nprobe=nprobe, ef_search=ef_search,
+                                                          with_text=with_text, snippet_chars=snippet_chars,
+                                                          law_act_ids=law_act_ids, source_files=source_files,
+                                                          law_act_range=law_act_range)
+
+
+def search_many(queries, top_k=5, index_path="unified_semantic_search.index", metadata_path="unified_metadata",
+                batch_size=64, nprobe=None, ef_search=None, with_text=False, snippet_chars=None, law_act_ids=None,
+                source_files=None, law_act_range=None):
+    """
+    Batch version of search(): embeds the queries in batches and searches the
+    index once for all of them. Returns one result list per query.
+    """
+    return get_searcher(index_path, metadata_path).search_many(queries, top_k, batch_size=batch_size,
+                                                               nprobe=nprobe, ef_search=ef_search,
+                                                               with_text=with_text, snippet_chars=snippet_chars,
+                                                               law_act_ids=law_act_ids, source_files=source_files,
+                                                               law_act_range=law_act_range)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the unified semantic search index")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only embed new or changed law acts and update the existing index")
+    parser.add_argument("--max-tokens", type=int, default=DEFAULT_MAX_TOKENS,
+                        help="padded-token budget per embedding batch (0 for fixed batches of 16)")
+    parser.add_argument("--cache-dir", default="embedding_cache", help="on-disk embedding cache directory")
+    parser.add_argument("--no-cache", action="store_true", help="do not read or write the embedding cache")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default="flat", help="FAISS index to build")
+    parser.add_argument("--nlist", type=int, help="number of IVF lists (default: about 4 * sqrt(n))")
+    parser.add_argument("--pq-m", type=int, help="number of PQ sub-quantizers for ivf_pq")
+    parser.add_argument("--pq-bits", type=int, help="bits per PQ code for ivf_pq")
+    parser.add_argument("--hnsw-m", type=int, help="graph degree for hnsw")
+    parser.add_argument("--corpus-dir", default="corpus", help="directory with the crawler's corpus shards")
+    parser.add_argument("--backend", choices=BACKENDS, default="torch", help="encoder implementation")
+    parser.add_argument("--workers", type=int, default=1, help="embedding processes (each pinned to cores/workers "
+                                                                "torch threads)")
+    parser.add_argument("--changed-acts", help="file with one law_act_id per line (e.g. the spider's "
+                                               "changed_acts.txt); implies --incremental and only checks those acts")
+    parser.add_argument("--no-chunk", action="store_true",
+                        help="embed paragraphs whole (truncated to the encoder's limit) instead of chunking them")
+    parser.add_argument("--chunk-overlap", type=int, default=DEFAULT_OVERLAP,
+                        help="tokens repeated between the windows of a split article")
+    parser.add_argument("--no-dedup", action="store_true",
+                        help="embed every paragraph as is, without boilerplate stripping and near-duplicate folding")
+    parser.add_argument("--dedup-threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="estimated Jaccard similarity at which paragraphs count as near-duplicates")
+    parser.add_argument("--boilerplate", help="file with extra boilerplate phrases to strip, one per line "
+                                              "(see dedup.py learn)")
+    parser.add_argument("--shards", type=int, help="write this many shards partitioned by law_act_id range "
+                                                   "to --shard-dir instead of a single index (see sharded_index.py)")
+    parser.add_argument("--shard-dir", default="index_shards", help="output directory for --shards")
+    parser.add_argument("--metrics", help="write the stage timings and counters to this file "
+                                          "(Prometheus text for .prom / .txt, JSON otherwise)")
+    parser.add_argument("--profile-stage", action="append", default=[],
+                        help="run this stage (e.g. forward, tokenize, index_add) under cProfile and write "
+                             "<stage>.prof; repeatable")
+    args = parser.parse_args()
+
+    set_backend(args.backend)
+    if args.profile_stage:
+        metrics.profile_stage(*args.profile_stage)
+    changed_acts = None
+    if args.changed_acts:
+        with open(args.changed_acts, "r", encoding="utf-8") as f:
+            changed_acts = {line.strip() for line in f if line.strip()}
+
+    index_params = {name: value for name, value in
+                    [("nlist", args.nlist), ("pq_m", args.pq_m), ("pq_bits", args.pq_bits), ("hnsw_m", args.hnsw_m)]
+                    if value is not None}
+    build_kwargs = dict(incremental=args.incremental or changed_acts is not None, max_tokens=args.max_tokens or None,
+                        cache_dir=None if args.no_cache else args.cache_dir, index_type=args.index_type,
+                        index_params=index_params, changed_acts=changed_acts, corpus_dir=args.corpus_dir,
+                        workers=args.workers, chunk=not args.no_chunk, chunk_overlap=args.chunk_overlap,
+                        dedup=not args.no_dedup, dedup_threshold=args.dedup_threshold,
+                        boilerplate_path=args.boilerplate)
+    if args.shards:
+        from sharded_index import build_shards
+        build_shards(args.shard_dir, args.shards, **build_kwargs)
+    else:
+        main(**build_kwargs)
+
+    for line in metrics.stage_summary():
+        print(line)
+    if args.metrics:
+        metrics.write(args.metrics)
+
+    # Example usage after building the database:
+    # query = "example legal text to search"
+    # results = search(query)
+    # print("Search results:")
+    # for i, result in enumerate(results, 1):
+    #     print(f"{i}. Score: {result['score']:.4f}")
+    #     print(f"   Source: {result.get('source_file', 'Unknown')}")
+    #     if 'paragraph_id' in result:
+    #         print(f"   Paragraph ID: {result['paragraph_id']}")
+    #     if 'law_act_id' in result:
+    #         print(f"   Law Act ID: {result['law_act_id']}")
     #     print()
\ No newline at end of file
@@ -0,0 +1,185 @@
+import hashlib
+import os
+import pickle
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """
+    Content-addressed on-disk cache of text embeddings.
+
+    Vectors live in a memory-mapped float32 matrix (vectors.f32) and a pickled
+    dict maps the hash of (model name, text) to [row, last_used]. When the cache
+    would grow past max_bytes, the least recently used rows are evicted and
+    their slots are reused, so the matrix never grows beyond that size.
+    """
+
+    def __init__(self, directory="embedding_cache", model_name="", dimension=384, max_bytes=1024 ** 3):
+        self.directory = directory
+        self.model_name = model_name
+        self.dimension = dimension
+        self.max_rows = max(1, max_bytes // (dimension * 4))
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+        self.index_path = os.path.join(directory, "index.pkl")
+        self.dirty_path = os.path.join(directory, "dirty")
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self.entries = {}
+        self.free_rows = []
+        self.next_row = 0
+        self.tick = 0
+        self.capacity = 0
+        self.vectors = None
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.index_path) or not os.path.exists(self.vectors_path):
+            self._open_vectors(0)
+            return
+
+        if os.path.exists(self.dirty_path):
+            # A previous run wrote vectors but died before saving the index,
+            # so rows may no longer match what the index says they hold
+            print(f"Embedding cache in {self.directory} was not saved cleanly, starting empty")
+            self._open_vectors(0)
+            return
+
+        with open(self.index_path, "rb") as f:
+            state = pickle.load(f)
+
+        if state["model_name"] != self.model_name or state["dimension"] != self.dimension:
+            print(f"Embedding cache in {self.directory} was built for another model, starting empty")
+            self._open_vectors(0)
+            return
+
+        self.entries = state["entries"]
+        self.free_rows = state["free_rows"]
+        self.next_row = state["next_row"]
+        self.tick = state["tick"]
+        self._open_vectors(os.path.getsize(self.vectors_path) // (self.dimension * 4))
+
+        # Evict immediately if the size limit was lowered since the last run
+        if len(self.entries) > self.max_rows:
+            self._evict(len(self.entries) - self.max_rows)
+
+    def _open_vectors(self, capacity):
+        if self.vectors is not None:
+            self.vectors.flush()
+            self.vectors = None
+
+        with open(self.vectors_path, "ab") as f:
+            f.truncate(capacity * self.dimension * 4)
+        self.capacity = capacity
+        if capacity:
+            self.vectors = np.memmap(self.vectors_path, dtype='float32', mode='r+',
+                                     shape=(capacity, self.dimension))
+
+    def key(self, text):
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(self.model_name.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(text.encode("utf-8"))
+        return digest.digest()
+
+    def get(self, keys):
+        """
+        Return (vectors, found) where found[i] tells whether keys[i] was cached
+        """
+        vectors = np.zeros((len(keys), self.dimension), dtype='float32')
+        found = np.zeros(len(keys), dtype=bool)
+        self.tick += 1
+
+        for position, key in enumerate(keys):
+            entry = self.entries.get(key)
+            if entry is None:
+                continue
+            vectors[position] = self.vectors[entry[0]]
+            entry[1] = self.tick
+            found[position] = True
+
+        hit_count = int(found.sum())
+        self.hits += hit_count
+        self.misses += len(keys) - hit_count
+        return vectors, found
+
+    def put(self, keys, vectors):
+        """
+        Store vectors under keys, evicting least recently used rows if needed
+        """
+        if not os.path.exists(self.dirty_path):
+            open(self.dirty_path, "w").close()
+
+        new_keys = [key for key in dict.fromkeys(keys) if key not in self.entries]
+        overflow = len(self.entries) + len(new_keys) - self.max_rows
+        if overflow > 0:
+            self._evict(overflow)
+
+        self.tick += 1
+        for key, vector in zip(keys, vectors):
+            entry = self.entries.get(key)
+            if entry is None:
+                if len(self.entries) >= self.max_rows:
+                    # More new keys in this call than the cache can hold
+                    break
+                entry = [self._allocate_row(), self.tick]
+                self.entries[key] = entry
+            self.vectors[entry[0]] = vector
+            entry[1] = self.tick
+
+    def _allocate_row(self):
+        if self.free_rows:
+            return self.free_rows.pop()
+
+        if self.next_row >= self.capacity:
+            new_capacity = min(self.max_rows, max(1024, self.capacity * 2))
+            self._open_vectors(new_capacity)
+
+        row = self.next_row
+        self.next_row += 1
+        return row
+
+    def _evict(self, count):
+        count = min(count, len(self.entries))
+        oldest = sorted(self.entries.items(), key=lambda item: item[1][1])[:count]
+        for key, (row, _) in oldest:
+            del self.entries[key]
+            self.free_rows.append(row)
+        print(f"Evicted {count} embeddings from cache {self.directory}")
+
+    def save(self):
+        """
+        Flush the vectors and atomically write the hash -> row index
+        """
+        if self.vectors is not None:
+            self.vectors.flush()
+
+        state = {
+            "model_name": self.model_name,
+            "dimension": self.dimension,
+            "entries": self.entries,
+            "free_rows": self.free_rows,
+            "next_row": self.next_row,
+            "tick": self.tick,
+        }
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.index_path)
+
+        if os.path.exists(self.dirty_path):
+            os.remove(self.dirty_path)
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_rows,
+            "bytes": self.capacity * self.dimension * 4,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def __repr__(self):
+        return f"EmbeddingCache({self.directory!r}, {self.stats()})"
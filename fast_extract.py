@@ -0,0 +1,148 @@
+import re
+
+from parsel import Selector
+
+PARAGRAPH_ID = re.compile(r'lx_mo\(event,-(\d+)\)')
+
+# Paragraphs with fewer words than this are merged into the previous one
+MIN_WORDS = 30
+
+
+def count_words(text):
+    """Count words in text, handling None and empty strings"""
+    if not text or not text.strip():
+        return 0
+    return len(text.strip().split())
+
+
+def parse_html(html):
+    """lxml root of a page, parsed exactly like Scrapy's response.selector does"""
+    return Selector(text=html).root
+
+
+def _first_attribute(div, name):
+    """First `name` attribute on the div or its descendants (like div.css('::attr(name)').get())"""
+    value = div.get(name)
+    if value is not None:
+        return value
+    for element in div.iterdescendants('*'):
+        value = element.get(name)
+        if value is not None:
+            return value
+    return None
+
+
+def _first_link_text(div):
+    """First text node inside an <a> below the div (like div.css('a::text').get())"""
+    for link in div.iterdescendants('a'):
+        if link.text:
+            return link.text
+        for child in link:
+            if child.tail:
+                return child.tail
+    return None
+
+
+def select_paragraph_divs(root):
+    """
+    The paragraph divs of a page in document order, with the same fallbacks
+    as LexNewSpider2.parse: ACT_TEXT/CLAUSE_DEFAULT lx_elem divs, else any
+    ACT_TEXT div, else any div with lx_mo in onmousemove. All three lists
+    are collected in one walk over the tree.
+    """
+    elements, act_text, lx_mo = [], [], []
+    for div in root.iter('div'):
+        classes = (div.get('class') or '').split()
+        if 'ACT_TEXT' in classes:
+            act_text.append(div)
+            if 'lx_elem' in classes:
+                elements.append(div)
+        elif 'CLAUSE_DEFAULT' in classes and 'lx_elem' in classes:
+            elements.append(div)
+        if 'lx_mo' in (div.get('onmousemove') or ''):
+            lx_mo.append(div)
+    return elements or act_text or lx_mo
+
+
+def extract_entries(root, law_act_id):
+    """
+    Unconsolidated paragraph entries of a parsed page (see parse_html), in a
+    single pass over the tree, reading class/onmousemove/text from lxml
+    directly instead of running CSS queries per div
+    """
+    entries = []
+    for div in select_paragraph_divs(root):
+        classes = _first_attribute(div, 'class')
+        is_clause_default = bool(classes) and 'CLAUSE_DEFAULT' in classes.split()
+
+        paragraph_id = None
+        onmousemove = _first_attribute(div, 'onmousemove')
+        if onmousemove:
+            id_match = PARAGRAPH_ID.search(onmousemove)
+            if id_match:
+                paragraph_id = id_match.group(1)
+
+        text_content = _first_link_text(div)
+        if not text_content:
+            text_content = ' '.join(t.strip() for t in div.itertext() if t.strip())
+        if text_content:
+            text_content = text_content.strip()
+
+        if paragraph_id or text_content:
+            entries.append({
+                'law_act_id': law_act_id,
+                'paragraph_id': paragraph_id or 'no_id',
+                'text': text_content or 'no_text',
+                'is_clause_default': is_clause_default
+            })
+    return entries
+
+
+def consolidate_entries(entries, law_act_id):
+    """
+    Merge the raw entries of one act into the rows that are saved:
+    CLAUSE_DEFAULT texts (headings) are prepended to the next entry, entries
+    with fewer than MIN_WORDS words are appended to the previous one (which
+    keeps its paragraph_id), and a trailing CLAUSE_DEFAULT becomes its own
+    'clause_default_orphan' row
+    """
+    consolidated = []
+    pending_clause_default = None
+
+    for entry in entries:
+        if entry.get('is_clause_default', False):
+            pending_clause_default = entry['text']
+            continue
+
+        word_count = count_words(entry['text'])
+        current_text = entry['text']
+        if pending_clause_default:
+            current_text = pending_clause_default + ' ' + current_text
+            pending_clause_default = None
+
+        if word_count < MIN_WORDS and consolidated:
+            last_entry = consolidated[-1]
+            consolidated[-1] = {
+                'law_act_id': entry['law_act_id'],
+                'paragraph_id': last_entry['paragraph_id'],
+                'text': (last_entry['text'] + ' ' + current_text).strip()
+            }
+        else:
+            consolidated.append({
+                'law_act_id': entry['law_act_id'],
+                'paragraph_id': entry['paragraph_id'],
+                'text': current_text
+            })
+
+    if pending_clause_default:
+        consolidated.append({
+            'law_act_id': law_act_id,
+            'paragraph_id': 'clause_default_orphan',
+            'text': pending_clause_default
+        })
+    return consolidated
+
+
+def extract_act(html, law_act_id):
+    """Consolidated rows of one act page, as saved to [law_act_id].csv"""
+    return consolidate_entries(extract_entries(parse_html(html), law_act_id), law_act_id)
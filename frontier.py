@@ -0,0 +1,264 @@
+import argparse
+import csv
+import os
+import pickle
+import re
+import hashlib
+import sqlite3
+import time
+
+# Seed files the spider imports into a new frontier
+DEFAULT_SEED_FILES = ["ids.txt", "numbers.csv", "all_ids1.pkl"]
+
+
+def clean_id(value):
+    """Turn a raw id (int, float, or string with stray characters) into an int, or None"""
+    if value is None:
+        return None
+    if isinstance(value, float):
+        return None if value != value else int(value)
+    if isinstance(value, int):
+        return value
+    digits = ''.join(filter(str.isdigit, str(value)))
+    return int(digits) if digits else None
+
+
+# Parts of a page that change between requests without the act changing
+VOLATILE_HTML = re.compile(r'<script\b.*?</script>|<style\b.*?</style>|<!--.*?-->|<input\b[^>]*>',
+                           re.IGNORECASE | re.DOTALL)
+WHITESPACE = re.compile(r'\s+')
+
+
+def content_hash(html):
+    """Hash of a page with scripts, styles, comments and form inputs removed and whitespace collapsed"""
+    normalized = WHITESPACE.sub(' ', VOLATILE_HTML.sub(' ', html)).strip()
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+def read_ids(path):
+    """Read law act ids from a .txt (one per line), .csv (first column) or .pkl (list) file"""
+    if path.endswith('.pkl'):
+        with open(path, 'rb') as f:
+            raw_ids = list(pickle.load(f))
+    elif path.endswith('.csv'):
+        with open(path, newline='', encoding='utf-8') as f:
+            raw_ids = [row[0] for row in csv.reader(f) if row]
+    else:
+        with open(path, encoding='utf-8') as f:
+            raw_ids = [line.strip() for line in f if line.strip()]
+
+    ids = []
+    for raw_id in raw_ids:
+        law_act_id = clean_id(raw_id)
+        if law_act_id is not None:
+            ids.append(law_act_id)
+    return ids
+
+
+class Frontier:
+    """
+    Persistent crawl frontier in SQLite.
+
+    Every law act id has a state (pending/done/empty/failed), an attempt
+    counter, the time it was last fetched and the last error. Seed files are
+    imported once; after that the spider only asks for ids that still need
+    fetching, so a crawl can be stopped and resumed at any point.
+
+    For refreshes it also keeps the HTTP validators (ETag / Last-Modified)
+    and the normalized content hash of the last fetched page, so unchanged
+    acts can be answered with a 304 or skipped after a hash comparison.
+    """
+
+    STATES = ("pending", "done", "empty", "failed")
+
+    def __init__(self, path="frontier.sqlite"):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS acts (
+                law_act_id INTEGER PRIMARY KEY,
+                state TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_fetched REAL,
+                error TEXT
+            )""")
+        # Columns added for conditional refreshes; older frontier files get them on open
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(acts)")}
+        for column, column_type in [("etag", "TEXT"), ("last_modified", "TEXT"), ("content_hash", "TEXT"),
+                                    ("changed_at", "REAL")]:
+            if column not in columns:
+                self.conn.execute(f"ALTER TABLE acts ADD COLUMN {column} {column_type}")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS acts_state ON acts (state, law_act_id)")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS imports (
+                source TEXT PRIMARY KEY,
+                imported_at REAL NOT NULL,
+                count INTEGER NOT NULL
+            )""")
+        self.conn.commit()
+
+    def import_ids(self, path, force=False):
+        """Add the ids from a seed file as pending; each file is only imported once unless force=True"""
+        source = os.path.abspath(path)
+        if not force and self.conn.execute("SELECT 1 FROM imports WHERE source = ?", (source,)).fetchone():
+            return 0
+
+        ids = read_ids(path)
+        before = self.conn.total_changes
+        self.conn.executemany("INSERT OR IGNORE INTO acts (law_act_id) VALUES (?)", ((i,) for i in ids))
+        added = self.conn.total_changes - before
+        self.conn.execute("INSERT OR REPLACE INTO imports (source, imported_at, count) VALUES (?, ?, ?)",
+                          (source, time.time(), len(ids)))
+        self.conn.commit()
+        return added
+
+    def shard_range(self, shard_index, shard_count):
+        """
+        [low, high) id range of one shard. The known ids are split into
+        shard_count contiguous ranges of (nearly) equal size, so workers
+        with different shard_index never fetch the same act.
+        """
+        if not 0 <= shard_index < shard_count:
+            raise ValueError(f"Shard {shard_index} out of range for {shard_count} shards")
+
+        total = self.conn.execute("SELECT COUNT(*) FROM acts").fetchone()[0]
+
+        def boundary(position):
+            if position <= 0:
+                return 0
+            if position >= total:
+                return 2 ** 62
+            return self.conn.execute("SELECT law_act_id FROM acts ORDER BY law_act_id LIMIT 1 OFFSET ?",
+                                     (position,)).fetchone()[0]
+
+        return (boundary(total * shard_index // shard_count),
+                boundary(total * (shard_index + 1) // shard_count))
+
+    def pending(self, batch_size=1000, max_attempts=3, id_range=None):
+        """
+        Lazily yield ids that still need fetching: pending ones, and failed
+        ones with fewer than max_attempts attempts, in ascending id order,
+        optionally restricted to a [low, high) id_range
+        """
+        last_id, high = (id_range[0] - 1, id_range[1]) if id_range else (-1, 2 ** 62)
+        while True:
+            rows = self.conn.execute(
+                "SELECT law_act_id FROM acts WHERE law_act_id > ? AND law_act_id < ? "
+                "AND (state = 'pending' OR (state = 'failed' AND attempts < ?)) "
+                "ORDER BY law_act_id LIMIT ?", (last_id, high, max_attempts, batch_size)).fetchall()
+            if not rows:
+                return
+            for (law_act_id,) in rows:
+                yield law_act_id
+            last_id = rows[-1][0]
+
+    def mark(self, law_act_id, state, error=None):
+        """Record the outcome of one fetch"""
+        if state not in self.STATES:
+            raise ValueError(f"Unknown frontier state: {state}")
+        self.conn.execute(
+            "UPDATE acts SET state = ?, attempts = attempts + 1, last_fetched = ?, error = ? WHERE law_act_id = ?",
+            (state, time.time(), error, int(law_act_id)))
+        self.conn.commit()
+
+    def refresh_candidates(self, batch_size=1000, id_range=None):
+        """
+        Lazily yield (law_act_id, etag, last_modified) for every act that was
+        fetched successfully before, in ascending id order
+        """
+        last_id, high = (id_range[0] - 1, id_range[1]) if id_range else (-1, 2 ** 62)
+        while True:
+            rows = self.conn.execute(
+                "SELECT law_act_id, etag, last_modified FROM acts WHERE law_act_id > ? AND law_act_id < ? "
+                "AND state IN ('done', 'empty') ORDER BY law_act_id LIMIT ?", (last_id, high, batch_size)).fetchall()
+            if not rows:
+                return
+            yield from rows
+            last_id = rows[-1][0]
+
+    def stored_hash(self, law_act_id):
+        row = self.conn.execute("SELECT content_hash FROM acts WHERE law_act_id = ?", (int(law_act_id),)).fetchone()
+        return row[0] if row else None
+
+    def record_page(self, law_act_id, etag, last_modified, page_hash, changed):
+        """Store the validators and content hash of a fetched page"""
+        self.conn.execute(
+            "UPDATE acts SET etag = ?, last_modified = ?, content_hash = ?, "
+            "changed_at = CASE WHEN ? THEN ? ELSE changed_at END WHERE law_act_id = ?",
+            (etag, last_modified, page_hash, changed, time.time(), int(law_act_id)))
+        self.conn.commit()
+
+    def touch(self, law_act_id):
+        """Record a refresh that found the act unchanged"""
+        self.conn.execute("UPDATE acts SET last_fetched = ?, error = NULL WHERE law_act_id = ?",
+                          (time.time(), int(law_act_id)))
+        self.conn.commit()
+
+    def merge(self, other_path):
+        """
+        Merge the per-id state from another frontier file (e.g. from a shard
+        that ran on another host): for every id, the most recently fetched
+        record wins
+        """
+        self.conn.execute("ATTACH DATABASE ? AS other", (other_path,))
+        try:
+            before = self.conn.total_changes
+            self.conn.execute("INSERT OR IGNORE INTO acts (law_act_id) SELECT law_act_id FROM other.acts")
+            self.conn.execute("""
+                UPDATE acts SET (state, attempts, last_fetched, error, etag, last_modified, content_hash, changed_at) = (
+                    SELECT o.state, o.attempts, o.last_fetched, o.error, o.etag, o.last_modified,
+                           o.content_hash, o.changed_at
+                    FROM other.acts o WHERE o.law_act_id = acts.law_act_id)
+                WHERE law_act_id IN (
+                    SELECT o.law_act_id FROM other.acts o JOIN acts a ON a.law_act_id = o.law_act_id
+                    WHERE o.last_fetched IS NOT NULL AND (a.last_fetched IS NULL OR o.last_fetched > a.last_fetched))
+            """)
+            self.conn.commit()
+            return self.conn.total_changes - before
+        finally:
+            self.conn.execute("DETACH DATABASE other")
+
+    def counts(self):
+        """Number of ids per state"""
+        counts = {state: 0 for state in self.STATES}
+        counts.update(self.conn.execute("SELECT state, COUNT(*) FROM acts GROUP BY state").fetchall())
+        return counts
+
+    def close(self):
+        self.conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or seed the crawl frontier")
+    parser.add_argument("--db", default="frontier.sqlite")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    import_parser = subparsers.add_parser("import", help="import ids from .txt/.csv/.pkl files")
+    import_parser.add_argument("files", nargs="+")
+    import_parser.add_argument("--force", action="store_true", help="re-import files that were imported before")
+    subparsers.add_parser("stats", help="show the number of ids per state")
+    merge_parser = subparsers.add_parser("merge", help="merge frontier files written by other shards/hosts")
+    merge_parser.add_argument("files", nargs="+")
+    retry_parser = subparsers.add_parser("retry", help="move failed (or empty) ids back to pending")
+    retry_parser.add_argument("--state", choices=["failed", "empty"], default="failed")
+    args = parser.parse_args()
+
+    frontier = Frontier(args.db)
+    if args.command == "import":
+        for path in args.files:
+            print(f"{path}: {frontier.import_ids(path, force=args.force)} new ids")
+    elif args.command == "merge":
+        for path in args.files:
+            print(f"{path}: {frontier.merge(path)} rows updated")
+    elif args.command == "retry":
+        cursor = frontier.conn.execute("UPDATE acts SET state = 'pending', attempts = 0 WHERE state = ?",
+                                       (args.state,))
+        frontier.conn.commit()
+        print(f"Moved {cursor.rowcount} {args.state} ids back to pending")
+    for state, count in frontier.counts().items():
+        print(f"{state:>8}: {count}")
+    frontier.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import math
+
+import faiss
+import numpy as np
+
+# Index types that main() and the benchmark know how to build
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw", "sq_fp16", "sq8")
+
+# Index types whose stored codes only approximate the vectors; main() keeps the exact
+# float32 vectors on disk for them so the Searcher can rescore their candidates
+COMPRESSED_TYPES = ("ivf_pq", "sq_fp16", "sq8")
+
+
+def default_nlist(num_vectors):
+    """
+    Number of IVF lists for a corpus of num_vectors: about 4 * sqrt(n),
+    but small enough that every list gets ~39 training points
+    """
+    return max(1, min(int(4 * math.sqrt(max(num_vectors, 1))), num_vectors // 39))
+
+
+def index_description(index_type, num_vectors, nlist=None, pq_m=48, pq_bits=8, hnsw_m=32):
+    """
+    Translate an index type and its build parameters into a faiss.index_factory string
+    """
+    if index_type == "flat":
+        return "Flat"
+    if index_type == "ivf_flat":
+        return f"IVF{nlist or default_nlist(num_vectors)},Flat"
+    if index_type == "ivf_pq":
+        return f"IVF{nlist or default_nlist(num_vectors)},PQ{pq_m}x{pq_bits}"
+    if index_type == "hnsw":
+        return f"HNSW{hnsw_m},Flat"
+    if index_type == "sq_fp16":
+        return "SQfp16"
+    if index_type == "sq8":
+        return "SQ8"
+    raise ValueError(f"Unknown index type {index_type!r}, expected one of {', '.join(INDEX_TYPES)}")
+
+
+def create_index(index_type, dimension, num_vectors, **params):
+    """
+    Create an empty inner-product index wrapped in an IndexIDMap2,
+    so vectors can be added and removed by id
+    """
+    description = index_description(index_type, num_vectors, **params)
+    inner = faiss.index_factory(dimension, description, faiss.METRIC_INNER_PRODUCT)
+    return faiss.IndexIDMap2(inner)
+
+
+def train_index(index, embeddings, sample_size=100000, seed=1234):
+    """
+    Train the index on a random sample of the embeddings (no-op for flat, HNSW and fp16)
+    """
+    if index.is_trained:
+        return
+
+    if len(embeddings) > sample_size:
+        rng = np.random.default_rng(seed)
+        sample = embeddings[rng.choice(len(embeddings), sample_size, replace=False)]
+    else:
+        sample = embeddings
+
+    print(f"Training index on {len(sample)} vectors...")
+    index.train(np.ascontiguousarray(sample, dtype='float32'))
+
+
+def supports_removal(index):
+    """
+    HNSW graphs cannot drop vectors, every other supported type can
+    """
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    return not isinstance(inner, faiss.IndexHNSW)
+
+
+def is_compressed(index):
+    """
+    Whether the index stores quantized codes (PQ, scalar quantizer) rather
+    than the float32 vectors, so its scores are approximate
+    """
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    return isinstance(inner, (faiss.IndexIVFPQ, faiss.IndexPQ, faiss.IndexScalarQuantizer,
+                              faiss.IndexIVFScalarQuantizer))
+
+
+def search_parameters(index, nprobe=None, ef_search=None, selector=None):
+    """
+    Build per-query faiss SearchParameters for nprobe (IVF) or efSearch (HNSW).
+    Returns None when neither applies, so the index defaults are used.
+
+    With a selector (a faiss.IDSelector that only lets some ids through) a
+    parameter object of the type the index expects is always returned, using
+    the index's own nprobe / efSearch unless overridden. The caller must keep
+    the selector alive while the parameters are in use.
+    """
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+
+    if isinstance(inner, faiss.IndexIVF) and (nprobe is not None or selector is not None):
+        params = faiss.SearchParametersIVF(nprobe=int(inner.nprobe if nprobe is None else nprobe))
+    elif isinstance(inner, faiss.IndexHNSW) and (ef_search is not None or selector is not None):
+        params = faiss.SearchParametersHNSW(efSearch=int(inner.hnsw.efSearch if ef_search is None else ef_search))
+    elif selector is not None:
+        params = faiss.SearchParameters()
+    else:
+        return None
+
+    if selector is not None:
+        params.sel = selector
+    return params
@@ -0,0 +1,90 @@
+import argparse
+import asyncio
+import itertools
+import json
+import time
+
+import numpy as np
+
+
+async def client(host, port, queries, top_k, deadline, latencies, errors):
+    """
+    One keep-alive connection sending POST /search requests back to back until the deadline
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for query in queries:
+            if time.perf_counter() >= deadline:
+                break
+
+            body = json.dumps({"query": query, "top_k": top_k}, ensure_ascii=False).encode("utf-8")
+            request = (f"POST /search HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                       f"Content-Length: {len(body)}\r\n\r\n").encode("latin-1") + body
+
+            start = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+
+            status_line = await reader.readline()
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                if name.strip().lower() == "content-length":
+                    length = int(value)
+            await reader.readexactly(length)
+
+            status = int(status_line.split()[1])
+            if status == 200:
+                latencies.append((time.perf_counter() - start) * 1000)
+            else:
+                errors[status] = errors.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+async def run(args, queries):
+    latencies = []
+    errors = {}
+    start = time.perf_counter()
+    deadline = start + args.duration
+
+    # Every client cycles through the queries from a different offset
+    tasks = [client(args.host, args.port, itertools.islice(itertools.cycle(queries), i, None), args.top_k,
+                    deadline, latencies, errors)
+             for i in range(args.concurrency)]
+    await asyncio.gather(*tasks)
+    return latencies, errors, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for search_server.py")
+    parser.add_argument("queries", help="file with one query per line")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 128],
+                        help="number of concurrent connections (several values run several rounds)")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per round")
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    with open(args.queries, "r", encoding="utf-8") as f:
+        queries = [line.strip() for line in f if line.strip()]
+
+    concurrency_levels = args.concurrency
+    print(f"{'clients':>8}{'requests':>10}{'QPS':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}  errors")
+    for concurrency in concurrency_levels:
+        args.concurrency = concurrency
+        latencies, errors, elapsed = asyncio.run(run(args, queries))
+        if latencies:
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        else:
+            p50 = p95 = p99 = float("nan")
+        print(f"{concurrency:>8}{len(latencies):>10}{len(latencies) / elapsed:>10.1f}"
+              f"{p50:>10.2f}{p95:>10.2f}{p99:>10.2f}  {errors or '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,40 +6,120 @@ import pickle
 from tqdm import tqdm
 import logging
 import re
+import argparse
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
 from scrapy.crawler import CrawlerProcess
 
+from frontier import Frontier, DEFAULT_SEED_FILES, content_hash
+from fast_extract import extract_entries, consolidate_entries, count_words
+from corpus_sink import get_corpus_shards
+import metrics
+
 
 class LexNewSpider2(scrapy.Spider):
     name = "lex_new2"
     allowed_domains = ["lex.uz"]
 
-    def __init__(self):
-        # Load IDs from CSV file
-        self.load_ids_from_csv()
+    def __init__(self, frontier_path=None, seed_files=None, max_attempts=3, refresh=False,
+                 changed_acts_path="changed_acts.txt", base_url="https://lex.uz", shard=None, output_dir=".",
+                 save_html_dir=None, fast_parse=True, corpus_dir=None, metrics_path=None, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.frontier = None
+        self.max_attempts = max_attempts
+        # Refresh mode re-checks already fetched acts with conditional requests
+        self.refresh = refresh
+        self.changed_acts_path = changed_acts_path
+        self.changed_acts = []
+        # base_url can point at stub_server.py to benchmark the crawl offline
+        self.base_url = base_url.rstrip('/')
+        self.allowed_domains = [urlsplit(self.base_url).hostname]
+        # (index, count): this worker only fetches its own contiguous slice of the id space
+        self.shard = shard
+        self.id_range = None
+        self.output_dir = output_dir
+        self.save_html_dir = save_html_dir
+        # Single-pass lxml extraction; False uses the original per-div CSS queries
+        self.fast_parse = fast_parse
+        # Sharded JSONL corpus (corpus_sink.py) instead of one CSV per act
+        self.corpus_dir = corpus_dir
+        self.uncommitted_acts = {}
+        # Stage timings and counters written when the spider closes (see metrics.py)
+        self.metrics_path = metrics_path
+        if save_html_dir:
+            os.makedirs(save_html_dir, exist_ok=True)
+        os.makedirs(output_dir, exist_ok=True)
+        self.started_at = time.time()
+
+        if frontier_path:
+            # Persistent frontier: ids are imported once and fed lazily by start_requests
+            self.frontier = Frontier(frontier_path)
+            for seed_file in seed_files or DEFAULT_SEED_FILES:
+                if os.path.exists(seed_file):
+                    added = self.frontier.import_ids(seed_file)
+                    if added:
+                        print(f"Imported {added} new IDs from {seed_file} into {frontier_path}")
+            print(f"Frontier {frontier_path}: {self.frontier.counts()}")
+            if shard:
+                self.id_range = self.frontier.shard_range(*shard)
+                print(f"Shard {shard[0]}/{shard[1]}: law act ids in [{self.id_range[0]}, {self.id_range[1]})")
+            self.start_urls = []
+        else:
+            # Load IDs from CSV file
+            self.load_ids_from_csv()
         # Initialize data storage - now a dictionary with law_act_id as key
         self.scraped_data = {}
 
+    def act_url(self, law_act_id):
+        return f"{self.base_url}/uz/docs/-{law_act_id}"
+
+    async def start(self):
+        # Scrapy >= 2.13 entry point; older versions call start_requests() directly
+        for request in self.start_requests():
+            yield request
+
+    def start_requests(self):
+        """Yield requests for the ids that still need fetching"""
+        if self.frontier is None:
+            yield from super().start_requests()
+            return
+
+        if self.refresh:
+            for law_act_id, etag, last_modified in self.frontier.refresh_candidates(id_range=self.id_range):
+                headers = {}
+                if etag:
+                    headers['If-None-Match'] = etag
+                if last_modified:
+                    headers['If-Modified-Since'] = last_modified
+                yield scrapy.Request(self.act_url(law_act_id), callback=self.parse,
+                                     errback=self.handle_error, headers=headers, dont_filter=True,
+                                     meta={'law_act_id': law_act_id, 'refresh': True,
+                                           'handle_httpstatus_list': [304]})
+            return
+
+        for law_act_id in self.frontier.pending(max_attempts=self.max_attempts, id_range=self.id_range):
+            yield scrapy.Request(self.act_url(law_act_id), callback=self.parse,
+                                 errback=self.handle_error, meta={'law_act_id': law_act_id})
+
+    def handle_error(self, failure):
+        """Mark an id as failed so it is retried (up to max_attempts) on the next run"""
+        law_act_id = failure.request.meta.get('law_act_id')
+        self.logger.warning(f"Failed to fetch {failure.request.url}: {failure.value!r}")
+        metrics.counter("crawl_errors_total", "Failed fetches and writes").inc(kind="fetch")
+        if self.frontier is not None and law_act_id is not None:
+            self.frontier.mark(law_act_id, 'failed', error=repr(failure.value)[:500])
+
     def load_ids_from_csv(self):
         """Load the first 100 IDs from numbers.csv"""
-        print(f"Current working directory: {os.getcwd()}")
-        print(f"Looking for CSV file: {os.path.abspath('numbers.csv')}")
-        print(f"CSV file exists: {os.path.exists('numbers.csv')}")
-
-        # List files in current directory for debugging
-        files_in_dir = os.listdir('.')
-        csv_files = [f for f in files_in_dir if f.endswith('.csv')]
-        print(f"Files in current directory: {len(files_in_dir)} total")
-        print(f"CSV files found: {csv_files}")
+        self.logger.debug(f"Looking for CSV file: {os.path.abspath('numbers.csv')}")
 
         try:
             # Read CSV file
             df = pd.read_csv('numbers.csv')
 
-            print(f"Successfully loaded CSV file!")
-            print(f"CSV shape: {df.shape}")
-            print(f"CSV columns: {list(df.columns)}")
-            print(f"First few rows:")
-            print(df.head())
+            self.logger.debug(f"Loaded numbers.csv: shape {df.shape}, columns {list(df.columns)}")
 
             # Try to extract numbers from the CSV
             # Handle different possible column names and structures
@@ -48,30 +128,27 @@ class LexNewSpider2(scrapy.Spider):
             if len(df.columns) == 1:
                 # Single column CSV
                 column_name = df.columns[0]
-                print(f"Using single column: {column_name}")
+                self.logger.debug(f"Using single column: {column_name}")
                 ids_list = df[column_name].tolist()
             elif 'id' in df.columns:
-                print("Using 'id' column")
+                self.logger.debug("Using 'id' column")
                 ids_list = df['id'].tolist()
             elif 'ID' in df.columns:
-                print("Using 'ID' column")
+                self.logger.debug("Using 'ID' column")
                 ids_list = df['ID'].tolist()
             elif 'number' in df.columns:
-                print("Using 'number' column")
+                self.logger.debug("Using 'number' column")
                 ids_list = df['number'].tolist()
             elif 'numbers' in df.columns:
-                print("Using 'numbers' column")
+                self.logger.debug("Using 'numbers' column")
                 ids_list = df['numbers'].tolist()
             else:
                 # Use first column as default
                 column_name = df.columns[0]
-                print(f"Using first column as default: {column_name}")
+                self.logger.debug(f"Using first column as default: {column_name}")
                 ids_list = df[column_name].tolist()
 
-            print(f"Extracted {len(ids_list)} IDs from CSV")
-            if ids_list:
-                print(f"First 5 IDs: {ids_list[:5]}")
-                print(f"Sample ID type: {type(ids_list[0])}")
+            self.logger.debug(f"Extracted {len(ids_list)} IDs from CSV")
 
             # Take first 100 IDs
             first_100_ids = ids_list[:100]
@@ -89,49 +166,41 @@ class LexNewSpider2(scrapy.Spider):
                     if clean_id:
                         cleaned_ids.append(clean_id)
                 else:
-                    print(f"Skipping invalid ID: {id_val} (type: {type(id_val)})")
-
-            print(f"Cleaned {len(cleaned_ids)} valid IDs")
-            if cleaned_ids:
-                print(f"First 5 cleaned IDs: {cleaned_ids[:5]}")
-                print(f"Last 5 cleaned IDs: {cleaned_ids[-5:]}")
+                    self.logger.debug(f"Skipping invalid ID: {id_val} (type: {type(id_val)})")
 
             # Create start_urls
-            self.start_urls = [f"https://lex.uz/uz/docs/-{id_num}" for id_num in cleaned_ids]
+            self.start_urls = [self.act_url(id_num) for id_num in cleaned_ids]
 
-            print(f"Created {len(self.start_urls)} URLs")
-            print(f"First 3 URLs: {self.start_urls[:3]}")
-            print(f"Last 3 URLs: {self.start_urls[-3:]}")
+            self.logger.info(f"Loaded {len(self.start_urls)} act URLs from numbers.csv")
 
             if not self.start_urls:
                 raise ValueError("No valid IDs found in CSV file")
 
         except FileNotFoundError:
-            print("ERROR: numbers.csv file not found in current directory!")
-            print("Available CSV files:", [f for f in os.listdir('.') if f.endswith('.csv')])
-            print("Falling back to original 3 URLs...")
+            self.logger.error(f"numbers.csv not found in {os.getcwd()}; falling back to the original 3 URLs")
             self.start_urls = [
                 "https://lex.uz/uz/docs/-6445145",
                 "https://lex.uz/uz/docs/-7484334",
                 "https://lex.uz/uz/docs/-7484454"
             ]
         except Exception as e:
-            print(f"ERROR loading CSV file: {e}")
-            print(f"Error type: {type(e)}")
-            import traceback
-            traceback.print_exc()
-            print("Falling back to original 3 URLs...")
+            self.logger.exception(f"Failed to load numbers.csv ({e!r}); falling back to the original 3 URLs")
             self.start_urls = [
                 "https://lex.uz/uz/docs/-6445145",
                 "https://lex.uz/uz/docs/-7484334",
                 "https://lex.uz/uz/docs/-7484454"
             ]
 
-    def count_words(self, text):
-        """Count words in text, handling None and empty strings"""
-        if not text or not text.strip():
-            return 0
-        return len(text.strip().split())
+    def header_value(self, response, name):
+        value = response.headers.get(name)
+        return value.decode('latin-1') if value else None
+
+    def record_changed_act(self, law_act_id):
+        """Append an act whose CSV was (re)written to the changed-acts list for the index build"""
+        self.changed_acts.append(law_act_id)
+        if self.changed_acts_path:
+            with open(self.changed_acts_path, 'a', encoding='utf-8') as f:
+                f.write(f"{law_act_id}\n")
 
     def has_class(self, element, class_name):
         """Check if element has a specific class"""
@@ -140,49 +209,40 @@ class LexNewSpider2(scrapy.Spider):
             return class_name in classes.split()
         return False
 
-    def parse(self, response):
-        # Extract law act ID from URL
-        law_act_id = re.search(r'-(\d+)$', response.url)
-        if law_act_id:
-            law_act_id = law_act_id.group(1)
-        else:
-            law_act_id = "unknown"
-
-        print(f"\n=== Processing URL: {response.url} ===")
-        print(f"Law Act ID: {law_act_id}")
-
-        # Initialize storage for this specific law act
-        self.scraped_data[law_act_id] = []
-
+    def extract_entries_reference(self, response, law_act_id):
+        """
+        Original CSS-selector extraction of the unconsolidated entries, kept as
+        the reference for fast_extract.extract_entries (see bench_parse.py)
+        """
         # Find all div elements with class "ACT_TEXT lx_elem" or "CLAUSE_DEFAULT lx_elem"
         act_text_divs = response.css('div.ACT_TEXT.lx_elem, div.CLAUSE_DEFAULT.lx_elem')
-        print(f"Found {len(act_text_divs)} ACT_TEXT and CLAUSE_DEFAULT elements")
+        self.logger.debug(f"Found {len(act_text_divs)} ACT_TEXT and CLAUSE_DEFAULT elements")
 
         # If no elements found, try alternative selectors
         if not act_text_divs:
-            print("No ACT_TEXT or CLAUSE_DEFAULT elements found, trying alternative selectors...")
+            self.logger.debug("No ACT_TEXT or CLAUSE_DEFAULT elements found, trying alternative selectors...")
             # Try just .ACT_TEXT
             act_text_divs = response.css('div.ACT_TEXT')
-            print(f"Found {len(act_text_divs)} elements with just ACT_TEXT class")
+            self.logger.debug(f"Found {len(act_text_divs)} elements with just ACT_TEXT class")
 
             # Try any div with onmousemove containing lx_mo
             if not act_text_divs:
                 act_text_divs = response.css('div[onmousemove*="lx_mo"]')
-                print(f"Found {len(act_text_divs)} elements with lx_mo in onmousemove")
+                self.logger.debug(f"Found {len(act_text_divs)} elements with lx_mo in onmousemove")
 
         # Temporary list to hold entries before consolidation
         temp_entries = []
 
         for i, div in enumerate(act_text_divs):
-            print(f"\n--- Processing div {i + 1} ---")
+            self.logger.debug(f"--- Processing div {i + 1} ---")
 
             # Check if this is a CLAUSE_DEFAULT element
             is_clause_default = self.has_class(div, 'CLAUSE_DEFAULT')
-            print(f"Is CLAUSE_DEFAULT: {is_clause_default}")
+            self.logger.debug(f"Is CLAUSE_DEFAULT: {is_clause_default}")
 
             # Extract paragraph ID from onmousemove attribute
             onmousemove = div.css('::attr(onmousemove)').get()
-            print(f"onmousemove attribute: {onmousemove}")
+            self.logger.debug(f"onmousemove attribute: {onmousemove}")
 
             paragraph_id = None
             if onmousemove:
@@ -190,18 +250,19 @@ class LexNewSpider2(scrapy.Spider):
                 id_match = re.search(r'lx_mo\(event,-(\d+)\)', onmousemove)
                 if id_match:
                     paragraph_id = id_match.group(1)
-                    print(f"Extracted paragraph ID: {paragraph_id}")
+                    self.logger.debug(f"Extracted paragraph ID: {paragraph_id}")
 
             # Extract text content from the <a> tag
             text_content = div.css('a::text').get()
-            print(f"Text content: {text_content[:100] if text_content else 'None'}...")
+            self.logger.debug(f"Text content: {text_content[:100] if text_content else 'None'}...")
 
             # If no text in <a> tag, try getting all text from div
             if not text_content:
                 text_content = div.css('::text').getall()
                 if text_content:
                     text_content = ' '.join([t.strip() for t in text_content if t.strip()])
-                    print(f"Alternative text extraction: {text_content[:100] if text_content else 'None'}...")
+                    self.logger.debug(f"Alternative text extraction: "
+                                      f"{text_content[:100] if text_content else 'None'}...")
 
             # Clean the text content
             if text_content:
@@ -216,21 +277,26 @@ class LexNewSpider2(scrapy.Spider):
                     'is_clause_default': is_clause_default
                 }
                 temp_entries.append(data_entry)
-                print(f"Added temporary entry: {data_entry}")
+                self.logger.debug(f"Added temporary entry: {data_entry}")
 
-        # Now consolidate entries with short text (less than 30 words) and handle CLAUSE_DEFAULT elements
-        print(f"\n=== Consolidating short texts (< 30 words) and handling CLAUSE_DEFAULT elements ===")
+        return temp_entries
+
+    def consolidate_entries_reference(self, temp_entries, law_act_id):
+        """
+        Original consolidation of the entries of one act, kept as the reference
+        for fast_extract.consolidate_entries (see bench_parse.py)
+        """
         consolidated_entries = []
         pending_clause_default = None  # Store CLAUSE_DEFAULT text to prepend to next entry
 
         for i, entry in enumerate(temp_entries):
-            word_count = self.count_words(entry['text'])
+            word_count = count_words(entry['text'])
             is_clause_default = entry.get('is_clause_default', False)
-            print(f"Entry {i + 1}: {word_count} words, CLAUSE_DEFAULT: {is_clause_default} - '{entry['text'][:50]}...'")
+            self.logger.debug(f"Entry {i + 1}: {word_count} words, CLAUSE_DEFAULT: {is_clause_default} - "
+                              f"'{entry['text'][:50]}...'")
 
             if is_clause_default:
                 # Store CLAUSE_DEFAULT text to prepend to the next entry
-                print(f"  -> Storing CLAUSE_DEFAULT text to add to next entry: '{entry['text']}'")
                 pending_clause_default = entry['text']
                 continue  # Skip adding this entry, it will be prepended to the next one
 
@@ -240,8 +306,6 @@ class LexNewSpider2(scrapy.Spider):
             # If we have pending CLAUSE_DEFAULT text, prepend it
             if pending_clause_default:
                 current_text = pending_clause_default + ' ' + current_text
-                print(f"  -> Prepending CLAUSE_DEFAULT text: '{pending_clause_default}' to current entry")
-                print(f"  -> Combined text: '{current_text[:100]}...'")
                 pending_clause_default = None  # Reset after using
 
             # Check if this entry should be merged with previous (only for short text, not CLAUSE_DEFAULT)
@@ -249,8 +313,6 @@ class LexNewSpider2(scrapy.Spider):
 
             # If should merge and there's a previous entry to merge with
             if should_merge_with_previous and consolidated_entries:
-                print(f"  -> Merging with previous entry (< 30 words)")
-
                 # Get the last consolidated entry
                 last_entry = consolidated_entries[-1]
 
@@ -264,9 +326,7 @@ class LexNewSpider2(scrapy.Spider):
                     'paragraph_id': last_entry['paragraph_id'],  # Keep previous paragraph_id
                     'text': combined_text.strip()
                 }
-
-                print(f"  -> Combined text now has {self.count_words(combined_text)} words")
-                print(f"  -> Kept paragraph_id: {last_entry['paragraph_id']}")
+                self.logger.debug(f"  -> Merged with previous entry, kept paragraph_id {last_entry['paragraph_id']}")
 
             else:
                 # Add as new entry (either >= 30 words or first entry)
@@ -278,15 +338,10 @@ class LexNewSpider2(scrapy.Spider):
                 }
                 consolidated_entries.append(final_entry)
 
-                if word_count >= 30:
-                    print(f"  -> Added as new entry (>= 30 words)")
-                else:
-                    print(f"  -> Added as new entry (first entry)")
-
         # Handle case where the last entry was a CLAUSE_DEFAULT (no next entry to attach to)
         if pending_clause_default:
-            print(
-                f"  -> Warning: Last entry was CLAUSE_DEFAULT with no next entry to attach to: '{pending_clause_default}'")
+            self.logger.debug(f"Last entry was CLAUSE_DEFAULT with no next entry to attach to: "
+                              f"'{pending_clause_default}'")
             # Add it as a separate entry
             final_entry = {
                 'law_act_id': law_act_id,
@@ -294,25 +349,102 @@ class LexNewSpider2(scrapy.Spider):
                 'text': pending_clause_default
             }
             consolidated_entries.append(final_entry)
-            print(f"  -> Added orphaned CLAUSE_DEFAULT as separate entry")
+
+        return consolidated_entries
+
+    def parse(self, response):
+        # Extract law act ID from URL
+        law_act_id = re.search(r'-(\d+)$', response.url)
+        if law_act_id:
+            law_act_id = law_act_id.group(1)
+        else:
+            law_act_id = "unknown"
+
+        self.logger.debug(f"Processing URL: {response.url} (law act ID: {law_act_id})")
+        download_latency = response.meta.get('download_latency')
+        if download_latency is not None:
+            metrics.observe_stage("download", download_latency)
+
+        if self.save_html_dir and response.status == 200 and law_act_id != "unknown":
+            # Raw pages, e.g. for serving them from stub_server.py
+            with open(os.path.join(self.save_html_dir, f'{law_act_id}.html'), 'wb') as f:
+                f.write(response.body)
+
+        # Skip parsing and writing when a refresh finds the act unchanged
+        page_hash = None
+        page_changed = True
+        if self.frontier is not None and law_act_id != "unknown":
+            if response.status == 304:
+                self.logger.debug(f"Law act {law_act_id} not modified (304), skipping")
+                metrics.counter("crawl_acts_total", "Fetched law acts by outcome").inc(result="not_modified")
+                self.frontier.touch(law_act_id)
+                return
+
+            with metrics.stage("page_hash"):
+                page_hash = content_hash(response.text)
+            page_changed = page_hash != self.frontier.stored_hash(law_act_id)
+            if response.meta.get('refresh') and not page_changed:
+                self.logger.debug(f"Law act {law_act_id} content unchanged, skipping")
+                metrics.counter("crawl_acts_total", "Fetched law acts by outcome").inc(result="unchanged")
+                self.frontier.touch(law_act_id)
+                return
+
+        # Initialize storage for this specific law act
+        self.scraped_data[law_act_id] = []
+
+        with metrics.stage("parse"):
+            # CLAUSE_DEFAULT texts go in front of the next entry, entries under 30 words join the previous one
+            if self.fast_parse:
+                temp_entries = extract_entries(response.selector.root, law_act_id)
+                consolidated_entries = consolidate_entries(temp_entries, law_act_id)
+            else:
+                temp_entries = self.extract_entries_reference(response, law_act_id)
+                consolidated_entries = self.consolidate_entries_reference(temp_entries, law_act_id)
 
         # Store consolidated entries for this law act
         self.scraped_data[law_act_id] = consolidated_entries
+        metrics.counter("crawl_acts_total", "Fetched law acts by outcome").inc(result="parsed")
+        metrics.counter("crawl_paragraphs_total", "Paragraphs extracted").inc(len(consolidated_entries))
 
-        print(f"\nOriginal entries: {len(temp_entries)}")
-        print(f"Consolidated entries: {len(consolidated_entries)}")
+        self.logger.debug(f"Original entries: {len(temp_entries)}, consolidated entries: {len(consolidated_entries)}")
 
-        # Save individual CSV file for this law act immediately
-        self.save_individual_csv(law_act_id, consolidated_entries)
+        page_state = (self.header_value(response, 'ETag'), self.header_value(response, 'Last-Modified'),
+                      page_hash, page_changed)
+        if self.corpus_dir and consolidated_entries:
+            # Written in batches by corpus_sink.CorpusSinkPipeline, which calls corpus_flushed when they are on disk
+            self.uncommitted_acts[law_act_id] = page_state
+            yield {'law_act_id': law_act_id, 'paragraphs': consolidated_entries}
+        else:
+            # Save individual CSV file for this law act immediately
+            if not self.corpus_dir:
+                with metrics.stage("csv_write"):
+                    self.save_individual_csv(law_act_id, consolidated_entries)
+            self.commit_act(law_act_id, bool(consolidated_entries), *page_state)
 
         # Log progress
-        self.logger.info(
-            f"Processed {response.url} - Found {len(act_text_divs)} ACT_TEXT/CLAUSE_DEFAULT elements, consolidated to {len(consolidated_entries)} entries")
+        self.logger.debug(
+            f"Processed {response.url} - Found {len(temp_entries)} ACT_TEXT/CLAUSE_DEFAULT entries, consolidated to {len(consolidated_entries)} entries")
+
+    def commit_act(self, law_act_id, has_entries, etag, last_modified, page_hash, page_changed):
+        """Record a fetched act in the frontier once its paragraphs are saved, so a crash before that means a re-fetch"""
+        if self.frontier is None or law_act_id == "unknown":
+            return
+        self.frontier.record_page(law_act_id, etag, last_modified, page_hash, page_changed)
+        self.frontier.mark(law_act_id, 'done' if has_entries else 'empty')
+        if page_changed and has_entries:
+            self.record_changed_act(law_act_id)
+
+    def corpus_flushed(self, law_act_ids):
+        """Called by the corpus pipeline after the paragraphs of these acts were written to a shard"""
+        for law_act_id in law_act_ids:
+            page_state = self.uncommitted_acts.pop(law_act_id, None)
+            if page_state is not None:
+                self.commit_act(law_act_id, True, *page_state)
 
     def save_individual_csv(self, law_act_id, data_entries):
         """Save data for individual law act to separate CSV file"""
         if not data_entries:
-            print(f"No data to save for law act {law_act_id}")
+            self.logger.debug(f"No data to save for law act {law_act_id}")
             return
 
         try:
@@ -320,37 +452,38 @@ class LexNewSpider2(scrapy.Spider):
             df = pd.DataFrame(data_entries)
 
             # Create filename
-            output_file = f'{law_act_id}.csv'
+            output_file = os.path.join(self.output_dir, f'{law_act_id}.csv')
 
             # Save to CSV
             df.to_csv(output_file, index=False, encoding='utf-8')
 
             # Verify file was created
             if os.path.exists(output_file):
-                file_size = os.path.getsize(output_file)
-                print(f"✓ Successfully saved {len(data_entries)} records to {output_file}")
-                print(f"✓ File size: {file_size} bytes")
-
-                # Show statistics about word counts
-                word_counts = [self.count_words(text) for text in df['text']]
-                print(f"✓ Text statistics for {law_act_id}:")
-                print(f"    Average words per entry: {sum(word_counts) / len(word_counts):.1f}")
-                print(f"    Minimum words: {min(word_counts)}")
-                print(f"    Maximum words: {max(word_counts)}")
-                print(f"    Entries with < 30 words: {sum(1 for wc in word_counts if wc < 30)}")
+                self.logger.debug(f"Saved {len(data_entries)} records to {output_file} "
+                                  f"({os.path.getsize(output_file)} bytes)")
+
+                # Word count statistics; only computed when they are logged
+                if self.logger.isEnabledFor(logging.DEBUG):
+                    word_counts = [count_words(text) for text in df['text']]
+                    self.logger.debug(f"Text statistics for {law_act_id}: "
+                                      f"average {sum(word_counts) / len(word_counts):.1f} words per entry, "
+                                      f"min {min(word_counts)}, max {max(word_counts)}, "
+                                      f"{sum(1 for wc in word_counts if wc < 30)} entries with < 30 words")
             else:
-                print(f"✗ File was not created: {output_file}")
+                self.logger.error(f"File was not created: {output_file}")
+                metrics.counter("crawl_errors_total", "Failed fetches and writes").inc(kind="save")
 
         except Exception as e:
-            print(f"✗ Error saving CSV for {law_act_id}: {e}")
+            self.logger.error(f"Error saving CSV for {law_act_id}: {e}")
+            metrics.counter("crawl_errors_total", "Failed fetches and writes").inc(kind="save")
             # Try saving as backup JSON
             try:
-                backup_file = f'{law_act_id}_backup.json'
+                backup_file = os.path.join(self.output_dir, f'{law_act_id}_backup.json')
                 with open(backup_file, 'w', encoding='utf-8') as f:
                     json.dump(data_entries, f, ensure_ascii=False, indent=2)
-                print(f"✓ Saved backup as JSON: {backup_file}")
+                self.logger.warning(f"Saved backup as JSON: {backup_file}")
             except Exception as e2:
-                print(f"✗ Error saving backup for {law_act_id}: {e2}")
+                self.logger.error(f"Error saving backup for {law_act_id}: {e2}")
 
     def closed(self, reason):
         """Called when the spider closes"""
@@ -362,55 +495,228 @@ class LexNewSpider2(scrapy.Spider):
         print(f"Total law acts processed: {total_files}")
         print(f"Total entries across all files: {total_entries}")
 
-        # List all created files
-        created_files = []
-        for law_act_id in self.scraped_data.keys():
-            csv_file = f'{law_act_id}.csv'
-            if os.path.exists(csv_file):
-                created_files.append(csv_file)
-
-        print(f"\nCreated {len(created_files)} CSV files:")
-        for file in sorted(created_files):
-            file_size = os.path.getsize(file)
-            print(f"  {file} ({file_size} bytes)")
-
-        if not created_files:
-            print("✗ No CSV files were created - check the HTML structure")
-            self.logger.warning("No CSV files were created")
+        if self.corpus_dir:
+            shards = get_corpus_shards(self.corpus_dir)
+            print(f"Corpus {os.path.abspath(self.corpus_dir)}: {len(shards)} shards, "
+                  f"{sum(os.path.getsize(path) for path in shards)} bytes")
+            if self.uncommitted_acts:
+                print(f"✗ {len(self.uncommitted_acts)} acts were not written and stay pending")
         else:
-            print(f"✓ All files saved to current directory: {os.getcwd()}")
-            self.logger.info(f"Created {len(created_files)} CSV files with {total_entries} total records")
-
-
-def run_spider():
-    """Function to run the spider"""
+            # List all created files
+            created_files = []
+            for law_act_id in self.scraped_data.keys():
+                csv_file = os.path.join(self.output_dir, f'{law_act_id}.csv')
+                if os.path.exists(csv_file):
+                    created_files.append(csv_file)
+
+            print(f"\nCreated {len(created_files)} CSV files:")
+            for file in sorted(created_files):
+                file_size = os.path.getsize(file)
+                print(f"  {file} ({file_size} bytes)")
+
+            if not created_files:
+                print("✗ No CSV files were created - check the HTML structure")
+                self.logger.warning("No CSV files were created")
+            else:
+                print(f"✓ All files saved to: {os.path.abspath(self.output_dir)}")
+                self.logger.info(f"Created {len(created_files)} CSV files with {total_entries} total records")
+
+        elapsed = time.time() - self.started_at
+        print(f"Crawl rate: {total_files / elapsed:.2f} acts/s ({total_files} acts in {elapsed:.1f}s)")
+        backoffs = self.crawler.stats.get_value('backoff/count') if getattr(self, 'crawler', None) else None
+        if backoffs:
+            print(f"Backed off {backoffs} times on 429/5xx responses")
+
+        if self.frontier is not None:
+            print(f"Frontier state: {self.frontier.counts()}")
+            if self.changed_acts:
+                print(f"{len(self.changed_acts)} new or changed acts listed in {self.changed_acts_path}")
+            self.frontier.close()
+
+        for line in metrics.stage_summary():
+            print(line)
+        if self.metrics_path:
+            path = self.metrics_path
+            if self.shard:
+                # One file per worker process: metrics.json -> metrics.shard2.json
+                root, ext = os.path.splitext(path)
+                path = f"{root}.shard{self.shard[0]}{ext}"
+            metrics.write(path)
+            print(f"Metrics written to {path}")
+
+
+def crawl_settings(fast=False, max_concurrency=32, target_concurrency=8.0, corpus_dir=None, stream_index=False,
+                   log_level=None):
+    """
+    Scrapy settings for the crawl. The default is the polite one-request-at-a-time
+    crawl; fast=True lets AutoThrottle adapt the delay to the server's latency,
+    keeping about target_concurrency requests in flight (never more than
+    max_concurrency) and backing off on 429/5xx (throttle.BackoffMiddleware).
+    With corpus_dir, paragraphs go to sharded JSONL files through
+    corpus_sink.CorpusSinkPipeline; stream_index=True also embeds them into
+    the live search index as they arrive (stream_index.StreamIndexPipeline).
+    log_level overrides the LOG_LEVEL (DEBUG shows the per-paragraph extraction log).
+    """
+    settings = {
+        'USER_AGENT': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+        'ROBOTSTXT_OBEY': False,
+        'DOWNLOAD_DELAY': 1,  # Be respectful to the server
+        'RANDOMIZE_DOWNLOAD_DELAY': 0.5,
+        'CONCURRENT_REQUESTS': 1,  # Process one at a time to be respectful
+        'COOKIES_ENABLED': True,
+        'LOG_LEVEL': 'INFO'
+    }
+    if corpus_dir:
+        settings['ITEM_PIPELINES'] = {'corpus_sink.CorpusSinkPipeline': 300}
+        settings['CORPUS_DIR'] = corpus_dir
+        if stream_index:
+            settings['ITEM_PIPELINES']['stream_index.StreamIndexPipeline'] = 400
+    if fast:
+        settings.update({
+            'DOWNLOAD_DELAY': 0,
+            'CONCURRENT_REQUESTS': max_concurrency,
+            'CONCURRENT_REQUESTS_PER_DOMAIN': max_concurrency,
+            'AUTOTHROTTLE_ENABLED': True,
+            'AUTOTHROTTLE_START_DELAY': 0.25,
+            'AUTOTHROTTLE_MAX_DELAY': 30,
+            'AUTOTHROTTLE_TARGET_CONCURRENCY': target_concurrency,
+            'RETRY_TIMES': 3,
+            'RETRY_HTTP_CODES': [429, 500, 502, 503, 504, 522, 524, 408],
+            # Above RetryMiddleware (550) so it sees the error response before it is retried
+            'DOWNLOADER_MIDDLEWARES': {'throttle.BackoffMiddleware': 560},
+            'BACKOFF_MAX_DELAY': 60,
+            'LOG_LEVEL': 'WARNING',
+        })
+    if log_level:
+        settings['LOG_LEVEL'] = log_level
+    return settings
+
+
+def parse_shard(value):
+    """'2/8' -> (2, 8)"""
+    index, _, count = value.partition('/')
+    try:
+        index, count = int(index), int(count)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a shard like 0/4, got {value!r}")
+    if not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"shard index must be between 0 and {count - 1}")
+    return index, count
+
+
+def run_workers(workers, argv):
+    """
+    Run `workers` crawler processes, each with --shard i/workers and the same
+    other arguments, and wait for all of them. They share the frontier (SQLite
+    WAL handles the concurrent writers) and the corpus directory, where each
+    process writes its own shard files (named after its pid); with --csv they
+    write disjoint per-act CSV files instead.
+    """
+    processes = [subprocess.Popen([sys.executable, os.path.abspath(__file__), *argv, '--shard', f'{i}/{workers}'])
+                 for i in range(workers)]
+    return max(process.wait() for process in processes)
+
+
+def run_spider(frontier_path="frontier.sqlite", seed_files=None, max_attempts=3, refresh=False,
+               changed_acts_path="changed_acts.txt", base_url="https://lex.uz", shard=None, output_dir=".",
+               save_html_dir=None, fast=False, max_concurrency=32, target_concurrency=8.0, fast_parse=True,
+               corpus_dir="corpus", stream_index=False, log_level=None, metrics_path=None):
+    """
+    Function to run the spider (frontier_path=None reads the first 100 IDs from numbers.csv instead).
+    Paragraphs are written to sharded JSONL files in corpus_dir, or with corpus_dir=None to one CSV per act.
+    metrics_path receives the stage timings and counters when the crawl ends (see metrics.py).
+    """
     # Print where files will be saved
-    print("=== Files will be saved to current directory ===")
-    print(f"Current working directory: {os.getcwd()}")
-    print("Input file: numbers.csv")
-    print("Output files: [law_act_id].csv (e.g., 6445145.csv)")
+    print(f"Input: {frontier_path or 'numbers.csv'}")
+    if corpus_dir:
+        print(f"=== Corpus shards will be saved to {os.path.abspath(corpus_dir)} ===")
+    else:
+        print(f"=== Files will be saved to {os.path.abspath(output_dir)} ===")
+        print("Output files: [law_act_id].csv (e.g., 6445145.csv)")
 
     # Configure logging
     logging.basicConfig(
-        level=logging.INFO,
+        level=log_level or logging.INFO,
         format='%(asctime)s [%(levelname)s] %(message)s'
     )
 
     # Configure Scrapy settings
-    process = CrawlerProcess({
-        'USER_AGENT': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'ROBOTSTXT_OBEY': False,
-        'DOWNLOAD_DELAY': 1,  # Be respectful to the server
-        'RANDOMIZE_DOWNLOAD_DELAY': 0.5,
-        'CONCURRENT_REQUESTS': 1,  # Process one at a time to be respectful
-        'COOKIES_ENABLED': True,
-        'LOG_LEVEL': 'INFO'
-    })
+    process = CrawlerProcess(crawl_settings(fast=fast, max_concurrency=max_concurrency,
+                                            target_concurrency=target_concurrency, corpus_dir=corpus_dir,
+                                            stream_index=stream_index, log_level=log_level))
 
     # Run the spider
-    process.crawl(LexNewSpider2)
+    process.crawl(LexNewSpider2, frontier_path=frontier_path, seed_files=seed_files, max_attempts=max_attempts,
+                  refresh=refresh, changed_acts_path=changed_acts_path, base_url=base_url, shard=shard,
+                  output_dir=output_dir, save_html_dir=save_html_dir, fast_parse=fast_parse, corpus_dir=corpus_dir,
+                  metrics_path=metrics_path)
     process.start()
 
 
 if __name__ == "__main__":
-    run_spider()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Crawl law acts from lex.uz into sharded JSONL corpus files "
+                                                 "(or one CSV file per act with --csv)")
+    parser.add_argument("--frontier", default="frontier.sqlite", help="SQLite crawl frontier (resumable)")
+    parser.add_argument("--seed", nargs="+", help=f"id files to import into the frontier "
+                                                  f"(default: {', '.join(DEFAULT_SEED_FILES)})")
+    parser.add_argument("--max-attempts", type=int, default=3, help="attempts before a failed id is given up")
+    parser.add_argument("--legacy-csv", action="store_true", help="crawl the first 100 ids of numbers.csv instead")
+    parser.add_argument("--refresh", action="store_true",
+                        help="re-check already fetched acts with conditional requests, rewrite only changed ones")
+    parser.add_argument("--changed-acts", default="changed_acts.txt",
+                        help="file that new/changed act ids are appended to (for embedding.py --changed-acts)")
+    parser.add_argument("--base-url", default="https://lex.uz", help="site to crawl (e.g. a local stub_server.py)")
+    parser.add_argument("--corpus-dir", default="corpus", help="directory for the sharded JSONL corpus")
+    parser.add_argument("--csv", action="store_true", help="write one [law_act_id].csv per act instead of shards")
+    parser.add_argument("--stream-index", action="store_true",
+                        help="embed crawled acts into the search index as they arrive (checkpointed every 10s)")
+    parser.add_argument("--output-dir", default=".", help="directory for the per-act CSV files (--csv)")
+    parser.add_argument("--save-html", metavar="DIR", help="also save the raw pages to DIR/[law_act_id].html")
+    parser.add_argument("--reference-parse", action="store_true",
+                        help="extract paragraphs with the original per-div CSS queries instead of fast_extract")
+    parser.add_argument("--fast", action="store_true",
+                        help="adaptive concurrency (AutoThrottle) with back-off on 429/5xx instead of 1 request/s")
+    parser.add_argument("--max-concurrency", type=int, default=32, help="upper bound on requests in flight (--fast)")
+    parser.add_argument("--target-concurrency", type=float, default=8.0,
+                        help="average requests in flight AutoThrottle aims for (--fast)")
+    parser.add_argument("--shard", type=parse_shard, metavar="I/N",
+                        help="only crawl the I-th of N equal id ranges (run one per process or host)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="start this many worker processes, one shard each, and wait for them")
+    parser.add_argument("--log-level", choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                        help="log level (default: INFO, WARNING with --fast); DEBUG logs every extracted paragraph")
+    parser.add_argument("--metrics", help="write the stage timings and counters to this file when the crawl ends "
+                                          "(Prometheus text for .prom / .txt, JSON otherwise; one per worker)")
+    parser.add_argument("--profile-stage", action="append", default=[],
+                        help="run this stage (parse, page_hash, csv_write, corpus_write, stream_checkpoint) under "
+                             "cProfile and write <stage>.prof; repeatable")
+    args = parser.parse_args()
+    if args.profile_stage:
+        metrics.profile_stage(*args.profile_stage)
+
+    if args.stream_index and (args.csv or args.workers > 1 or args.shard):
+        parser.error("--stream-index needs the corpus output and a single crawler process")
+
+    if args.workers > 1:
+        if args.shard or args.legacy_csv:
+            parser.error("--workers cannot be combined with --shard or --legacy-csv")
+        # Import the seed files once before the workers start, so they agree on the shard boundaries
+        frontier = Frontier(args.frontier)
+        for seed_file in args.seed or DEFAULT_SEED_FILES:
+            if os.path.exists(seed_file):
+                frontier.import_ids(seed_file)
+        frontier.close()
+        worker_argv, argv = [], iter(sys.argv[1:])
+        for arg in argv:
+            if arg == '--workers':
+                next(argv, None)
+            elif not arg.startswith('--workers='):
+                worker_argv.append(arg)
+        sys.exit(run_workers(args.workers, worker_argv))
+
+    run_spider(frontier_path=None if args.legacy_csv else args.frontier, seed_files=args.seed,
+               max_attempts=args.max_attempts, refresh=args.refresh, changed_acts_path=args.changed_acts,
+               base_url=args.base_url, shard=args.shard, output_dir=args.output_dir, save_html_dir=args.save_html,
+               fast=args.fast, max_concurrency=args.max_concurrency, target_concurrency=args.target_concurrency,
+               fast_parse=not args.reference_parse, corpus_dir=None if args.csv else args.corpus_dir,
+               stream_index=args.stream_index, log_level=args.log_level, metrics_path=args.metrics)
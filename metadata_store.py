@@ -0,0 +1,205 @@
+import json
+import os
+import pickle
+import shutil
+import threading
+
+import numpy as np
+
+
+def encode_value(value, label_codes, labels):
+    """
+    Encode one metadata value as int64: non-negative integers are stored as is,
+    anything else (strings, None, negative numbers) becomes -(1 + label index)
+    """
+    if isinstance(value, (float, np.floating)):
+        if np.isnan(value):
+            value = None
+        elif float(value).is_integer():
+            value = int(value)
+    elif isinstance(value, np.integer):
+        value = int(value)
+    elif isinstance(value, str) and value.isdigit() and not (len(value) > 1 and value.startswith("0")):
+        # CSV columns with a few non-numeric ids come back as strings
+        value = int(value)
+
+    if isinstance(value, int) and not isinstance(value, bool) and 0 <= value < 2 ** 63:
+        return value
+
+    code = label_codes.get(value)
+    if code is None:
+        code = len(labels)
+        labels.append(value)
+        label_codes[value] = code
+    return -(code + 1)
+
+
+class MetadataStore:
+    """
+    Read-only columnar metadata, indexed by vector id.
+
+    Every column is an int64 .npy file opened with mmap: non-negative values are
+    the integer itself, negative values point into the column's label list
+    (dictionary encoding for strings such as source_file and for the odd
+    non-numeric paragraph_id). present.npy marks which vector ids have a row.
+    Only the rows that are actually looked up are turned into Python dicts.
+
+    act_ranges maps each law_act_id (as a string) to the [start, end) range of
+    vector ids its paragraphs occupy, or is None for stores written without it.
+
+    version is the stamp of the index build that wrote the store (None for
+    stores written without one).
+
+    Rows with a representative_id are near-duplicates that share the vector of
+    that row (see dedup.py), so only num_vectors of the rows are in the index.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+
+        self.num_rows = meta["num_rows"]
+        self.labels = meta["labels"]
+        self.column_names = list(self.labels)
+        self.act_ranges = meta.get("act_ranges")
+        self.num_vectors = meta.get("num_vectors", self.num_rows)
+        self.version = meta.get("version")
+        self.present = np.load(os.path.join(path, "present.npy"), mmap_mode='r')
+        self.columns = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r')
+                        for name in self.column_names}
+        self._duplicates = None
+        self._duplicates_lock = threading.Lock()
+
+    def __len__(self):
+        return self.num_rows
+
+    @property
+    def capacity(self):
+        """
+        Size of the vector id space covered by the columns (including removed ids)
+        """
+        return len(self.present)
+
+    def __contains__(self, vector_id):
+        return 0 <= vector_id < len(self.present) and bool(self.present[vector_id])
+
+    def decode(self, name, code):
+        code = int(code)
+        return code if code >= 0 else self.labels[name][-code - 1]
+
+    def __getitem__(self, vector_id):
+        if vector_id not in self:
+            raise KeyError(vector_id)
+        return {name: self.decode(name, column[vector_id]) for name, column in self.columns.items()}
+
+    def get(self, vector_id, default=None):
+        return self[vector_id] if vector_id in self else default
+
+    def duplicates(self, vector_id):
+        """Vector ids of the rows whose representative_id is vector_id"""
+        if 'representative_id' not in self.columns:
+            return []
+        with self._duplicates_lock:
+            if self._duplicates is None:
+                # Reverse map representative -> duplicates, built on first use
+                representatives = self.columns['representative_id']
+                duplicate_ids = np.flatnonzero((representatives >= 0) & (self.present > 0))
+                self._duplicates = {}
+                for duplicate_id in duplicate_ids.tolist():
+                    self._duplicates.setdefault(int(representatives[duplicate_id]), []).append(duplicate_id)
+        return self._duplicates.get(int(vector_id), [])
+
+
+def write_metadata_store(path, rows_by_id, base=None, removed_ids=(), act_ranges=None, version=None):
+    """
+    Write a columnar metadata store to path.
+
+    rows_by_id maps vector id -> row dict. If base (an existing MetadataStore)
+    is given, its rows are kept except for removed_ids, and the new rows are
+    added on top. act_ranges (law_act_id -> (start, end), e.g. from the build
+    manifest) is stored for filtered search, version (the build's version
+    stamp) for result caching. The store is written to a
+    temporary directory and swapped in, so readers see either the old or the
+    new store.
+    """
+    column_names = list(base.column_names) if base is not None else []
+    for row in rows_by_id.values():
+        for name in row:
+            if name not in column_names:
+                column_names.append(name)
+
+    capacity = max([base.capacity if base is not None else 0] + [vector_id + 1 for vector_id in rows_by_id])
+    present = np.zeros(capacity, dtype='uint8')
+    columns = {}
+    labels = {}
+    label_codes = {}
+
+    for name in column_names:
+        columns[name] = np.full(capacity, -1, dtype='int64')
+        labels[name] = [None]  # code -1 is "missing"
+        label_codes[name] = {None: 0}
+
+    if base is not None:
+        present[:base.capacity] = base.present
+        for name in base.column_names:
+            columns[name][:base.capacity] = base.columns[name]
+            labels[name] = list(base.labels[name])
+            label_codes[name] = {}
+            for code, value in enumerate(labels[name]):
+                label_codes[name].setdefault(value, code)
+        removed_ids = np.asarray(list(removed_ids), dtype='int64')
+        present[removed_ids[removed_ids < capacity]] = 0
+
+    for vector_id, row in rows_by_id.items():
+        present[vector_id] = 1
+        for name in column_names:
+            columns[name][vector_id] = encode_value(row.get(name), label_codes[name], labels[name])
+
+    tmp_path = path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    np.save(os.path.join(tmp_path, "present.npy"), present)
+    for name, column in columns.items():
+        np.save(os.path.join(tmp_path, f"{name}.npy"), column)
+    with open(os.path.join(tmp_path, "meta.json"), "w", encoding="utf-8") as f:
+        meta = {"num_rows": int(present.sum()), "labels": labels}
+        if 'representative_id' in columns:
+            meta["num_vectors"] = int((present.astype(bool) & (columns['representative_id'] < 0)).sum())
+        if version is not None:
+            meta["version"] = version
+        if act_ranges is not None:
+            meta["act_ranges"] = {str(act_id): [int(start), int(end)] for act_id, (start, end) in act_ranges.items()}
+        json.dump(meta, f, ensure_ascii=False)
+
+    old_path = path + ".old"
+    shutil.rmtree(old_path, ignore_errors=True)
+    if os.path.exists(path):
+        os.replace(path, old_path)
+    os.replace(tmp_path, path)
+    # Files already mapped by a running Searcher stay valid until it lets go of them
+    shutil.rmtree(old_path, ignore_errors=True)
+
+
+def resolve_metadata_path(path):
+    """
+    The metadata at path, or the legacy pickle path + ".pkl" when only that
+    exists (indexes built before the columnar store shipped "unified_metadata.pkl")
+    """
+    if not os.path.exists(path) and os.path.exists(path + ".pkl"):
+        return path + ".pkl"
+    return path
+
+
+def load_metadata(path):
+    """
+    Open metadata written by main(): a columnar store directory, or a legacy
+    pickle (also found as path + ".pkl", see resolve_metadata_path)
+    """
+    path = resolve_metadata_path(path)
+    if os.path.isdir(path):
+        return MetadataStore(path)
+
+    with open(path, "rb") as f:
+        return pickle.load(f)
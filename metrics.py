@@ -0,0 +1,276 @@
+import atexit
+import bisect
+import cProfile
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the stage timing histogram buckets; +Inf is implied
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Stage whose stage() blocks are run under cProfile (comma-separated names), and where the
+# .prof files go; see profile_stage()
+PROFILE_ENV = "METRICS_PROFILE_STAGE"
+PROFILE_DIR_ENV = "METRICS_PROFILE_DIR"
+
+
+def _label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    """Monotonic count, one value per label set"""
+
+    kind = "counter"
+
+    def __init__(self, name, help=""):
+        self.name = name
+        self.help = help
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self.values.get(_label_key(labels), 0)
+
+    def snapshot(self):
+        return [{"labels": dict(key), "value": value} for key, value in self.values.items()]
+
+    def prometheus(self):
+        return [f"{self.name}{_format_labels(key)} {value}" for key, value in self.values.items()]
+
+
+class Histogram:
+    """Observations in cumulative buckets with their count and sum, one series per label set"""
+
+    kind = "histogram"
+
+    def __init__(self, name, help="", buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self.series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = {"counts": [0] * (len(self.buckets) + 1), "count": 0, "sum": 0.0}
+            series["counts"][bisect.bisect_left(self.buckets, value)] += 1
+            series["count"] += 1
+            series["sum"] += value
+
+    def quantile(self, q, **labels):
+        """Estimate of the q-quantile: the upper bound of the bucket it falls in (inf past the last one)"""
+        series = self.series.get(_label_key(labels))
+        if not series or not series["count"]:
+            return None
+        rank = q * series["count"]
+        seen = 0
+        for bound, count in zip(self.buckets + (float("inf"),), series["counts"]):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def snapshot(self):
+        result = []
+        for key, series in self.series.items():
+            labels = dict(key)
+            result.append({
+                "labels": labels,
+                "count": series["count"],
+                "sum": series["sum"],
+                "mean": series["sum"] / series["count"] if series["count"] else 0.0,
+                "p50": self.quantile(0.5, **labels),
+                "p95": self.quantile(0.95, **labels),
+                "buckets": dict(zip([str(bound) for bound in self.buckets] + ["+Inf"], series["counts"])),
+            })
+        return result
+
+    def prometheus(self):
+        lines = []
+        for key, series in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series["counts"]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(key, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {series['sum']}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {series['count']}")
+        return lines
+
+
+class Registry:
+    """
+    Named counters and histograms of one process.
+
+    stage(name) times a block into the stage_seconds histogram (label
+    stage=name); blocks of the stages selected with profile_stage() (or the
+    METRICS_PROFILE_STAGE environment variable) additionally run under
+    cProfile, and their stats are written to <dir>/<stage>.prof at exit for
+    pstats / snakeviz. Sampling profilers such as py-spy need no hook; the
+    stage_seconds totals tell which stage to point them at. Everything is
+    thread-safe and cheap enough to leave on: a stage costs two
+    perf_counter() calls and a dict update.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self._lock = threading.Lock()
+        self.profiled_stages = set()
+        self.profile_dir = "."
+        self._profiles = {}
+        self._profile_lock = threading.Lock()
+        stages = os.environ.get(PROFILE_ENV)
+        if stages:
+            self.profile_stage(*stages.split(","), directory=os.environ.get(PROFILE_DIR_ENV, "."))
+
+    def _get(self, cls, name, help, **kwargs):
+        with self._lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, help, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is a {metric.kind}, not a {cls.kind}")
+            return metric
+
+    def counter(self, name, help=""):
+        return self._get(Counter, name, help)
+
+    def histogram(self, name, help="", buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, help, buckets=buckets)
+
+    @contextmanager
+    def timer(self, name, help="", **labels):
+        """Observe the duration of the block, in seconds, in histogram name"""
+        histogram = self.histogram(name, help)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            histogram.observe(time.perf_counter() - start, **labels)
+
+    @contextmanager
+    def stage(self, name):
+        """Time a pipeline stage (download, parse, tokenize, forward, faiss_search, ...)"""
+        profile = self._profile(name) if name in self.profiled_stages else None
+        with self.timer("stage_seconds", "Time spent per pipeline stage", stage=name):
+            if profile is None:
+                yield
+                return
+            try:
+                profile.enable()
+            except ValueError:
+                # Another profiler is already active in this thread (e.g. an enclosing profiled stage)
+                profile = None
+            try:
+                yield
+            finally:
+                if profile is not None:
+                    profile.disable()
+
+    def observe_stage(self, name, seconds):
+        """Record a stage duration measured elsewhere (e.g. Scrapy's download latency)"""
+        self.histogram("stage_seconds", "Time spent per pipeline stage").observe(seconds, stage=name)
+
+    def profile_stage(self, *stages, directory="."):
+        """Run the stage() blocks of these stages under cProfile and dump their stats at exit"""
+        self.profiled_stages.update(stage for stage in stages if stage)
+        self.profile_dir = directory
+        atexit.register(self.dump_profiles)
+
+    def _profile(self, stage):
+        with self._profile_lock:
+            profile = self._profiles.get(stage)
+            if profile is None:
+                profile = self._profiles[stage] = cProfile.Profile()
+            return profile
+
+    def dump_profiles(self):
+        """Write <profile_dir>/<stage>.prof for every profiled stage that ran; returns the paths"""
+        paths = []
+        with self._profile_lock:
+            for stage, profile in self._profiles.items():
+                os.makedirs(self.profile_dir, exist_ok=True)
+                path = os.path.join(self.profile_dir, f"{stage}.prof")
+                profile.dump_stats(path)
+                paths.append(path)
+        return paths
+
+    def snapshot(self):
+        """All metrics as a JSON-serializable dict"""
+        with self._lock:
+            metrics = list(self.metrics.values())
+        return {metric.name: {"type": metric.kind, "help": metric.help, "series": metric.snapshot()}
+                for metric in metrics}
+
+    def to_prometheus(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            if metric.help:
+                lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.prometheus())
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Write a snapshot to path: Prometheus text for .prom / .txt files, JSON otherwise"""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            if path.endswith((".prom", ".txt")):
+                f.write(self.to_prometheus())
+            else:
+                json.dump(self.snapshot(), f, indent=2)
+        os.replace(tmp_path, path)
+
+    def reset(self):
+        with self._lock:
+            self.metrics.clear()
+
+
+# The process-wide registry that the crawler, the index build and the Searcher report to
+REGISTRY = Registry()
+counter = REGISTRY.counter
+histogram = REGISTRY.histogram
+timer = REGISTRY.timer
+stage = REGISTRY.stage
+observe_stage = REGISTRY.observe_stage
+profile_stage = REGISTRY.profile_stage
+snapshot = REGISTRY.snapshot
+to_prometheus = REGISTRY.to_prometheus
+write = REGISTRY.write
+
+
+def stage_summary(registry=REGISTRY):
+    """Lines of 'stage  count  total s  mean ms  p95 ms', slowest total first, for end-of-run reports"""
+    histogram = registry.metrics.get("stage_seconds")
+    if histogram is None:
+        return []
+    rows = sorted(histogram.snapshot(), key=lambda series: -series["sum"])
+    lines = [f"{'stage':<18}{'count':>9}{'total s':>10}{'mean ms':>10}{'p95 ms':>10}"]
+    for series in rows:
+        # Bucket estimate: the upper bound of the bucket holding the 95th percentile
+        p95 = "inf" if series["p95"] == float("inf") else f"{series['p95'] * 1000:.1f}"
+        lines.append(f"{series['labels'].get('stage', ''):<18}{series['count']:>9}{series['sum']:>10.2f}"
+                     f"{series['mean'] * 1000:>10.2f}{p95:>10}")
+    return lines
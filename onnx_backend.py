@@ -0,0 +1,100 @@
+import os
+
+import numpy as np
+
+BACKENDS = ["torch", "onnx", "onnx-int8"]
+
+# Exported graphs, one per backend
+DEFAULT_MODEL_DIR = "onnx_models"
+
+
+def export_onnx(model, onnx_path, opset=17):
+    """
+    Export the transformer plus the mean pooling of embedding.embed_encoded
+    as one graph, with dynamic batch and sequence axes
+    """
+    import torch
+
+    class MeanPooledEncoder(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask):
+            token_embeddings = self.model(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+            mask = attention_mask.unsqueeze(-1).to(token_embeddings.dtype)
+            return (token_embeddings * mask).sum(dim=1) / mask.sum(dim=1)
+
+    os.makedirs(os.path.dirname(onnx_path) or ".", exist_ok=True)
+    encoder = MeanPooledEncoder(model).eval()
+    input_ids = torch.ones((2, 8), dtype=torch.long)
+    attention_mask = torch.ones((2, 8), dtype=torch.long)
+    tmp_path = onnx_path + ".tmp"
+    with torch.no_grad():
+        torch.onnx.export(encoder, (input_ids, attention_mask), tmp_path, input_names=["input_ids", "attention_mask"],
+                          output_names=["embeddings"], opset_version=opset, dynamo=False,
+                          dynamic_axes={"input_ids": {0: "batch", 1: "sequence"},
+                                        "attention_mask": {0: "batch", 1: "sequence"},
+                                        "embeddings": {0: "batch"}})
+    os.replace(tmp_path, onnx_path)
+    return onnx_path
+
+
+def quantize_onnx(onnx_path, int8_path):
+    """Dynamic int8 quantization of the weights (activations are quantized on the fly)"""
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    tmp_path = int8_path + ".tmp"
+    quantize_dynamic(onnx_path, tmp_path, weight_type=QuantType.QInt8)
+    os.replace(tmp_path, int8_path)
+    return int8_path
+
+
+def model_paths(model_dir=DEFAULT_MODEL_DIR):
+    return os.path.join(model_dir, "encoder.onnx"), os.path.join(model_dir, "encoder-int8.onnx")
+
+
+def prepare(backend, load_model, model_dir=DEFAULT_MODEL_DIR):
+    """
+    Path of the graph for an ONNX backend, exporting (and quantizing) it on
+    first use; load_model() is only called when an export is needed
+    """
+    onnx_path, int8_path = model_paths(model_dir)
+    if not os.path.exists(onnx_path):
+        print(f"Exporting the encoder to {onnx_path}")
+        export_onnx(load_model(), onnx_path)
+    if backend == "onnx":
+        return onnx_path
+    if not os.path.exists(int8_path):
+        print(f"Quantizing {onnx_path} to int8: {int8_path}")
+        quantize_onnx(onnx_path, int8_path)
+    return int8_path
+
+
+class OnnxEncoder:
+    """
+    ONNX Runtime session for an exported encoder graph. Called with the
+    tokenizer's output (torch tensors or numpy arrays), like
+    embedding.embed_encoded, and returns the pooled float32 embeddings.
+    """
+
+    def __init__(self, onnx_path, threads=None):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise ImportError("The onnx backends need onnxruntime: pip install onnxruntime onnx")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+        self.path = onnx_path
+
+    def __call__(self, encoded_input):
+        feeds = {}
+        for name in ("input_ids", "attention_mask"):
+            value = encoded_input[name]
+            # torch tensors (from return_tensors='pt') have .numpy(); numpy input passes through
+            feeds[name] = (value.numpy() if hasattr(value, 'numpy') else np.asarray(value)).astype(np.int64)
+        return self.session.run(["embeddings"], feeds)[0]
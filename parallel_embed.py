@@ -0,0 +1,92 @@
+import multiprocessing
+import os
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from tqdm import tqdm
+
+# The embedding module of a worker process, set by _init_worker
+_embedding = None
+
+
+def default_threads(workers):
+    """Intra-op threads per worker so that workers * threads fills, but does not oversubscribe, the CPU"""
+    return max(1, (os.cpu_count() or 1) // workers)
+
+
+def _init_worker(threads, backend):
+    global _embedding
+    import torch
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+
+    # When the parent runs embedding.py as a script, spawn has already imported it
+    # as __mp_main__; reuse that instead of importing (and loading the model into) a second copy
+    main_module = sys.modules.get('__mp_main__')
+    if main_module is not None and hasattr(main_module, 'embed_texts'):
+        _embedding = main_module
+    else:
+        import embedding
+        _embedding = embedding
+    if backend != "torch":
+        _embedding.set_backend(backend, threads=threads)
+
+
+def _embed_chunk(output_path, shape, positions, texts, max_tokens, batch_size):
+    """Embed one chunk and write the vectors straight into their rows of the shared output memmap"""
+    embeddings = _embedding.embed_texts(texts, batch_size=batch_size, max_tokens=max_tokens, progress=False)
+    output = np.memmap(output_path, dtype='float32', mode='r+', shape=shape)
+    output[positions] = embeddings
+    output.flush()
+    del output
+    return len(positions)
+
+
+def embed_texts_parallel(text_list, dimension, workers=2, threads_per_worker=None, max_tokens=None, batch_size=16,
+                         chunk_size=1024, output_path=None, backend="torch"):
+    """
+    Embed texts in `workers` processes, each loading the model once and
+    running torch with threads_per_worker intra-op threads (default: the
+    cores divided among the workers), with the given embedding backend.
+
+    The texts are cut into chunks of chunk_size positions, dealt out
+    round-robin (so long and short texts are spread evenly) and embedded with
+    embed_texts in whichever worker is free. Workers write their vectors into
+    a float32 memmap at the chunk's positions instead of sending them back,
+    so the result is in input order no matter which worker finishes first.
+
+    The memmap lives in output_path (a temporary file if not given, removed
+    once the array is loaded); the function returns a regular float32 array.
+    """
+    shape = (len(text_list), dimension)
+    if not text_list:
+        return np.zeros(shape, dtype='float32')
+
+    threads = threads_per_worker or default_threads(workers)
+    remove_output = output_path is None
+    if output_path is None:
+        fd, output_path = tempfile.mkstemp(suffix=".f32", prefix="embeddings-")
+        os.close(fd)
+    np.memmap(output_path, dtype='float32', mode='w+', shape=shape).flush()
+
+    # Chunk k takes positions k, k + n_chunks, k + 2 * n_chunks, ...
+    n_chunks = max(workers, -(-len(text_list) // chunk_size))
+    chunks = [np.arange(k, len(text_list), n_chunks) for k in range(n_chunks)]
+
+    try:
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                                 initargs=(threads, backend)) as executor:
+            futures = [executor.submit(_embed_chunk, output_path, shape, positions,
+                                       [text_list[position] for position in positions], max_tokens, batch_size)
+                       for positions in chunks if len(positions)]
+            with tqdm(total=len(text_list), desc=f"Generating embeddings ({workers} processes)") as progress:
+                for future in futures:
+                    progress.update(future.result())
+
+        return np.array(np.memmap(output_path, dtype='float32', mode='r', shape=shape))
+    finally:
+        if remove_output:
+            os.remove(output_path)
@@ -0,0 +1,131 @@
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+# Entries per cache level and how long they stay valid
+DEFAULT_CACHE_SIZE = 10000
+DEFAULT_CACHE_TTL = 3600.0
+
+
+def normalize_query(query):
+    """Cache key of a query text: NFC-normalized with runs of whitespace collapsed"""
+    return ' '.join(unicodedata.normalize("NFC", query).split())
+
+
+class LRUCache:
+    """
+    Thread-safe LRU map with at most max_size entries, each valid for ttl
+    seconds after it was stored (None: until evicted). Counts hits, misses
+    (expired entries count as misses) and evictions.
+    """
+
+    def __init__(self, max_size=DEFAULT_CACHE_SIZE, ttl=DEFAULT_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """The value stored under key, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[1] > self.ttl:
+                del self._entries[key]
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class QueryCache:
+    """
+    Two-level search cache.
+
+    embeddings maps (encoder, normalized query text) to the query embedding,
+    so a repeated query skips the model. results maps (index version, query
+    embedding, top_k, filter and search options) to the formatted results,
+    so it also skips the index scan. The index version changes with every
+    build (see embedding.main) and names the index and all of its stores, so
+    results of an older index are never served; the Searcher also clears
+    the results whenever it installs a new snapshot.
+    """
+
+    def __init__(self, max_size=DEFAULT_CACHE_SIZE, ttl=DEFAULT_CACHE_TTL):
+        self.embeddings = LRUCache(max_size, ttl)
+        self.results = LRUCache(max_size, ttl)
+
+    def embed(self, queries, embed, encoder=None):
+        """
+        Embeddings of queries as one float32 matrix; only the queries not in
+        the cache (each distinct one once) are passed to embed(list of texts)
+        """
+        keys = [(encoder, normalize_query(query)) for query in queries]
+        cached = [self.embeddings.get(key) for key in keys]
+        missing = list(dict.fromkeys(key for key, vector in zip(keys, cached) if vector is None))
+        if missing:
+            embedded = dict(zip(missing, embed([text for _, text in missing])))
+            for key, vector in embedded.items():
+                self.embeddings.put(key, vector)
+            cached = [embedded[key] if vector is None else vector for key, vector in zip(keys, cached)]
+        return np.ascontiguousarray(np.array(cached, dtype='float32').reshape(len(queries), -1))
+
+    def search(self, version, query_embeddings, options, search):
+        """
+        One result list per query embedding; search(positions) is called once
+        for the queries without a cached result (positions into
+        query_embeddings) and must return their result lists in that order.
+        options is a hashable tuple of everything else the results depend on.
+        """
+        keys = [(version, vector.tobytes(), options) for vector in query_embeddings]
+        results = [self.results.get(key) for key in keys]
+        missing = [position for position, hits in enumerate(results) if hits is None]
+        if missing:
+            for position, hits in zip(missing, search(missing)):
+                self.results.put(keys[position], hits)
+                results[position] = hits
+        # Callers may add to the result dicts; keep the cached ones untouched
+        return [[dict(item) for item in hits] for hits in results]
+
+    def stats(self):
+        return {"embeddings": self.embeddings.stats(), "results": self.results.stats()}
@@ -0,0 +1,117 @@
+import argparse
+import json
+import sys
+import time
+
+from embedding import Searcher, BACKENDS, set_backend
+from sharded_index import ShardedSearcher
+from vector_store import DEFAULT_RESCORE_FACTOR
+from query_cache import DEFAULT_CACHE_SIZE, DEFAULT_CACHE_TTL
+import metrics
+
+
+def read_queries(stream):
+    """
+    Yield (id, query) pairs from a stream with one query per line.
+    A line can be plain text or a JSON object with "query" and an optional "id".
+    """
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("{"):
+            record = json.loads(line)
+            yield record.get("id", line_number), record["query"]
+        else:
+            yield line_number, line
+
+
+def batched(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run many semantic search queries and write the results as JSONL")
+    parser.add_argument("input", nargs="?", default="-", help="query file, one query per line (default: stdin)")
+    parser.add_argument("-o", "--output", default="-", help="JSONL output file (default: stdout)")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=256, help="queries embedded and searched together")
+    parser.add_argument("--index", default="unified_semantic_search.index")
+    parser.add_argument("--metadata", default="unified_metadata")
+    parser.add_argument("--texts", default="unified_texts")
+    parser.add_argument("--vectors", default="unified_vectors", help="exact vectors for rescoring compressed indexes")
+    parser.add_argument("--rescore-factor", type=int, default=DEFAULT_RESCORE_FACTOR,
+                        help="candidates per hit fetched from a compressed index and rescored exactly (1: off)")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE,
+                        help="query embeddings and result lists kept in the query cache (0: off)")
+    parser.add_argument("--cache-ttl", type=float, default=DEFAULT_CACHE_TTL, help="seconds a cache entry stays valid")
+    parser.add_argument("--nprobe", type=int)
+    parser.add_argument("--ef-search", type=int)
+    parser.add_argument("--with-text", action="store_true", help="include the full paragraph text")
+    parser.add_argument("--snippet-chars", type=int, help="include a snippet of this many characters")
+    parser.add_argument("--backend", choices=BACKENDS, default="torch", help="query encoder implementation")
+    parser.add_argument("--shard-dir", help="search the shards built by sharded_index.py in this directory "
+                                            "instead of --index/--metadata/--texts")
+    parser.add_argument("--law-act-ids", nargs="+", help="only search paragraphs of these law acts")
+    parser.add_argument("--source-files", nargs="+", help="only search paragraphs from these source files")
+    parser.add_argument("--law-act-range", type=int, nargs=2, metavar=("LOW", "HIGH"),
+                        help="only search paragraphs of law acts with LOW <= law_act_id < HIGH")
+    parser.add_argument("--metrics", help="write the stage timings and counters to this file "
+                                          "(Prometheus text for .prom / .txt, JSON otherwise)")
+    parser.add_argument("--profile-stage", action="append", default=[],
+                        help="run this stage (query_embed, faiss_search, rescore, metadata_lookup) under cProfile "
+                             "and write <stage>.prof; repeatable")
+    args = parser.parse_args()
+
+    set_backend(args.backend)
+    if args.profile_stage:
+        metrics.profile_stage(*args.profile_stage)
+    if args.shard_dir:
+        searcher = ShardedSearcher(args.shard_dir, nprobe=args.nprobe, ef_search=args.ef_search,
+                                   rescore_factor=args.rescore_factor, cache_size=args.cache_size,
+                                   cache_ttl=args.cache_ttl)
+    else:
+        searcher = Searcher(args.index, args.metadata, nprobe=args.nprobe, ef_search=args.ef_search,
+                            text_path=args.texts, vectors_path=args.vectors, rescore_factor=args.rescore_factor,
+                            cache_size=args.cache_size, cache_ttl=args.cache_ttl)
+
+    source = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8")
+    sink = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+
+    total = 0
+    start = time.perf_counter()
+    try:
+        for batch in batched(read_queries(source), args.batch_size):
+            results = searcher.search_many([query for _, query in batch], args.top_k, batch_size=args.batch_size,
+                                           with_text=args.with_text, snippet_chars=args.snippet_chars,
+                                           law_act_ids=args.law_act_ids, source_files=args.source_files,
+                                           law_act_range=args.law_act_range)
+            for (query_id, query), hits in zip(batch, results):
+                sink.write(json.dumps({"id": query_id, "query": query, "results": hits},
+                                      ensure_ascii=False, default=str) + "\n")
+            sink.flush()
+            total += len(batch)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Searched {total} queries in {elapsed:.2f}s ({total / max(elapsed, 1e-9):.1f} queries/sec)",
+          file=sys.stderr)
+    for line in metrics.stage_summary():
+        print(line, file=sys.stderr)
+    if args.metrics:
+        metrics.write(args.metrics)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+import threading
+from collections import OrderedDict
+
+import faiss
+import numpy as np
+
+from index_factory import search_parameters
+from metadata_store import MetadataStore
+
+# Filters matching at most this many vectors are scored exactly against just those
+# vectors instead of going through the index; larger ones use a selector inside FAISS
+EXACT_SEARCH_MAX_VECTORS = 8192
+
+
+class SearchFilter:
+    """
+    Restriction of a search to some law acts, source files and/or a [low, high)
+    range of law_act_ids (numeric ids only; the same kind of range the
+    shards are partitioned by). Criteria that are given are combined with
+    AND; None means "no restriction" for that criterion.
+    """
+
+    def __init__(self, law_act_ids=None, source_files=None, law_act_range=None):
+        self.law_act_ids = None if law_act_ids is None else frozenset(str(act_id) for act_id in law_act_ids)
+        self.source_files = None if source_files is None else frozenset(source_files)
+        self.law_act_range = None if law_act_range is None else (int(law_act_range[0]), int(law_act_range[1]))
+
+    @property
+    def key(self):
+        return self.law_act_ids, self.source_files, self.law_act_range
+
+    def __bool__(self):
+        return self.key != (None, None, None)
+
+    def __eq__(self, other):
+        return isinstance(other, SearchFilter) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return (f"SearchFilter(law_act_ids={self.law_act_ids}, source_files={self.source_files}, "
+                f"law_act_range={self.law_act_range})")
+
+
+class CompiledFilter:
+    """
+    A SearchFilter resolved against one index snapshot: the selected vector
+    ids, an IDSelectorBitmap over them for FAISS, and (for small selections)
+    the selected vectors themselves for exact scoring.
+    """
+
+    def __init__(self, mask):
+        self.ids = np.flatnonzero(mask).astype('int64')
+        # Bit i of byte i // 8 is vector id i, the layout IDSelectorBitmap expects
+        self.bitmap = np.packbits(mask, bitorder='little')
+        self.selector = faiss.IDSelectorBitmap(len(self.bitmap), faiss.swig_ptr(self.bitmap))
+        self._vectors = None
+        self._vectors_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def vectors(self, index):
+        """
+        The stored vectors of the selected ids, in the order of self.ids, or
+        None if the index cannot reconstruct them (IVF without a direct map)
+        or the selection is too large to score exactly
+        """
+        if len(self.ids) > EXACT_SEARCH_MAX_VECTORS:
+            return None
+        with self._vectors_lock:
+            if self._vectors is None:
+                try:
+                    self._vectors = index.reconstruct_batch(self.ids) if len(self.ids) \
+                        else np.zeros((0, index.d), dtype='float32')
+                except RuntimeError:
+                    self._vectors = False
+        return self._vectors if self._vectors is not False else None
+
+
+def _act_mask(metadata, law_act_ids, capacity):
+    mask = np.zeros(capacity, dtype=bool)
+    if metadata.act_ranges is not None:
+        # Per-act [start, end) ranges recorded by the build: no column scan needed
+        for act_id in law_act_ids:
+            act_range = metadata.act_ranges.get(act_id)
+            if act_range is not None:
+                mask[act_range[0]:act_range[1]] = True
+        return mask
+
+    # Stores written before act ranges were recorded
+    codes = [_column_code(metadata, 'law_act_id', act_id) for act_id in law_act_ids]
+    column = metadata.columns['law_act_id']
+    mask[:len(column)] = np.isin(column, [code for code in codes if code is not None])
+    return mask
+
+
+def _act_range_mask(metadata, law_act_range, capacity):
+    low, high = law_act_range
+    mask = np.zeros(capacity, dtype=bool)
+    if metadata.act_ranges is not None:
+        for act_id, (start, end) in metadata.act_ranges.items():
+            if act_id.isdigit() and low <= int(act_id) < high:
+                mask[start:end] = True
+        return mask
+
+    # Stores written before act ranges were recorded: numeric ids are stored as themselves, labels below 0
+    column = metadata.columns['law_act_id']
+    mask[:len(column)] = (column >= max(low, 0)) & (column < high)
+    return mask
+
+
+def _column_code(metadata, name, value):
+    """The int64 a metadata column stores for value, or None if it never occurs"""
+    if isinstance(value, str) and value.isdigit() and not (len(value) > 1 and value.startswith("0")):
+        return int(value)
+    try:
+        return -(metadata.labels[name].index(value) + 1)
+    except ValueError:
+        return None
+
+
+def compile_filter(search_filter, metadata):
+    """
+    Resolve search_filter into a CompiledFilter over the vector ids of a
+    columnar metadata store (the vector ids are the store's row ids).
+    Selected near-duplicate rows select their representative's vector.
+    """
+    if not isinstance(metadata, MetadataStore):
+        raise ValueError("Filtered search needs a columnar metadata store; rebuild the index with embedding.py")
+
+    capacity = metadata.capacity
+    mask = np.asarray(metadata.present, dtype=bool).copy()
+
+    if search_filter.law_act_ids is not None:
+        mask &= _act_mask(metadata, search_filter.law_act_ids, capacity)
+
+    if search_filter.source_files is not None:
+        codes = [_column_code(metadata, 'source_file', name) for name in search_filter.source_files]
+        mask &= np.isin(metadata.columns['source_file'], [code for code in codes if code is not None])
+
+    if search_filter.law_act_range is not None:
+        mask &= _act_range_mask(metadata, search_filter.law_act_range, capacity)
+
+    representatives = metadata.columns.get('representative_id')
+    if representatives is not None:
+        # Near-duplicates are not in the index: select the vectors they were folded into instead
+        folded = mask & (representatives >= 0)
+        mask &= ~folded
+        mask[representatives[folded]] = True
+
+    return CompiledFilter(mask)
+
+
+class FilterCache:
+    """Compiled filters of one index snapshot, least recently used evicted first"""
+
+    def __init__(self, metadata, max_size=16):
+        self.metadata = metadata
+        self.max_size = max_size
+        self._compiled = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, search_filter):
+        with self._lock:
+            compiled = self._compiled.get(search_filter)
+            if compiled is not None:
+                self._compiled.move_to_end(search_filter)
+                return compiled
+
+        compiled = compile_filter(search_filter, self.metadata)
+        with self._lock:
+            self._compiled[search_filter] = compiled
+            while len(self._compiled) > self.max_size:
+                self._compiled.popitem(last=False)
+        return compiled
+
+
+def exact_search(vectors, ids, queries, top_k):
+    """Inner-product top_k of queries against a small set of vectors, padded like faiss (-1 ids)"""
+    scores = queries @ vectors.T
+    k = min(top_k, len(ids))
+    if k < len(ids):
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        top = np.broadcast_to(np.arange(len(ids)), (len(queries), len(ids)))
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind='stable')
+
+    D = np.full((len(queries), top_k), -np.inf, dtype='float32')
+    I = np.full((len(queries), top_k), -1, dtype='int64')
+    D[:, :k] = np.take_along_axis(top_scores, order, axis=1)
+    I[:, :k] = ids[np.take_along_axis(top, order, axis=1)]
+    return D, I
+
+
+def filtered_search(index, queries, top_k, compiled, nprobe=None, ef_search=None):
+    """
+    Search only the vectors selected by compiled. Small selections are scored
+    exactly (so they are cheaper than an unfiltered search and never come back
+    short of hits); larger ones pass an IDSelectorBitmap to the index, which
+    skips the other vectors during the scan. nprobe / ef_search apply to the
+    index search as in search_parameters.
+    """
+    if not len(compiled):
+        return (np.full((len(queries), top_k), -np.inf, dtype='float32'),
+                np.full((len(queries), top_k), -1, dtype='int64'))
+
+    vectors = compiled.vectors(index)
+    if vectors is not None:
+        return exact_search(vectors, compiled.ids, queries, top_k)
+
+    params = search_parameters(index, nprobe=nprobe, ef_search=ef_search, selector=compiled.selector)
+    return index.search(queries, top_k, params=params)
@@ -0,0 +1,333 @@
+import argparse
+import asyncio
+import functools
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+
+from embedding import Searcher, BACKENDS, set_backend, warmup
+from search_filter import SearchFilter
+from sharded_index import ShardedSearcher
+from vector_store import DEFAULT_RESCORE_FACTOR
+from query_cache import DEFAULT_CACHE_SIZE, DEFAULT_CACHE_TTL
+import metrics
+
+# Filter parameters of /search, as SearchFilter arguments
+FILTER_PARAMS = ("law_act_ids", "source_files", "law_act_range")
+
+# Buckets of the batch size histogram
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class MicroBatcher:
+    """
+    Collects queries that arrive within max_wait_ms of each other into one
+    batch (up to max_batch queries), runs them through a single
+    Searcher.search_many call in a worker thread and hands each caller its
+    own results. Queries with different filters in the same batch are
+    searched with one search_many call per filter. At most max_queue queries
+    may be waiting; beyond that submit() raises QueueFullError so the server
+    can shed load.
+    """
+
+    def __init__(self, searcher, max_batch=64, max_wait_ms=5, max_queue=1024):
+        self.searcher = searcher
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        # One thread: batches run back to back while the next one is being collected
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="search-batch")
+        self.batches = 0
+        self.queries = 0
+        self.rejected = 0
+
+    async def submit(self, query, top_k, search_filter=None):
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((query, top_k, search_filter or SearchFilter(), future))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise QueueFullError()
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self.queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            batch = [item for item in batch if not item[3].cancelled()]
+            if not batch:
+                continue
+
+            self.batches += 1
+            self.queries += len(batch)
+            metrics.histogram("search_batch_size", "Queries per micro-batch", buckets=BATCH_SIZE_BUCKETS).observe(
+                len(batch))
+            groups = {}
+            for item in batch:
+                groups.setdefault(item[2], []).append(item)
+            for search_filter, group in groups.items():
+                await self._search_group(loop, search_filter, group)
+
+    async def _search_group(self, loop, search_filter, group):
+        queries = [query for query, _, _, _ in group]
+        max_k = max(top_k for _, top_k, _, _ in group)
+        search = functools.partial(self.searcher.search_many, queries, max_k, len(queries),
+                                   law_act_ids=search_filter.law_act_ids, source_files=search_filter.source_files,
+                                   law_act_range=search_filter.law_act_range)
+        try:
+            results = await loop.run_in_executor(self.executor, search)
+        except Exception as e:
+            for _, _, _, future in group:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, top_k, _, future), hits in zip(group, results):
+            if not future.done():
+                future.set_result(hits[:top_k])
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "queries": self.queries,
+            "rejected": self.rejected,
+            "queued": self.queue.qsize(),
+            "mean_batch_size": self.queries / self.batches if self.batches else 0.0,
+            "cache": self.searcher.cache_stats(),
+        }
+
+
+class SearchServer:
+    """
+    Minimal HTTP/1.1 server (keep-alive, no external dependencies) in front of a MicroBatcher.
+
+    GET  /search?q=...&top_k=5[&law_act_ids=1,2][&source_files=a.csv,b.csv][&law_act_range=6000000,7000000]
+    POST /search  {"query": "...", "top_k": 5, "law_act_ids": [...], "source_files": [...],
+                   "law_act_range": [6000000, 7000000]}
+
+    law_act_range is a [low, high) range of numeric law_act_ids.
+    GET  /stats
+    GET  /metrics[?format=json]   (Prometheus text exposition, or the JSON snapshot)
+    """
+
+    def __init__(self, batcher, max_top_k=100):
+        self.batcher = batcher
+        self.max_top_k = max_top_k
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    self.write_response(writer, 400, {"error": "malformed request line"}, keep_alive=False)
+                    await writer.drain()
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                body = b""
+                if "content-length" in headers:
+                    try:
+                        length = int(headers["content-length"])
+                        if length < 0:
+                            raise ValueError()
+                    except ValueError:
+                        self.write_response(writer, 400, {"error": "invalid Content-Length"}, keep_alive=False)
+                        await writer.drain()
+                        break
+                    body = await reader.readexactly(length)
+
+                status, payload = await self.dispatch(method, target, body)
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                self.write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, method, target, body):
+        url = urlsplit(target)
+        if url.path == "/stats":
+            return 200, self.batcher.stats()
+        if url.path == "/metrics":
+            if parse_qs(url.query).get("format") == ["json"]:
+                return 200, metrics.snapshot()
+            return 200, metrics.to_prometheus()
+        if url.path != "/search":
+            return 404, {"error": "not found"}
+
+        try:
+            if method == "POST":
+                request = json.loads(body or b"{}")
+                query = request["query"]
+                top_k = int(request.get("top_k", 5))
+                filter_args = {name: request.get(name) for name in FILTER_PARAMS}
+            else:
+                params = parse_qs(url.query)
+                query = params["q"][0]
+                top_k = int(params.get("top_k", ["5"])[0])
+                filter_args = {name: params[name][0].split(",") if name in params else None
+                               for name in FILTER_PARAMS}
+            if not isinstance(query, str):
+                raise TypeError()
+        except (KeyError, ValueError, TypeError, AttributeError):
+            return 400, {"error": "expected a 'query' (POST) or 'q' (GET) parameter"}
+
+        try:
+            # A JSON string would otherwise be taken apart character by character
+            for values in filter_args.values():
+                if values is not None and (not isinstance(values, list)
+                                           or not all(isinstance(value, (str, int)) for value in values)):
+                    raise ValueError()
+            if filter_args["law_act_range"] is not None and len(filter_args["law_act_range"]) != 2:
+                raise ValueError()
+            search_filter = SearchFilter(**filter_args)
+        except (ValueError, TypeError):
+            return 400, {"error": "law_act_ids and source_files must be lists, "
+                                  "law_act_range a [low, high) pair of law_act_ids"}
+
+        if not 1 <= top_k <= self.max_top_k:
+            return 400, {"error": f"top_k must be between 1 and {self.max_top_k}"}
+
+        start = time.perf_counter()
+        try:
+            results = await self.batcher.submit(query, top_k, search_filter)
+        except QueueFullError:
+            metrics.counter("http_requests_total", "Search requests by status").inc(status=503)
+            return 503, {"error": "server busy, try again later"}
+        except Exception as e:
+            metrics.counter("http_requests_total", "Search requests by status").inc(status=500)
+            return 500, {"error": str(e)}
+
+        took = time.perf_counter() - start
+        metrics.counter("http_requests_total", "Search requests by status").inc(status=200)
+        metrics.histogram("http_request_seconds", "Search request latency, queueing included").observe(took)
+        return 200, {"query": query, "results": results, "took_ms": took * 1000}
+
+    @staticmethod
+    def write_response(writer, status, payload, keep_alive):
+        reasons = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error",
+                   503: "Service Unavailable"}
+        if isinstance(payload, str):
+            body = payload.encode("utf-8")
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            body = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+            content_type = "application/json; charset=utf-8"
+        headers = [
+            f"HTTP/1.1 {status} {reasons.get(status, '')}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {len(body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        if status == 503:
+            headers.append("Retry-After: 1")
+        writer.write(("\r\n".join(headers) + "\r\n\r\n").encode("latin-1") + body)
+
+
+async def serve(args):
+    if args.shard_dir:
+        searcher = ShardedSearcher(args.shard_dir, nprobe=args.nprobe, ef_search=args.ef_search,
+                                   rescore_factor=args.rescore_factor, cache_size=args.cache_size,
+                                   cache_ttl=args.cache_ttl)
+    else:
+        searcher = Searcher(args.index, args.metadata, nprobe=args.nprobe, ef_search=args.ef_search,
+                            text_path=args.texts, vectors_path=args.vectors, rescore_factor=args.rescore_factor,
+                            cache_size=args.cache_size, cache_ttl=args.cache_ttl)
+    batcher = MicroBatcher(searcher, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms,
+                           max_queue=args.max_queue)
+    server = SearchServer(batcher)
+
+    batch_task = asyncio.create_task(batcher.run())
+    http_server = await asyncio.start_server(server.handle_connection, args.host, args.port)
+    print(f"Serving semantic search on http://{args.host}:{args.port}/search "
+          f"(max_batch={args.max_batch}, max_wait={args.max_wait_ms}ms, max_queue={args.max_queue})")
+
+    async with http_server:
+        try:
+            await http_server.serve_forever()
+        finally:
+            batch_task.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP semantic search server with micro-batching")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-batch", type=int, default=64, help="maximum queries per model/FAISS call")
+    parser.add_argument("--max-wait-ms", type=float, default=5, help="how long to wait for a batch to fill")
+    parser.add_argument("--max-queue", type=int, default=1024, help="queued queries before answering 503")
+    parser.add_argument("--index", default="unified_semantic_search.index")
+    parser.add_argument("--metadata", default="unified_metadata")
+    parser.add_argument("--texts", default="unified_texts")
+    parser.add_argument("--vectors", default="unified_vectors", help="exact vectors for rescoring compressed indexes")
+    parser.add_argument("--rescore-factor", type=int, default=DEFAULT_RESCORE_FACTOR,
+                        help="candidates per hit fetched from a compressed index and rescored exactly (1: off)")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE,
+                        help="query embeddings and result lists kept in the query cache (0: off)")
+    parser.add_argument("--cache-ttl", type=float, default=DEFAULT_CACHE_TTL, help="seconds a cache entry stays valid")
+    parser.add_argument("--nprobe", type=int)
+    parser.add_argument("--ef-search", type=int)
+    parser.add_argument("--backend", choices=BACKENDS, default="torch", help="query encoder implementation")
+    parser.add_argument("--shard-dir", help="search the shards built by sharded_index.py in this directory "
+                                            "instead of --index/--metadata/--texts")
+    parser.add_argument("--lazy-load", action="store_true",
+                        help="load the encoder on the first query instead of before serving")
+    parser.add_argument("--profile-stage", action="append", default=[],
+                        help="run this stage (query_embed, faiss_search, rescore, metadata_lookup) under cProfile "
+                             "and write <stage>.prof on exit; repeatable")
+    args = parser.parse_args()
+
+    set_backend(args.backend)
+    if args.profile_stage:
+        metrics.profile_stage(*args.profile_stage)
+    if not args.lazy_load:
+        warmup()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
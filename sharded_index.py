@@ -0,0 +1,356 @@
+import argparse
+import heapq
+import json
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from embedding import (Searcher, main as build_index, embed_queries, encoder_key, get_csv_files, iter_corpus,
+                       set_backend, BACKENDS, DEFAULT_MAX_TOKENS)
+from corpus_sink import get_corpus_shards
+from index_factory import INDEX_TYPES
+from vector_store import DEFAULT_RESCORE_FACTOR
+from query_cache import DEFAULT_CACHE_SIZE, DEFAULT_CACHE_TTL, QueryCache
+import metrics
+
+# Shard ranges and directories, relative to the shard directory
+LAYOUT_FILE = "shards.json"
+
+
+def shard_paths(path):
+    """
+    The index, metadata, text and vector stores and manifest of one shard, as
+    keyword arguments for embedding.main() (the vector store only exists for
+    compressed index types)
+    """
+    return {
+        "index_path": os.path.join(path, "unified_semantic_search.index"),
+        "metadata_path": os.path.join(path, "unified_metadata"),
+        "text_path": os.path.join(path, "unified_texts"),
+        "vectors_path": os.path.join(path, "unified_vectors"),
+        "manifest_path": os.path.join(path, "index_manifest.json"),
+    }
+
+
+def load_layout(shard_dir):
+    with open(os.path.join(shard_dir, LAYOUT_FILE), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_layout(layout, shard_dir):
+    """Write the layout atomically, so a running ShardedSearcher sees the old or the new one"""
+    path = os.path.join(shard_dir, LAYOUT_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(layout, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def collect_act_ids(directory=".", corpus_dir="corpus"):
+    """
+    Numeric law_act_ids of the corpus: CSV files are named after their act,
+    corpus shards are read (ids only, nothing is embedded)
+    """
+    act_ids = set()
+    for path in get_csv_files(directory):
+        stem = os.path.splitext(os.path.basename(path))[0]
+        if stem.isdigit():
+            act_ids.add(int(stem))
+    shards = get_corpus_shards(corpus_dir) if corpus_dir else []
+    for row in iter_corpus(shards):
+        if str(row.get('law_act_id', '')).isdigit():
+            act_ids.add(int(row['law_act_id']))
+    return sorted(act_ids)
+
+
+def shard_ranges(act_ids, num_shards):
+    """
+    Split the law_act_id space into num_shards [low, high) ranges with about
+    the same number of acts each. The first range has no lower bound and the
+    last no upper bound, so acts that appear later always have a shard.
+    With fewer distinct acts than num_shards there is one range per act, so
+    every range holds at least one act.
+    """
+    act_ids = sorted(set(int(act_id) for act_id in act_ids))
+    if not act_ids:
+        raise ValueError("No law acts found to partition")
+    num_shards = min(num_shards, len(act_ids))
+    positions = np.linspace(0, len(act_ids), num_shards + 1)[1:-1]
+    boundaries = sorted(set(int(act_ids[min(int(position), len(act_ids) - 1)]) for position in positions))
+    lows = [None] + boundaries
+    highs = boundaries + [None]
+    return list(zip(lows, highs))
+
+
+def range_contains(act_range, law_act_id):
+    low, high = act_range
+    value = int(law_act_id) if str(law_act_id).isdigit() else -1
+    return (low is None or value >= low) and (high is None or value < high)
+
+
+def ranges_overlap(act_range, law_act_range):
+    """Whether a shard's act_range (None bounds are open) and a [low, high) law_act_range share any id"""
+    low, high = act_range
+    return (low is None or law_act_range[1] > low) and (high is None or law_act_range[0] < high)
+
+
+def shard_build_kwargs(act_ids, act_range, build_kwargs):
+    """
+    embedding.main() arguments for the shard of act_range. A range that holds
+    none of act_ids gets an empty flat index: a trained index type would be
+    left untrained, and searching it fails. Once acts arrive in the range, the
+    next build sees the index type change and rebuilds the shard as requested.
+    """
+    if any(range_contains(act_range, act_id) for act_id in act_ids):
+        return build_kwargs
+    return {**build_kwargs, "index_type": "flat", "index_params": None}
+
+
+def build_shards(shard_dir, num_shards, incremental=False, directory=".", corpus_dir="corpus", **build_kwargs):
+    """
+    Build (or incrementally update) an index partitioned by law_act_id range
+    into num_shards shards under shard_dir (fewer if the corpus has fewer
+    acts). Each shard is a complete index written by embedding.main() for
+    its range of acts; shard_dir/shards.json records the ranges and shard
+    directories. The ranges are chosen on the first build and kept
+    afterwards, so an act always stays in its shard.
+    """
+    os.makedirs(shard_dir, exist_ok=True)
+    act_ids = collect_act_ids(directory, corpus_dir)
+    if os.path.exists(os.path.join(shard_dir, LAYOUT_FILE)):
+        layout = load_layout(shard_dir)
+        if layout.get("num_shards", len(layout["shards"])) != num_shards:
+            raise ValueError(f"{shard_dir} has {len(layout['shards'])} shards; "
+                             f"re-partitioning needs an empty shard directory")
+    else:
+        ranges = shard_ranges(act_ids, num_shards)
+        if len(ranges) < num_shards:
+            print(f"Only {len(ranges)} distinct law acts, building {len(ranges)} shards instead of {num_shards}")
+        layout = {"num_shards": num_shards,
+                  "shards": [{"low": low, "high": high, "path": f"shard-{i:03d}"}
+                             for i, (low, high) in enumerate(ranges)]}
+
+    for i, shard in enumerate(layout["shards"]):
+        print(f"Shard {i}: law_act_id in [{shard['low']}, {shard['high']})")
+        act_range = (shard["low"], shard["high"])
+        build_index(incremental=incremental, directory=directory, corpus_dir=corpus_dir, law_act_range=act_range,
+                    **shard_paths(os.path.join(shard_dir, shard["path"])),
+                    **shard_build_kwargs(act_ids, act_range, build_kwargs))
+    save_layout(layout, shard_dir)
+    return layout
+
+
+def swap_shard(shard_dir, shard, path):
+    """
+    Point shard number `shard` at another directory (relative to shard_dir)
+    holding a complete index for its range. Running ShardedSearchers pick up
+    the change on their next layout check; the other shards are untouched.
+    Returns the previous directory of the shard.
+    """
+    missing = [name for key, name in shard_paths(os.path.join(shard_dir, path)).items()
+               if key != "vectors_path" and not os.path.exists(name)]
+    if missing:
+        raise ValueError(f"{path} is not a complete shard, missing {', '.join(missing)}")
+    layout = load_layout(shard_dir)
+    previous = layout["shards"][shard]["path"]
+    layout["shards"][shard]["path"] = path
+    save_layout(layout, shard_dir)
+    return previous
+
+
+def rebuild_shard(shard_dir, shard, directory=".", corpus_dir="corpus", keep_previous=False, **build_kwargs):
+    """
+    Rebuild one shard from scratch into a fresh directory and swap it in,
+    while searchers keep serving the old copy until the swap
+    """
+    layout = load_layout(shard_dir)
+    entry = layout["shards"][shard]
+    path = f"shard-{shard:03d}-{int(time.time())}"
+    act_range = (entry["low"], entry["high"])
+    build_index(incremental=False, directory=directory, corpus_dir=corpus_dir, law_act_range=act_range,
+                **shard_paths(os.path.join(shard_dir, path)),
+                **shard_build_kwargs(collect_act_ids(directory, corpus_dir), act_range, build_kwargs))
+    previous = swap_shard(shard_dir, shard, path)
+    if not keep_previous:
+        # Searchers that still have the old shard open keep their in-memory index and mapped files
+        shutil.rmtree(os.path.join(shard_dir, previous), ignore_errors=True)
+    print(f"Shard {shard} now served from {path} (was {previous})")
+
+
+class ShardedSearcher:
+    """
+    Search front end for an index built by build_shards().
+
+    Queries are embedded once and searched on every shard in parallel on a
+    thread pool (FAISS releases the GIL while it scans), then the per-shard
+    top-k lists are merged by score. Each shard is a regular Searcher, so a
+    shard updated in place is hot-reloaded on its own; shards.json is
+    checked at most every check_interval seconds and shards whose directory
+    changed (swap_shard / rebuild_shard) are replaced without touching the
+    others. A law_act_ids or law_act_range filter only fans out to the shards
+    whose range holds one of the acts.
+
+    Vector ids are local to each shard.
+
+    Query embeddings are cached here, results in every shard's own cache
+    (keyed on that shard's index version); cache_size=0 disables both.
+    """
+
+    def __init__(self, shard_dir, workers=None, check_interval=1.0, nprobe=None, ef_search=None,
+                 rescore_factor=DEFAULT_RESCORE_FACTOR, cache_size=DEFAULT_CACHE_SIZE, cache_ttl=DEFAULT_CACHE_TTL):
+        self.shard_dir = shard_dir
+        self.layout_path = os.path.join(shard_dir, LAYOUT_FILE)
+        self.check_interval = check_interval
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.rescore_factor = rescore_factor
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.cache = QueryCache(cache_size, cache_ttl) if cache_size else None
+        self._shards = []
+        self._layout_lock = threading.Lock()
+        self._last_check = time.monotonic()
+        self._layout_signature = None
+        self.reload_layout()
+        self.executor = ThreadPoolExecutor(max_workers=workers or len(self._shards),
+                                           thread_name_prefix="shard-search")
+
+    def _signature(self):
+        stat = os.stat(self.layout_path)
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def reload_layout(self):
+        """Open the shards listed in shards.json, reusing the Searchers of shards that did not move"""
+        with self._layout_lock:
+            signature = self._signature()
+            layout = load_layout(self.shard_dir)
+            current = {path: searcher for (_, path), searcher in self._shards}
+            shards = []
+            for entry in layout["shards"]:
+                searcher = current.get(entry["path"])
+                if searcher is None:
+                    paths = shard_paths(os.path.join(self.shard_dir, entry["path"]))
+                    searcher = Searcher(paths["index_path"], paths["metadata_path"],
+                                        check_interval=self.check_interval, nprobe=self.nprobe,
+                                        ef_search=self.ef_search, text_path=paths["text_path"],
+                                        vectors_path=paths["vectors_path"], rescore_factor=self.rescore_factor,
+                                        cache_size=self.cache_size, cache_ttl=self.cache_ttl)
+                shards.append((((entry["low"], entry["high"]), entry["path"]), searcher))
+            self._shards = shards
+            self._layout_signature = signature
+
+    def check_for_update(self):
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+        try:
+            changed = self._signature() != self._layout_signature
+        except FileNotFoundError:
+            return
+        if changed and not self._layout_lock.locked():
+            threading.Thread(target=self._reload_in_background, daemon=True).start()
+
+    def _reload_in_background(self):
+        try:
+            self.reload_layout()
+            print(f"Reloaded shard layout from {self.layout_path}")
+        except Exception as e:
+            # Keep serving the previous shards; the next check will try again
+            print(f"Error reloading shard layout {self.layout_path}: {e}")
+
+    def search(self, query, top_k=5, **kwargs):
+        return self.search_many([query], top_k, **kwargs)[0]
+
+    def search_many(self, queries, top_k=5, batch_size=64, nprobe=None, ef_search=None, with_text=False,
+                    snippet_chars=None, law_act_ids=None, source_files=None, law_act_range=None):
+        """Same interface and result format as Searcher.search_many"""
+        self.check_for_update()
+        if not queries:
+            return []
+        metrics.counter("search_queries_total", "Queries searched").inc(len(queries))
+
+        shards = self._shards
+        if law_act_ids is not None:
+            shards = [(entry, searcher) for entry, searcher in shards
+                      if any(range_contains(entry[0], act_id) for act_id in law_act_ids)]
+        if law_act_range is not None:
+            shards = [(entry, searcher) for entry, searcher in shards if ranges_overlap(entry[0], law_act_range)]
+        if not shards:
+            return [[] for _ in queries]
+
+        with metrics.stage("query_embed"):
+            if self.cache is None:
+                query_embeddings = embed_queries(queries, batch_size=batch_size)
+            else:
+                query_embeddings = self.cache.embed(queries,
+                                                    lambda texts: embed_queries(texts, batch_size=batch_size),
+                                                    encoder=encoder_key())
+        futures = [self.executor.submit(searcher.search_vectors, query_embeddings, top_k, nprobe=nprobe,
+                                        ef_search=ef_search, with_text=with_text, snippet_chars=snippet_chars,
+                                        law_act_ids=law_act_ids, source_files=source_files,
+                                        law_act_range=law_act_range)
+                   for _, searcher in shards]
+        per_shard = [future.result() for future in futures]
+
+        # Each shard's list is already sorted, so merge them lazily
+        return [list(heapq.merge(*shard_hits, key=lambda hit: -hit['score']))[:top_k]
+                for shard_hits in zip(*per_shard)]
+
+    def cache_stats(self):
+        """Query embedding cache counters and every shard's result cache counters"""
+        if self.cache is None:
+            return None
+        return {"embeddings": self.cache.embeddings.stats(),
+                "shards": [searcher.cache_stats() for _, searcher in self._shards]}
+
+    def stats(self):
+        return [{"range": list(entry[0]), "path": entry[1], "vectors": searcher._snapshot.index.ntotal}
+                for entry, searcher in self._shards]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build, rebuild or swap the shards of a partitioned index")
+    parser.add_argument("--shard-dir", default="index_shards", help="directory with shards.json and the shards")
+    parser.add_argument("--backend", choices=BACKENDS, default="torch", help="encoder implementation")
+    parser.add_argument("--cache-dir", default="embedding_cache", help="on-disk embedding cache directory")
+    parser.add_argument("--no-cache", action="store_true", help="do not read or write the embedding cache")
+    parser.add_argument("--corpus-dir", default="corpus", help="directory with the crawler's corpus shards")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default="flat", help="FAISS index of every shard")
+    parser.add_argument("--max-tokens", type=int, default=DEFAULT_MAX_TOKENS)
+    parser.add_argument("--workers", type=int, default=1, help="embedding processes")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="build all shards (ranges are fixed on the first build)")
+    build.add_argument("--shards", type=int, required=True, help="number of shards")
+    build.add_argument("--incremental", action="store_true", help="only embed new or changed acts")
+
+    rebuild = commands.add_parser("rebuild", help="rebuild one shard from scratch and swap it in")
+    rebuild.add_argument("shard", type=int)
+    rebuild.add_argument("--keep-previous", action="store_true", help="do not delete the replaced shard")
+
+    swap = commands.add_parser("swap", help="serve a shard from another, already built directory")
+    swap.add_argument("shard", type=int)
+    swap.add_argument("path", help="shard directory, relative to --shard-dir")
+    args = parser.parse_args()
+
+    if args.command == "swap":
+        previous = swap_shard(args.shard_dir, args.shard, args.path)
+        print(f"Shard {args.shard} now served from {args.path} (was {previous})")
+        return
+
+    set_backend(args.backend)
+    build_kwargs = dict(corpus_dir=args.corpus_dir, cache_dir=None if args.no_cache else args.cache_dir,
+                        index_type=args.index_type, max_tokens=args.max_tokens or None, workers=args.workers)
+    if args.command == "build":
+        build_shards(args.shard_dir, args.shards, incremental=args.incremental, **build_kwargs)
+    else:
+        rebuild_shard(args.shard_dir, args.shard, keep_previous=args.keep_previous, **build_kwargs)
+
+
+if __name__ == "__main__":
+    main()
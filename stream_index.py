@@ -0,0 +1,344 @@
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+import faiss
+import numpy as np
+import pandas as pd
+from scrapy.utils.defer import maybe_deferred_to_future
+from twisted.internet import defer, task, threads
+
+from corpus_sink import normalize_row
+from chunker import chunk_rows
+from dedup import dependent_acts
+from embedding import (DEFAULT_MAX_TOKENS, embed_texts, embedding_dimension, load_manifest, save_manifest,
+                       act_content_hash, manifest_act_ranges, save_index, open_embedding_cache, chunking_config,
+                       dedup_config, strip_boilerplate, get_tokenizer, new_index_version)
+from index_factory import COMPRESSED_TYPES, create_index, supports_removal
+from metadata_store import MetadataStore, write_metadata_store
+from text_store import write_text_store
+from vector_store import write_vector_store
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Queue entry that tells the worker to finish
+_STOP = object()
+
+
+class StreamingIndexer:
+    """
+    Embeds acts as they arrive and adds them to a live index.
+
+    put() hands the paragraphs of one act to a bounded queue (it blocks when
+    the queue is full, which throttles the producer, or with block=False
+    reports that it is full); a worker thread drains
+    it in batches of about batch_rows paragraphs through embed_texts and adds
+    the vectors to the index in memory. Every checkpoint_interval seconds the
+    index, metadata, text store and manifest are written in the same formats
+    and order as embedding.main(), so a running Searcher picks the new acts
+    up on its next reload and a later `embedding.py --incremental` continues
+    from them. Memory is bounded by the queue and one checkpoint's worth of
+    rows, not by the corpus.
+
+    An existing index is extended in place; without one, a new index of
+    index_type is created, which only works for types that need no training
+    (build trained types with embedding.py first, then stream into them).
+
+    Boilerplate is stripped like the build that created the index did, but
+    near-duplicates are not folded: every streamed paragraph gets its own
+    vector. Acts whose duplicates pointed at a replaced act are marked for
+    re-embedding by the next `embedding.py --incremental`.
+    """
+
+    def __init__(self, index_path="unified_semantic_search.index", metadata_path="unified_metadata",
+                 manifest_path="index_manifest.json", text_path="unified_texts", index_type="flat",
+                 index_params=None, max_tokens=DEFAULT_MAX_TOKENS, cache_dir="embedding_cache", queue_size=64,
+                 batch_rows=256, checkpoint_interval=10.0, vectors_path="unified_vectors"):
+        self.index_path = index_path
+        self.metadata_path = metadata_path
+        self.manifest_path = manifest_path
+        self.text_path = text_path
+        self.vectors_path = vectors_path
+        self.max_tokens = max_tokens
+        self.batch_rows = batch_rows
+        self.checkpoint_interval = checkpoint_interval
+        self.cache = open_embedding_cache(cache_dir) if cache_dir else None
+
+        self.base_metadata = None
+        if os.path.exists(index_path) and os.path.exists(manifest_path):
+            self.index = faiss.read_index(index_path)
+            self.manifest = load_manifest(manifest_path)
+            if not isinstance(self.index, faiss.IndexIDMap2) or not os.path.isdir(metadata_path) \
+                    or not os.path.isdir(text_path):
+                raise ValueError(f"{index_path} cannot be updated incrementally; rebuild it with embedding.py")
+            self.base_metadata = MetadataStore(metadata_path)
+        else:
+            self.index = create_index(index_type, embedding_dimension(), 0, **(index_params or {}))
+            if not self.index.is_trained:
+                raise ValueError(f"A new {index_type} index needs training data; build it with embedding.py first")
+            self.manifest = {"next_id": 0, "files": {}, "acts": {}, "index_type": index_type,
+                             "index_params": index_params or {}, "chunking": chunking_config(),
+                             "dedup": dedup_config()}
+        # Chunk like the build that created the index, so a later incremental build sees the same vectors
+        self.chunking = self.manifest.get("chunking")
+        # and strip the same boilerplate, so it computes the same content hashes
+        self.dedup = self.manifest.get("dedup")
+        # Compressed indexes keep the exact vectors for rescoring next to them
+        self.store_vectors = self.manifest.get("index_type", "flat") in COMPRESSED_TYPES
+        if self.store_vectors and self.base_metadata is not None and not os.path.isdir(vectors_path):
+            raise ValueError(f"{index_path} has no exact vector store; rebuild it with embedding.py")
+        if self.index.ntotal:
+            existing_ids = faiss.vector_to_array(self.index.id_map)
+            self.manifest["next_id"] = max(self.manifest["next_id"], int(existing_ids.max()) + 1)
+
+        # Rows added and ids removed since the last checkpoint
+        self.new_rows = {}
+        self.new_texts = {}
+        self.new_vectors = {}
+        self.removed_ids = []
+        self.last_checkpoint = time.monotonic()
+
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.worker = threading.Thread(target=self._run, name="stream-index", daemon=True)
+        self.acts_indexed = 0
+        self.acts_unchanged = 0
+        self.checkpoints = 0
+        self.error = None
+
+    def start(self):
+        self.worker.start()
+        return self
+
+    def put(self, law_act_id, rows, source_file="stream", block=True):
+        """
+        Queue the consolidated paragraph rows of one act. Blocks while the
+        queue is full, or with block=False returns False instead of queueing.
+        """
+        if self.error is not None:
+            raise RuntimeError("Streaming indexer stopped") from self.error
+        try:
+            self.queue.put((str(law_act_id), [normalize_row(row) for row in rows], source_file), block=block)
+        except queue.Full:
+            return False
+        return True
+
+    def close(self):
+        """Index everything still queued, write a final checkpoint and stop the worker"""
+        self.queue.put(_STOP)
+        self.worker.join()
+        if self.error is not None:
+            raise RuntimeError("Streaming indexer failed") from self.error
+
+    def _next_batch(self):
+        """Block for the first act, then take whatever else is queued up to batch_rows paragraphs"""
+        timeout = max(0.1, self.checkpoint_interval - (time.monotonic() - self.last_checkpoint))
+        try:
+            batch = [self.queue.get(timeout=timeout)]
+        except queue.Empty:
+            return [], False
+        rows = len(batch[0][1]) if batch[0] is not _STOP else 0
+        while batch[-1] is not _STOP and rows < self.batch_rows:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+            if batch[-1] is not _STOP:
+                rows += len(batch[-1][1])
+        stop = batch[-1] is _STOP
+        return [act for act in batch if act is not _STOP], stop
+
+    def _run(self):
+        try:
+            while True:
+                batch, stop = self._next_batch()
+                if batch:
+                    self._index_batch(batch)
+                if stop or time.monotonic() - self.last_checkpoint >= self.checkpoint_interval:
+                    self.checkpoint()
+                if stop:
+                    return
+        except Exception as e:
+            logger.exception("Streaming indexer failed")
+            self.error = e
+            # Keep draining so producers blocked in put() do not hang
+            while self.queue.get() is not _STOP:
+                pass
+
+    def _index_batch(self, batch):
+        acts = []
+        for act_key, rows, source_file in batch:
+            act_df = strip_boilerplate(pd.DataFrame(rows), self.dedup)
+            rows = act_df.to_dict(orient='records')
+            content_hash = act_content_hash(act_df)
+            previous = self.manifest["acts"].get(act_key)
+            if previous is not None and previous["hash"] == content_hash:
+                self.acts_unchanged += 1
+                continue
+            if previous is not None:
+                if not supports_removal(self.index):
+                    logger.warning(f"Act {act_key} changed but the index cannot remove vectors; "
+                                   f"it is updated on the next embedding.py rebuild")
+                    continue
+                stale_ids = np.arange(previous["start"], previous["end"], dtype='int64')
+                self.index.remove_ids(stale_ids)
+                self.removed_ids.extend(stale_ids.tolist())
+                for vector_id in stale_ids:
+                    self.new_rows.pop(int(vector_id), None)
+                    self.new_texts.pop(int(vector_id), None)
+                    self.new_vectors.pop(int(vector_id), None)
+                for dependent in dependent_acts(self.manifest, [act_key]):
+                    # Its duplicate paragraphs pointed at the removed vectors; forget its hash and file
+                    # signature so the next incremental build re-reads and re-embeds it
+                    logger.warning(f"Act {dependent} had duplicates of act {act_key}; "
+                                   f"run embedding.py --incremental to re-embed it")
+                    entry = self.manifest["acts"][dependent]
+                    entry["hash"] = None
+                    self.manifest["files"].pop(entry["source_file"], None)
+            if self.chunking is not None:
+                rows, _ = chunk_rows(rows, get_tokenizer(), self.chunking["max_length"], self.chunking["overlap"],
+                                     self.chunking.get("min_tokens", 0))
+            acts.append((act_key, content_hash, rows, source_file))
+
+        texts = [row['text'] for _, _, rows, _ in acts for row in rows]
+        if not texts:
+            return
+        embeddings = embed_texts(texts, max_tokens=self.max_tokens, cache=self.cache, progress=False)
+        embeddings = embeddings.astype('float32')
+        faiss.normalize_L2(embeddings)
+
+        next_id = self.manifest["next_id"]
+        with metrics.stage("index_add"):
+            self.index.add_with_ids(embeddings, np.arange(next_id, next_id + len(texts), dtype='int64'))
+        if self.store_vectors:
+            self.new_vectors.update(zip(range(next_id, next_id + len(texts)), embeddings))
+        for act_key, content_hash, rows, source_file in acts:
+            start = next_id
+            for row in rows:
+                metadata_row = {name: value for name, value in row.items() if name != 'text'}
+                metadata_row['source_file'] = source_file
+                self.new_rows[next_id] = metadata_row
+                self.new_texts[next_id] = row['text']
+                next_id += 1
+            self.manifest["acts"][act_key] = {"hash": content_hash, "start": start, "end": next_id,
+                                              "source_file": source_file}
+        self.manifest["next_id"] = next_id
+        self.acts_indexed += len(acts)
+
+    def checkpoint(self):
+        """Publish the index and everything added since the last checkpoint"""
+        self.last_checkpoint = time.monotonic()
+        if not self.new_rows and not self.removed_ids:
+            return
+        self.manifest["version"] = new_index_version()
+        with metrics.stage("stream_checkpoint"):
+            write_metadata_store(self.metadata_path, self.new_rows, base=self.base_metadata,
+                                 removed_ids=self.removed_ids, act_ranges=manifest_act_ranges(self.manifest),
+                                 version=self.manifest["version"])
+            write_text_store(self.text_path, self.new_texts, append=self.base_metadata is not None,
+                             version=self.manifest["version"])
+            if self.store_vectors:
+                vector_ids = sorted(self.new_vectors)
+                vectors = np.array([self.new_vectors[vector_id] for vector_id in vector_ids], dtype='float32')
+                write_vector_store(self.vectors_path, vector_ids, vectors.reshape(len(vector_ids), self.index.d),
+                                   self.index.d, append=self.base_metadata is not None,
+                                   version=self.manifest["version"])
+            save_index(self.index, self.index_path, version=self.manifest["version"])
+            save_manifest(self.manifest, self.manifest_path)
+
+        self.base_metadata = MetadataStore(self.metadata_path)
+        self.new_rows, self.new_texts, self.new_vectors, self.removed_ids = {}, {}, {}, []
+        self.checkpoints += 1
+        logger.info(f"Index checkpoint {self.checkpoints}: {self.index.ntotal} vectors, "
+                    f"{self.acts_indexed} acts indexed this run")
+
+    def stats(self):
+        return {
+            "acts_indexed": self.acts_indexed,
+            "acts_unchanged": self.acts_unchanged,
+            "vectors": self.index.ntotal,
+            "queued": self.queue.qsize(),
+            "checkpoints": self.checkpoints,
+        }
+
+
+class StreamIndexPipeline:
+    """
+    Item pipeline that feeds crawled acts to a StreamingIndexer, so they are
+    searchable seconds after they are fetched. It runs after
+    corpus_sink.CorpusSinkPipeline, which tags every act with the shard it
+    is written to (the corpus stays the source of truth for rebuilds).
+
+    Pipelines run on the reactor thread, so nothing here may block: when the
+    indexer's queue is full the engine is paused (no new requests are
+    scheduled) and the item waits until the worker has drained enough of
+    the queue to take it, then the engine is resumed.
+
+    Settings: STREAM_INDEX_PATH, STREAM_METADATA_PATH, STREAM_TEXT_PATH,
+    STREAM_VECTORS_PATH, STREAM_MANIFEST_PATH, STREAM_QUEUE_SIZE,
+    STREAM_CHECKPOINT_INTERVAL.
+    """
+
+    # Seconds between attempts to queue waiting items while the queue is full
+    DRAIN_POLL_INTERVAL = 0.1
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        self.crawler = crawler
+        # (act, deferred) that did not fit in the queue yet, in arrival order
+        self.waiting = deque()
+        self.drain_loop = None
+        self.indexer = StreamingIndexer(
+            index_path=settings.get('STREAM_INDEX_PATH', 'unified_semantic_search.index'),
+            metadata_path=settings.get('STREAM_METADATA_PATH', 'unified_metadata'),
+            manifest_path=settings.get('STREAM_MANIFEST_PATH', 'index_manifest.json'),
+            text_path=settings.get('STREAM_TEXT_PATH', 'unified_texts'),
+            vectors_path=settings.get('STREAM_VECTORS_PATH', 'unified_vectors'),
+            queue_size=settings.getint('STREAM_QUEUE_SIZE', 64),
+            checkpoint_interval=settings.getfloat('STREAM_CHECKPOINT_INTERVAL', 10.0))
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def open_spider(self, spider=None):
+        self.indexer.start()
+
+    async def process_item(self, item, spider=None):
+        act = (item['law_act_id'], item['paragraphs'], item.get('source_file', 'stream'))
+        if not self.waiting and self.indexer.put(*act, block=False):
+            return item
+        if self.drain_loop is None:
+            logger.debug("Streaming index queue is full; pausing the crawl until it drains")
+            self.crawler.engine.pause()
+            self.drain_loop = task.LoopingCall(self._drain)
+            self.drain_loop.start(self.DRAIN_POLL_INTERVAL, now=False)
+        deferred = defer.Deferred()
+        self.waiting.append((act, deferred))
+        await maybe_deferred_to_future(deferred)
+        return item
+
+    def _drain(self):
+        """Queue waiting items while there is room; resume the crawl once all of them are in"""
+        while self.waiting:
+            act, deferred = self.waiting[0]
+            try:
+                if not self.indexer.put(*act, block=False):
+                    return
+            except RuntimeError:
+                self.waiting.popleft()
+                deferred.errback()
+                continue
+            self.waiting.popleft()
+            deferred.callback(None)
+        self.drain_loop.stop()
+        self.drain_loop = None
+        self.crawler.engine.unpause()
+
+    async def close_spider(self, spider=None):
+        # close() waits for the final batches and checkpoint; keep that off the reactor thread
+        await maybe_deferred_to_future(threads.deferToThread(self.indexer.close))
+        logger.info(f"Streaming index: {self.indexer.stats()}")
@@ -0,0 +1,135 @@
+import argparse
+import csv
+import hashlib
+import html
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DOC_PATH = re.compile(r'^/uz/docs/-(\d+)$')
+
+
+def synthesize_page(csv_path):
+    """Build a lex.uz-like page from a per-act CSV, for when no saved HTML exists"""
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+
+    divs = []
+    for i, row in enumerate(rows):
+        paragraph_id = row.get('paragraph_id', '')
+        paragraph_id = paragraph_id if paragraph_id.isdigit() else str(i + 1)
+        divs.append(f'<div class="ACT_TEXT lx_elem" onmousemove="lx_mo(event,-{paragraph_id})">'
+                    f'<a>{html.escape(row.get("text", ""))}</a></div>')
+    return ('<html><head><script>var t = ' + str(time.time()) + ';</script></head><body>'
+            + '\n'.join(divs) + '</body></html>')
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Serves /uz/docs/-{id} from {id}.html (or a page built from {id}.csv) in the server's directory"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        match = DOC_PATH.match(self.path.split('?')[0])
+        if not match:
+            return self.respond(404, b'not found')
+
+        if not server.enter():
+            # Too many requests in flight: push back like a rate-limited origin would
+            return self.respond(429, b'too many requests', {'Retry-After': '1'})
+        try:
+            if server.latency:
+                time.sleep(random.uniform(0.5, 1.5) * server.latency)
+            if random.random() < server.error_rate:
+                return self.respond(503, b'service unavailable')
+
+            law_act_id = match.group(1)
+            html_path = os.path.join(server.directory, f'{law_act_id}.html')
+            csv_path = os.path.join(server.directory, f'{law_act_id}.csv')
+            if os.path.exists(html_path):
+                with open(html_path, 'rb') as f:
+                    body = f.read()
+            elif os.path.exists(csv_path):
+                body = synthesize_page(csv_path).encode('utf-8')
+            else:
+                return self.respond(404, b'not found')
+
+            etag = '"' + hashlib.md5(re.sub(rb'<script\b.*?</script>', b'', body, flags=re.S)).hexdigest() + '"'
+            if self.headers.get('If-None-Match') == etag:
+                return self.respond(304, b'', {'ETag': etag})
+            self.respond(200, body, {'ETag': etag, 'Content-Type': 'text/html; charset=utf-8'})
+        finally:
+            server.leave()
+
+    def respond(self, status, body, headers=None):
+        self.server.count(status)
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, directory=".", latency_ms=0, error_rate=0.0, max_concurrency=0):
+        super().__init__(address, StubHandler)
+        self.directory = directory
+        self.latency = latency_ms / 1000
+        self.error_rate = error_rate
+        self.max_concurrency = max_concurrency
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.statuses = {}
+
+    def enter(self):
+        with self.lock:
+            if self.max_concurrency and self.in_flight >= self.max_concurrency:
+                return False
+            self.in_flight += 1
+            return True
+
+    def leave(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def count(self, status):
+        with self.lock:
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for lex.uz that serves saved pages, "
+                                                 "for benchmarking the crawler offline")
+    parser.add_argument("directory", nargs="?", default=".",
+                        help="directory with [law_act_id].html (main.py --save-html) or [law_act_id].csv files")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency-ms", type=float, default=50, help="mean simulated server latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--max-concurrency", type=int, default=0,
+                        help="answer 429 when more requests than this are in flight (0 = unlimited)")
+    args = parser.parse_args()
+
+    server = StubServer((args.host, args.port), args.directory, args.latency_ms, args.error_rate,
+                        args.max_concurrency)
+    print(f"Serving {os.path.abspath(args.directory)} on http://{args.host}:{args.port}/uz/docs/-[law_act_id]")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"Responses by status: {server.statuses}")
+
+
+if __name__ == "__main__":
+    main()
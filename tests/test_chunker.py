@@ -0,0 +1,83 @@
+"""
+Tests for chunker.py's article boundaries and token windows, with a
+whitespace tokenizer standing in for the encoder's.
+"""
+import os
+import re
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chunker import article_starts, chunk_text, token_windows  # noqa: E402
+
+# Body text of paragraph 6520432 (6518381.csv): a gazette citation right before the next article
+CITATION_TEXT = ("45-modda. Mehnat shartnomasini bekor qilish (O‘zbekiston Respublikasi Oliy Majlisi palatalarining "
+                 "Axborotnomasi, 2022-yil, № 3, 216-modda) 46-modda. Mehnat shartnomasining shartlari")
+
+
+class WordTokenizer:
+    """One token per whitespace-separated word, with the offsets a fast tokenizer returns"""
+
+    def __call__(self, text, add_special_tokens=False, return_offsets_mapping=True, verbose=False):
+        return {'offset_mapping': [(match.start(), match.end()) for match in re.finditer(r'\S+', text)]}
+
+    def num_special_tokens_to_add(self):
+        return 2
+
+
+def word_offsets(num_tokens):
+    return [(2 * position, 2 * position + 1) for position in range(num_tokens)]
+
+
+def test_citation_is_not_an_article_start():
+    assert article_starts(CITATION_TEXT) == [0, CITATION_TEXT.index("46-modda")]
+
+
+@pytest.mark.parametrize("text", [
+    "qarang: 5-modda, 6-modda va boshqalar",
+    "Axborotnomasi, 2021-yil, 216-modda. Qonun",
+    "Axborotnomasi, № 12, 216-modda. Qonun",
+    "ushbu Kodeksning 12-modda) talablari",
+])
+def test_references_are_not_article_starts(text):
+    assert article_starts(text) == [0]
+
+
+@pytest.mark.parametrize("text", ["5-modda. Maqsad", "12-1-modda. Atamalar", "3 - modda. «Asosiy»", "7-модда. Мақсад"])
+def test_headings_are_article_starts(text):
+    assert article_starts("Kirish so‘zi " + text) == [0, len("Kirish so‘zi ")]
+
+
+def test_citation_paragraph_is_not_split_at_the_citation():
+    pieces = chunk_text(" ".join([CITATION_TEXT] * 8), WordTokenizer(), max_length=40, overlap=4, min_tokens=8)
+    assert all(len(piece.split()) >= 8 for piece in pieces)
+    assert "216-modda)" not in [piece.strip() for piece in pieces]
+
+
+def test_short_article_is_merged_into_the_next_window():
+    # Articles of 50, 3 and 60 tokens: the 3-token article must not become its own window
+    windows = token_windows(word_offsets(113), [0, 100, 106], budget=64, min_tokens=8)
+    assert windows == [(0, 50), (50, 113)]
+
+
+def test_short_last_article_is_merged_into_the_previous_window():
+    windows = token_windows(word_offsets(110), [0, 100, 214], budget=64, min_tokens=8)
+    assert windows == [(0, 50), (50, 110)]
+
+
+def test_last_window_of_a_cut_article_is_widened():
+    windows = token_windows(word_offsets(130), [0], budget=64, overlap=0, min_tokens=8)
+    assert windows == [(0, 64), (64, 128), (122, 130)]
+
+
+@pytest.mark.parametrize("article_tokens", [[3, 70, 2, 5, 40], [1, 1, 1, 200], [64, 1, 64, 1], [10] * 20])
+def test_windows_respect_budget_and_minimum(article_tokens):
+    boundaries = [sum(article_tokens[:position]) for position in range(len(article_tokens))]
+    num_tokens = sum(article_tokens)
+    windows = token_windows(word_offsets(num_tokens), [2 * start for start in boundaries], budget=64, overlap=8,
+                            min_tokens=8)
+    assert windows[0][0] == 0 and windows[-1][1] == num_tokens
+    assert all(8 <= end - start <= 64 for start, end in windows)
+    assert all(start <= previous_end for (_, previous_end), (start, _) in zip(windows, windows[1:]))
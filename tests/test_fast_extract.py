@@ -0,0 +1,56 @@
+"""
+Golden-file tests for the paragraph extractor.
+
+pages/ holds saved act pages covering the layouts LexNewSpider2.parse
+handles (ACT_TEXT/CLAUSE_DEFAULT lx_elem divs, ACT_TEXT-only and
+lx_mo-only fallbacks, headings, short and orphaned paragraphs).
+pages/golden.jsonl holds the rows the original, pre-fast_extract parse()
+produced for them; bench_parse.py --update-golden rewrites it from the
+reference path.
+"""
+import json
+import os
+import sys
+
+import pytest
+from scrapy.http import HtmlResponse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fast_extract import extract_act  # noqa: E402
+from main import LexNewSpider2  # noqa: E402
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "pages")
+
+
+def load_golden():
+    with open(os.path.join(PAGES_DIR, "golden.jsonl"), encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def read_page(law_act_id):
+    with open(os.path.join(PAGES_DIR, f"{law_act_id}.html"), "rb") as f:
+        return f.read().decode("utf-8")
+
+
+GOLDEN = load_golden()
+
+
+@pytest.mark.parametrize("record", GOLDEN, ids=[record["law_act_id"] for record in GOLDEN])
+def test_extract_act_matches_golden(record):
+    assert extract_act(read_page(record["law_act_id"]), record["law_act_id"]) == record["rows"]
+
+
+@pytest.mark.parametrize("record", GOLDEN, ids=[record["law_act_id"] for record in GOLDEN])
+def test_reference_parser_matches_golden(record):
+    law_act_id = record["law_act_id"]
+    spider = LexNewSpider2.__new__(LexNewSpider2)
+    response = HtmlResponse(url=f"https://lex.uz/uz/docs/-{law_act_id}", body=read_page(law_act_id).encode("utf-8"),
+                            encoding="utf-8")
+    entries = spider.extract_entries_reference(response, law_act_id)
+    assert spider.consolidate_entries_reference(entries, law_act_id) == record["rows"]
+
+
+def test_every_page_has_golden_rows():
+    pages = {name[:-len(".html")] for name in os.listdir(PAGES_DIR) if name.endswith(".html")}
+    assert pages == {record["law_act_id"] for record in GOLDEN}
@@ -0,0 +1,51 @@
+"""
+Tests for finding the metadata of indexes built before the columnar store
+(a "unified_metadata.pkl" pickle) through the default "unified_metadata" path.
+"""
+import os
+import pickle
+import sys
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding import Searcher  # noqa: E402
+from metadata_store import MetadataStore, load_metadata, resolve_metadata_path, write_metadata_store  # noqa: E402
+
+ROWS = [{'law_act_id': 7173113, 'paragraph_id': 7173115 + i, 'source_file': '7173113.csv'} for i in range(4)]
+
+
+def write_legacy_index(directory):
+    """An index and metadata pickle as the builds before the columnar store wrote them"""
+    vectors = np.eye(4, 8, dtype='float32')
+    index = faiss.IndexIDMap2(faiss.IndexFlatIP(8))
+    index.add_with_ids(vectors, np.arange(4, dtype='int64'))
+    faiss.write_index(index, os.path.join(directory, "unified_semantic_search.index"))
+    with open(os.path.join(directory, "unified_metadata.pkl"), "wb") as f:
+        pickle.dump(ROWS, f)
+    return vectors
+
+
+def test_default_path_falls_back_to_legacy_pickle(tmp_path):
+    write_legacy_index(tmp_path)
+    path = os.path.join(tmp_path, "unified_metadata")
+    assert resolve_metadata_path(path) == path + ".pkl"
+    assert load_metadata(path) == ROWS
+
+
+def test_columnar_store_wins_over_legacy_pickle(tmp_path):
+    write_legacy_index(tmp_path)
+    path = os.path.join(tmp_path, "unified_metadata")
+    write_metadata_store(path, dict(enumerate(ROWS)))
+    assert resolve_metadata_path(path) == path
+    assert isinstance(load_metadata(path), MetadataStore)
+
+
+def test_searcher_loads_legacy_pickle_through_default_path(tmp_path, monkeypatch):
+    vectors = write_legacy_index(tmp_path)
+    monkeypatch.chdir(tmp_path)
+    searcher = Searcher(cache_size=0)
+    hits = searcher.search_vectors(vectors[2:3], top_k=1)
+    assert [(hit['law_act_id'], hit['paragraph_id']) for hit in hits[0]] == [(7173113, 7173117)]
@@ -0,0 +1,51 @@
+"""
+Tests for how sharded_index.py partitions the law_act_id space.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sharded_index import range_contains, shard_build_kwargs, shard_ranges  # noqa: E402
+
+
+def acts_per_range(ranges, act_ids):
+    return [sum(range_contains(act_range, act_id) for act_id in act_ids) for act_range in ranges]
+
+
+def test_more_shards_than_acts_gives_one_range_per_act():
+    ranges = shard_ranges([1, 2, 3], 5)
+    assert ranges == [(None, 2), (2, 3), (3, None)]
+    assert acts_per_range(ranges, [1, 2, 3]) == [1, 1, 1]
+
+
+def test_duplicate_act_ids_do_not_make_empty_ranges():
+    act_ids = [7, 7, 7, 8, 8, 9]
+    ranges = shard_ranges(act_ids, 3)
+    assert ranges == [(None, 8), (8, 9), (9, None)]
+    assert all(acts_per_range(ranges, act_ids))
+
+
+@pytest.mark.parametrize("num_acts, num_shards", [(10, 3), (100, 7), (5, 5), (1, 4)])
+def test_ranges_cover_every_act_once(num_acts, num_shards):
+    act_ids = list(range(1000, 1000 + 3 * num_acts, 3))
+    ranges = shard_ranges(act_ids, num_shards)
+    assert len(ranges) == min(num_shards, num_acts)
+    assert ranges[0][0] is None and ranges[-1][1] is None
+    counts = acts_per_range(ranges, act_ids)
+    assert sum(counts) == num_acts and min(counts) >= 1
+    assert max(counts) - min(counts) <= 1
+
+
+def test_no_acts_raises():
+    with pytest.raises(ValueError):
+        shard_ranges([], 2)
+
+
+def test_empty_shard_is_built_as_flat_index():
+    build_kwargs = {"index_type": "ivf_pq", "index_params": {"nlist": 16}, "cache_dir": None}
+    assert shard_build_kwargs([5, 12], (None, 10), build_kwargs) == build_kwargs
+    assert shard_build_kwargs([5, 12], (6, 12), build_kwargs) == {"index_type": "flat", "index_params": None,
+                                                                   "cache_dir": None}
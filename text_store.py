@@ -0,0 +1,124 @@
+import json
+import mmap
+import os
+import shutil
+
+import numpy as np
+
+
+class TextStore:
+    """
+    Read-only paragraph texts, indexed by vector id.
+
+    All texts live in one UTF-8 blob (texts.bin) that is memory-mapped;
+    offsets.npy holds capacity + 1 byte offsets, so the text of vector id i is
+    blob[offsets[i]:offsets[i + 1]]. Lookups slice the mapping directly, with
+    no file parsing per query. version is the stamp of the index build that
+    last wrote the store (None for stores written before version stamps).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # Read before the offsets: they are rewritten before the version, so they are never older than it
+        self.version = None
+        meta_path = os.path.join(path, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                self.version = json.load(f).get("version")
+        self.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode='r')
+        self._blob = None
+        if self.offsets[-1] > 0:
+            with open(os.path.join(path, "texts.bin"), "rb") as f:
+                self._blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._blob) if self._blob is not None else memoryview(b"")
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def raw(self, vector_id):
+        """
+        Zero-copy memoryview over the UTF-8 bytes of one text
+        """
+        if not 0 <= vector_id < len(self):
+            raise KeyError(vector_id)
+        return self._view[int(self.offsets[vector_id]):int(self.offsets[vector_id + 1])]
+
+    def text(self, vector_id):
+        return str(self.raw(vector_id), "utf-8")
+
+    def snippet(self, vector_id, max_chars=200):
+        """
+        First max_chars characters of a text, decoding only the bytes needed
+        """
+        raw = self.raw(vector_id)
+        if len(raw) <= max_chars:
+            return str(raw, "utf-8")
+
+        # A character is at most 4 bytes in UTF-8; a cut-off character at the end is dropped
+        text = str(raw[:max_chars * 4], "utf-8", errors="ignore")
+        if len(text) <= max_chars:
+            return text
+        return text[:max_chars].rstrip() + "…"
+
+
+def write_text_store(path, texts_by_id, append=False, version=None):
+    """
+    Write texts for the given vector ids, stamped with the build's version.
+
+    With append=True the new texts are appended to the existing blob (new
+    vector ids are always above the existing ones) and only offsets.npy and
+    meta.json are rewritten, atomically. Otherwise a fresh store is built in
+    a temporary directory and swapped in.
+    """
+    if append and os.path.isdir(path):
+        target = path
+        offsets = np.load(os.path.join(path, "offsets.npy"))
+    else:
+        append = False
+        target = path + ".tmp"
+        shutil.rmtree(target, ignore_errors=True)
+        os.makedirs(target)
+        offsets = np.zeros(1, dtype='int64')
+
+    capacity = max([len(offsets) - 1] + [vector_id + 1 for vector_id in texts_by_id])
+    if any(vector_id < len(offsets) - 1 for vector_id in texts_by_id):
+        raise ValueError("Text store is append-only; vector ids must be above the existing ones")
+
+    new_offsets = np.empty(capacity + 1, dtype='int64')
+    new_offsets[:len(offsets)] = offsets
+    position = int(offsets[-1])
+
+    with open(os.path.join(target, "texts.bin"), "r+b" if append else "wb") as f:
+        # Drop bytes left behind by a run that died before writing its offsets
+        f.truncate(position)
+        f.seek(position)
+        for vector_id in range(len(offsets) - 1, capacity):
+            text = texts_by_id.get(vector_id)
+            if text is not None:
+                data = str(text).encode("utf-8")
+                f.write(data)
+                position += len(data)
+            new_offsets[vector_id + 1] = position
+
+    tmp_offsets = os.path.join(target, "offsets.tmp.npy")
+    np.save(tmp_offsets, new_offsets)
+    os.replace(tmp_offsets, os.path.join(target, "offsets.npy"))
+    tmp_meta = os.path.join(target, "meta.tmp.json")
+    with open(tmp_meta, "w", encoding="utf-8") as f:
+        json.dump({"version": version}, f)
+    os.replace(tmp_meta, os.path.join(target, "meta.json"))
+
+    if not append:
+        old_path = path + ".old"
+        shutil.rmtree(old_path, ignore_errors=True)
+        if os.path.exists(path):
+            os.replace(path, old_path)
+        os.replace(target, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+
+
+def open_text_store(path):
+    """
+    Open the text store at path, or return None if the index was built without one
+    """
+    return TextStore(path) if os.path.isdir(path) else None
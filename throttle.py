@@ -0,0 +1,49 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class BackoffMiddleware:
+    """
+    Downloader middleware that backs off when the server pushes back.
+
+    AutoThrottle adapts the delay to response latency but ignores error
+    responses, so on 429 and 5xx this doubles the download slot delay (or uses
+    Retry-After when the server sends one), capped at BACKOFF_MAX_DELAY.
+    AutoThrottle brings the delay back down once responses are healthy again.
+    """
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+        self.max_delay = crawler.settings.getfloat('BACKOFF_MAX_DELAY', 60.0)
+        self.min_delay = crawler.settings.getfloat('BACKOFF_MIN_DELAY', 1.0)
+        self.http_codes = set(crawler.settings.getlist('BACKOFF_HTTP_CODES', [429, 500, 502, 503, 504]))
+        self.backoffs = 0
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def process_response(self, request, response, spider=None):
+        if response.status not in self.http_codes:
+            return response
+
+        slot_key = request.meta.get('download_slot')
+        slot = self.crawler.engine.downloader.slots.get(slot_key)
+        if slot is None:
+            return response
+
+        retry_after = response.headers.get('Retry-After')
+        try:
+            retry_after = float(retry_after) if retry_after else 0.0
+        except ValueError:
+            # HTTP-date form; fall back to doubling
+            retry_after = 0.0
+
+        new_delay = min(self.max_delay, max(slot.delay * 2, self.min_delay, retry_after))
+        if new_delay > slot.delay:
+            logger.info(f"HTTP {response.status} from {slot_key}: download delay {slot.delay:.2f}s -> {new_delay:.2f}s")
+            slot.delay = new_delay
+            self.backoffs += 1
+            self.crawler.stats.inc_value('backoff/count')
+        return response
@@ -0,0 +1,116 @@
+import json
+import os
+import shutil
+
+import numpy as np
+
+# Candidates fetched from a compressed index per requested hit, before exact rescoring
+DEFAULT_RESCORE_FACTOR = 4
+
+
+class VectorStore:
+    """
+    Read-only exact float32 vectors, indexed by vector id.
+
+    vectors.f32 holds one row of `dimension` float32s per vector id (zeros for
+    ids without a vector of their own: removed acts, folded near-duplicates)
+    and is memory-mapped, so a search only pages in the rows of the
+    candidates it rescores. meta.json records the dimension, how many rows
+    are complete (rows past that may be an append in progress) and the
+    version stamp of the index build that last wrote the store.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.dimension = meta["dimension"]
+        self.capacity = meta["capacity"]
+        self.version = meta.get("version")
+        if self.capacity:
+            self.vectors = np.memmap(os.path.join(path, "vectors.f32"), dtype='float32', mode='r',
+                                     shape=(self.capacity, self.dimension))
+        else:
+            self.vectors = np.zeros((0, self.dimension), dtype='float32')
+
+    def __len__(self):
+        return self.capacity
+
+    def get(self, vector_ids):
+        """Rows of vector_ids as a float32 array (zeros for ids outside the store)"""
+        vector_ids = np.asarray(vector_ids, dtype='int64')
+        rows = np.zeros((len(vector_ids), self.dimension), dtype='float32')
+        inside = (vector_ids >= 0) & (vector_ids < self.capacity)
+        rows[inside] = self.vectors[vector_ids[inside]]
+        return rows
+
+
+def write_vector_store(path, vector_ids, vectors, dimension, append=False, version=None):
+    """
+    Write the float32 vectors of vector_ids, stamped with the build's version.
+
+    With append=True the rows are appended to the existing file (new vector
+    ids are always above the existing ones) and only meta.json is rewritten,
+    atomically. Otherwise a fresh store is built in a temporary directory and
+    swapped in.
+    """
+    if append and os.path.isdir(path):
+        target = path
+        capacity = VectorStore(path).capacity
+    else:
+        append = False
+        target = path + ".tmp"
+        shutil.rmtree(target, ignore_errors=True)
+        os.makedirs(target)
+        capacity = 0
+
+    vector_ids = np.asarray(vector_ids, dtype='int64')
+    if len(vector_ids) and vector_ids.min() < capacity:
+        raise ValueError("Vector store is append-only; vector ids must be above the existing ones")
+    new_capacity = max(capacity, int(vector_ids.max()) + 1 if len(vector_ids) else 0)
+
+    rows = np.zeros((new_capacity - capacity, dimension), dtype='float32')
+    rows[vector_ids - capacity] = vectors
+    with open(os.path.join(target, "vectors.f32"), "r+b" if append else "wb") as f:
+        # Drop rows left behind by a run that died before writing its meta.json
+        row_bytes = dimension * 4
+        f.truncate(capacity * row_bytes)
+        f.seek(capacity * row_bytes)
+        f.write(rows.tobytes())
+
+    tmp_meta = os.path.join(target, "meta.tmp.json")
+    with open(tmp_meta, "w", encoding="utf-8") as f:
+        json.dump({"dimension": int(dimension), "capacity": int(new_capacity), "version": version}, f)
+    os.replace(tmp_meta, os.path.join(target, "meta.json"))
+
+    if not append:
+        old_path = path + ".old"
+        shutil.rmtree(old_path, ignore_errors=True)
+        if os.path.exists(path):
+            os.replace(path, old_path)
+        os.replace(target, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+
+
+def open_vector_store(path):
+    """
+    Open the vector store at path, or return None if the index was built without one
+    """
+    return VectorStore(path) if os.path.isdir(path) else None
+
+
+def rescore(store, queries, candidate_ids, top_k):
+    """
+    Re-rank the candidate ids of each query (a row of a faiss result, -1 for
+    no candidate) by their exact inner product with the query. Returns the
+    top_k scores and ids, padded like faiss.
+    """
+    D = np.full((len(queries), top_k), -np.inf, dtype='float32')
+    I = np.full((len(queries), top_k), -1, dtype='int64')
+    for row, (query, ids) in enumerate(zip(queries, candidate_ids)):
+        ids = ids[ids >= 0]
+        scores = store.get(ids) @ query
+        order = np.argsort(-scores, kind='stable')[:top_k]
+        D[row, :len(order)] = scores[order]
+        I[row, :len(order)] = ids[order]
+    return D, I